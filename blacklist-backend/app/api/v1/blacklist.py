@@ -5,6 +5,7 @@ from fastapi import APIRouter, Depends, HTTPException, status, Query, File, Uplo
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from pydantic import BaseModel
+from datetime import datetime
 import logging
 
 from app.core.database import get_db
@@ -13,6 +14,7 @@ from app.models.user import User
 from app.models.blacklist import Blacklist, BlacklistHistory
 from app.schemas.blacklist import BlacklistResponse, BlacklistCreate, BlacklistUpdate, BlacklistHistoryResponse, BlacklistSearchParams
 from app.api.v1.auth import get_current_user
+from app.services.reverse_screening import reverse_screening_runner
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -144,7 +146,6 @@ async def create_blacklist_item(
     
     # 记录变更历史
     import json
-    from datetime import datetime
     
     def serialize_for_history(obj):
         """序列化对象用于历史记录"""
@@ -166,6 +167,9 @@ async def create_blacklist_item(
     db.commit()
     
     logger.info(f"黑名单记录 {blacklist_item.id} 创建成功")
+    
+    # 后台重新检测可能命中新黑名单的已有订单
+    reverse_screening_runner.submit([blacklist_item.id])
     return blacklist_item
 
 
@@ -209,7 +213,6 @@ async def update_blacklist_item(
     
     # 记录变更历史
     import json
-    from datetime import datetime
     
     def serialize_for_history(obj):
         """序列化对象用于历史记录"""
@@ -237,6 +240,9 @@ async def update_blacklist_item(
     db.commit()
     
     logger.info(f"黑名单记录 {blacklist_item.id} 更新成功")
+    
+    # 后台重新检测修改前后可能命中的已有订单
+    reverse_screening_runner.submit([blacklist_item.id], [old_data])
     return blacklist_item
 
 
@@ -277,6 +283,9 @@ async def delete_blacklist_item(
     db.commit()
     
     logger.info(f"黑名单记录 {blacklist_item.id} 删除成功")
+    
+    # 后台重新检测原来命中该黑名单的订单
+    reverse_screening_runner.submit([blacklist_item.id], [old_data])
     return {"message": "黑名单记录删除成功"}
 
 
@@ -320,12 +329,36 @@ async def batch_delete_blacklist(
         )
     
     # 批量软删除
-    deleted_count = db.query(Blacklist).filter(
+    blacklist_items = db.query(Blacklist).filter(
         Blacklist.id.in_(ids),
         Blacklist.is_active == True
-    ).update({Blacklist.is_active: False}, synchronize_session=False)
+    ).all()
+    
+    previous_data = []
+    for blacklist_item in blacklist_items:
+        old_data = {
+            key: value.isoformat() if isinstance(value, datetime) else value
+            for key, value in blacklist_item.to_dict().items()
+        }
+        previous_data.append(old_data)
+        blacklist_item.is_active = False
+        
+        # 记录变更历史（黑名单快照按变更历史增量更新）
+        db.add(BlacklistHistory(
+            blacklist_id=blacklist_item.id,
+            action="delete",
+            old_data=old_data,
+            changed_by=current_user.id
+        ))
     
     db.commit()
+    deleted_count = len(blacklist_items)
+    
+    # 后台重新检测原来命中这些黑名单的订单（按删除前的内容查找）
+    reverse_screening_runner.submit(
+        [blacklist_item.id for blacklist_item in blacklist_items],
+        previous_data
+    )
     
     logger.info(f"批量删除黑名单记录成功: {deleted_count} 条")
     return {"message": f"成功删除 {deleted_count} 条记录"}
@@ -8,9 +8,10 @@ from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
 from typing import List, Dict, Any, Optional
 from app.core.database import get_db
-from app.models.blacklist import Blacklist
+from app.core.executor import detection_executor
 from app.models.order import Order
 from app.services.blacklist_matcher import blacklist_matcher
+from app.services.blacklist_snapshot import get_blacklist_snapshot
 from app.schemas.blacklist import BlacklistResponse
 
 router = APIRouter()
@@ -27,14 +28,15 @@ async def check_single_order(
     if not order:
         raise HTTPException(status_code=404, detail="订单不存在")
     
-    # 获取所有黑名单数据
-    blacklist_items = db.query(Blacklist).filter(Blacklist.is_active == True).all()
+    # 获取黑名单快照（黑名单未变化时直接复用）
+    snapshot = get_blacklist_snapshot(db)
     
     # 执行匹配
-    result = blacklist_matcher.check_order_blacklist(order, blacklist_items)
+    result = blacklist_matcher.check_order_blacklist(order, snapshot)
     
     # 更新订单的黑名单检测状态
     order.is_blacklist_checked = "yes" if result["is_blacklist"] else "no"
+    order.blacklist_checked_version = snapshot.version
     order.blacklist_risk_level = result["risk_level"]
     order.blacklist_match_info = f"匹配到 {result.get('match_count', 0)} 条黑名单记录" if result["is_blacklist"] else "未匹配到黑名单"
     
@@ -58,14 +60,8 @@ async def check_single_order(
     }
 
 
-@router.get("/check-orders")
-async def check_orders(
-    skip: int = Query(0, ge=0),
-    limit: int = Query(100, ge=1, le=1000),
-    risk_level: Optional[str] = Query(None, description="风险等级过滤"),
-    db: Session = Depends(get_db)
-):
-    """批量检查订单黑名单状态"""
+def _check_orders(db: Session, skip: int, limit: int, risk_level: Optional[str]) -> Dict[str, Any]:
+    """批量检查订单（同步执行，由检测任务执行器调用）"""
     # 获取订单
     query = db.query(Order)
     if risk_level:
@@ -73,15 +69,19 @@ async def check_orders(
     
     orders = query.offset(skip).limit(limit).all()
     
-    # 获取所有黑名单数据
-    blacklist_items = db.query(Blacklist).filter(Blacklist.is_active == True).all()
+    # 获取黑名单快照
+    snapshot = get_blacklist_snapshot(db)
+    
+    # 一次性批量匹配
+    bulk_results = blacklist_matcher.check_orders_bulk(orders, snapshot)
     
     results = []
-    for order in orders:
-        result = blacklist_matcher.check_order_blacklist(order, blacklist_items)
+    for index, order in enumerate(orders):
+        result = blacklist_matcher.bulk_result_at(bulk_results, index)
         
         # 更新订单状态
         order.is_blacklist_checked = "yes" if result["is_blacklist"] else "no"
+        order.blacklist_checked_version = snapshot.version
         order.blacklist_risk_level = result["risk_level"]
         order.blacklist_match_info = f"匹配到 {result.get('match_count', 0)} 条黑名单记录" if result["is_blacklist"] else "未匹配到黑名单"
         
@@ -108,6 +108,18 @@ async def check_orders(
     }
 
 
+@router.get("/check-orders")
+async def check_orders(
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    risk_level: Optional[str] = Query(None, description="风险等级过滤"),
+    db: Session = Depends(get_db)
+):
+    """批量检查订单黑名单状态"""
+    # 查询和匹配在检测线程池中执行，不阻塞事件循环
+    return await detection_executor.run(_check_orders, db, skip, limit, risk_level)
+
+
 @router.get("/blacklist-matches")
 async def get_blacklist_matches(
     skip: int = Query(0, ge=0),
@@ -17,37 +17,18 @@ from app.models.group import Group
 from app.models.user import User
 from app.api.v1.auth import get_current_user
 from app.core.exceptions import NotFoundError, ForbiddenError
+from app.core.executor import detection_executor
 from app.services.blacklist_matcher import blacklist_matcher
+from app.services.blacklist_snapshot import get_blacklist_snapshot
+from app.services.reverse_screening import select_orders_to_check
 from app.schemas.group import GroupBatchCheckResponse, GroupBatchCheckRequest
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
 
-@router.post("/detect-group-20250914", response_model=GroupBatchCheckResponse)
-async def detect_group_20250914(
-    request: GroupBatchCheckRequest,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
-):
-    """
-    专门检测20250914组的黑名单匹配逻辑
-    
-    检测流程：
-    1. 获取20250914组的所有订单
-    2. 获取所有活跃的黑名单数据
-    3. 遍历每个订单，进行多维度匹配：
-       - 电话号码匹配（优先级最高）
-       - 下单人姓名匹配
-       - KTT名字匹配
-    4. 记录匹配结果和风险等级
-    5. 更新订单检测状态
-    """
-    
-    # 检查权限
-    if not current_user.role or current_user.role.name not in ["超级管理员", "管理员", "操作员"]:
-        raise ForbiddenError("没有权限执行批量检测")
-    
+def _detect_group_20250914(request: GroupBatchCheckRequest, db: Session) -> GroupBatchCheckResponse:
+    """检测20250914组订单（同步执行，由检测任务执行器调用）"""
     # 查找20250914分组
     group = db.query(Group).filter(
         Group.name == "20250914",
@@ -81,9 +62,9 @@ async def detect_group_20250914(
     
     logger.info(f"找到 {len(orders)} 个订单，开始检测...")
     
-    # 获取所有活跃的黑名单数据
-    blacklist_items = db.query(Blacklist).filter(Blacklist.is_active == True).all()
-    logger.info(f"加载了 {len(blacklist_items)} 条黑名单记录")
+    # 获取活跃黑名单的快照
+    snapshot = get_blacklist_snapshot(db)
+    logger.info(f"使用黑名单快照 {snapshot.version}，共 {len(snapshot)} 条黑名单记录")
     
     # 检测统计
     checked_count = 0
@@ -96,63 +77,65 @@ async def detect_group_20250914(
     # 详细检测结果
     detection_results = []
     
-    # 遍历每个订单进行检测
-    for i, order in enumerate(orders):
+    # 只检测需要检测的订单（强制重新检测、订单未检测过，或者检测后变更的黑名单可能命中订单），整批一次完成匹配
+    orders_to_check = select_orders_to_check(db, orders, snapshot, request.force_recheck)
+    bulk_results = blacklist_matcher.check_orders_bulk(orders_to_check, snapshot)
+    
+    # 遍历每个订单写入检测结果
+    for i, order in enumerate(orders_to_check):
         try:
-            logger.info(f"检测订单 {i+1}/{len(orders)}: ID={order.id}, 下单人={order.orderer}, 电话={order.contact_phone}")
+            logger.info(f"检测订单 {i+1}/{len(orders_to_check)}: ID={order.id}, 下单人={order.orderer}, 电话={order.contact_phone}")
             
-            # 如果强制重新检测或者订单未检测过
-            if request.force_recheck or order.is_blacklist_checked != "yes":
-                
-                # 执行黑名单匹配
-                match_result = blacklist_matcher.check_order_blacklist(order, blacklist_items)
-                
-                # 更新订单状态
-                order.is_blacklist_checked = "yes"
-                order.blacklist_risk_level = match_result["risk_level"]
-                
-                if match_result["is_blacklist"]:
-                    order.blacklist_match_info = f"匹配到 {match_result.get('match_count', 0)} 条黑名单记录"
-                    new_matches += 1
-                    
-                    # 记录匹配详情
-                    if match_result["matches"]:
-                        match_details = []
-                        for match in match_result["matches"][:3]:  # 只显示前3个匹配
-                            match_details.append(f"{match['match_type']}: {match['match_details']}")
-                        order.blacklist_match_details = "; ".join(match_details)
-                    
-                    # 统计风险等级
-                    if match_result["risk_level"] == "HIGH":
-                        high_risk_count += 1
-                    elif match_result["risk_level"] == "MEDIUM":
-                        medium_risk_count += 1
-                    elif match_result["risk_level"] == "LOW":
-                        low_risk_count += 1
-                else:
-                    order.blacklist_match_info = "未匹配到黑名单"
-                    order.blacklist_match_details = ""
-                    no_risk_count += 1
-                
-                checked_count += 1
+            # 取出该订单的黑名单匹配结果
+            match_result = blacklist_matcher.bulk_result_at(bulk_results, i)
+            
+            # 更新订单状态
+            order.is_blacklist_checked = "yes"
+            order.blacklist_checked_version = snapshot.version
+            order.blacklist_risk_level = match_result["risk_level"]
+            
+            if match_result["is_blacklist"]:
+                order.blacklist_match_info = f"匹配到 {match_result.get('match_count', 0)} 条黑名单记录"
+                new_matches += 1
                 
-                # 记录详细检测结果
-                detection_results.append({
-                    "order_id": order.id,
-                    "group_tour_number": order.group_tour_number,
-                    "orderer": order.orderer,
-                    "contact_phone": order.contact_phone,
-                    "detailed_address": order.detailed_address,
-                    "is_blacklist": match_result["is_blacklist"],
-                    "risk_level": match_result["risk_level"],
-                    "match_count": match_result.get("match_count", 0),
-                    "matches": match_result.get("matches", []),
-                    "match_info": order.blacklist_match_info,
-                    "match_details": order.blacklist_match_details
-                })
+                # 记录匹配详情
+                if match_result["matches"]:
+                    match_details = []
+                    for match in match_result["matches"][:3]:  # 只显示前3个匹配
+                        match_details.append(f"{match['match_type']}: {match['match_details']}")
+                    order.blacklist_match_details = "; ".join(match_details)
                 
-                logger.info(f"订单 {order.id} 检测完成: 风险等级={match_result['risk_level']}, 匹配={match_result['is_blacklist']}")
+                # 统计风险等级
+                if match_result["risk_level"] == "HIGH":
+                    high_risk_count += 1
+                elif match_result["risk_level"] == "MEDIUM":
+                    medium_risk_count += 1
+                elif match_result["risk_level"] == "LOW":
+                    low_risk_count += 1
+            else:
+                order.blacklist_match_info = "未匹配到黑名单"
+                order.blacklist_match_details = ""
+                no_risk_count += 1
+            
+            checked_count += 1
             
+            # 记录详细检测结果
+            detection_results.append({
+                "order_id": order.id,
+                "group_tour_number": order.group_tour_number,
+                "orderer": order.orderer,
+                "contact_phone": order.contact_phone,
+                "detailed_address": order.detailed_address,
+                "is_blacklist": match_result["is_blacklist"],
+                "risk_level": match_result["risk_level"],
+                "match_count": match_result.get("match_count", 0),
+                "matches": match_result.get("matches", []),
+                "match_info": order.blacklist_match_info,
+                "match_details": order.blacklist_match_details
+            })
+            
+            logger.info(f"订单 {order.id} 检测完成: 风险等级={match_result['risk_level']}, 匹配={match_result['is_blacklist']}")
+        
         except Exception as e:
             logger.error(f"检测订单 {order.id} 时出错: {e}")
             continue
@@ -182,6 +165,34 @@ async def detect_group_20250914(
     )
 
 
+@router.post("/detect-group-20250914", response_model=GroupBatchCheckResponse)
+async def detect_group_20250914(
+    request: GroupBatchCheckRequest,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    专门检测20250914组的黑名单匹配逻辑
+    
+    检测流程：
+    1. 获取20250914组的所有订单
+    2. 获取所有活跃的黑名单数据
+    3. 遍历每个订单，进行多维度匹配：
+       - 电话号码匹配（优先级最高）
+       - 下单人姓名匹配
+       - KTT名字匹配
+    4. 记录匹配结果和风险等级
+    5. 更新订单检测状态
+    """
+    
+    # 检查权限
+    if not current_user.role or current_user.role.name not in ["超级管理员", "管理员", "操作员"]:
+        raise ForbiddenError("没有权限执行批量检测")
+    
+    # 查询、匹配和写库在检测线程池中执行，不阻塞事件循环
+    return await detection_executor.run(_detect_group_20250914, request, db)
+
+
 @router.post("/get-detection-results")
 async def get_detection_results(
     group_id: int,
@@ -11,6 +11,7 @@ from datetime import datetime
 
 from app.core.database import get_db
 from app.core.exceptions import NotFoundError, ForbiddenError
+from app.core.executor import detection_executor
 from app.models.user import User
 from app.models.group import Group, GroupStatus
 from app.models.blacklist import Blacklist
@@ -172,17 +173,8 @@ async def delete_group(
     return {"message": "分组删除成功"}
 
 
-@router.post("/batch-check", response_model=GroupBatchCheckResponse)
-async def batch_check_blacklist(
-    request: GroupBatchCheckRequest,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
-):
-    """批量检测分组中的订单黑名单"""
-    # 检查权限
-    if not current_user.role or current_user.role.name not in ["超级管理员", "管理员", "操作员"]:
-        raise ForbiddenError("没有权限执行批量检测")
-    
+def _batch_check_group(request: GroupBatchCheckRequest, db: Session) -> GroupBatchCheckResponse:
+    """批量检测分组订单（同步执行，由检测任务执行器调用）"""
     # 获取分组
     group = db.query(Group).filter(
         Group.id == request.group_id, 
@@ -212,46 +204,49 @@ async def batch_check_blacklist(
             message="该分组下没有订单"
         )
     
-    # 获取所有黑名单数据
-    blacklist_items = db.query(Blacklist).filter(Blacklist.is_active == True).all()
-    logger.info(f"加载了 {len(blacklist_items)} 条黑名单记录")
+    # 获取黑名单快照
+    from app.services.blacklist_matcher import blacklist_matcher
+    from app.services.blacklist_snapshot import get_blacklist_snapshot
+    snapshot = get_blacklist_snapshot(db)
+    logger.info(f"使用黑名单快照 {snapshot.version}，共 {len(snapshot)} 条黑名单记录")
     
-    # 执行批量检测
+    # 执行批量检测（强制重新检测、订单未检测过，或者检测后变更的黑名单可能命中订单）
+    from app.services.reverse_screening import select_orders_to_check
     checked_count = 0
     new_matches = 0
     
-    for order in orders:
-        # 如果强制重新检测或者订单未检测过
-        if request.force_recheck or order.is_blacklist_checked != "yes":
-            try:
-                # 执行实际的黑名单匹配
-                from app.services.blacklist_matcher import blacklist_matcher
-                match_result = blacklist_matcher.check_order_blacklist(order, blacklist_items)
-                
-                # 更新订单状态
-                order.is_blacklist_checked = "yes"
-                order.blacklist_risk_level = match_result["risk_level"]
-                
-                if match_result["is_blacklist"]:
-                    order.blacklist_match_info = f"匹配到 {match_result.get('match_count', 0)} 条黑名单记录"
-                    new_matches += 1
-                    
-                    # 记录匹配详情
-                    if match_result["matches"]:
-                        match_details = []
-                        for match in match_result["matches"][:3]:  # 只显示前3个匹配
-                            match_details.append(f"{match['match_type']}: {match['match_details']}")
-                        order.blacklist_match_details = "; ".join(match_details)
-                else:
-                    order.blacklist_match_info = "未匹配到黑名单"
-                    order.blacklist_match_details = ""
-                
-                checked_count += 1
-                logger.info(f"订单 {order.id} 检测完成: 风险等级={match_result['risk_level']}, 匹配={match_result['is_blacklist']}")
+    orders_to_check = select_orders_to_check(db, orders, snapshot, request.force_recheck)
+    bulk_results = blacklist_matcher.check_orders_bulk(orders_to_check, snapshot)
+    
+    for i, order in enumerate(orders_to_check):
+        try:
+            match_result = blacklist_matcher.bulk_result_at(bulk_results, i)
+            
+            # 更新订单状态
+            order.is_blacklist_checked = "yes"
+            order.blacklist_checked_version = snapshot.version
+            order.blacklist_risk_level = match_result["risk_level"]
+            
+            if match_result["is_blacklist"]:
+                order.blacklist_match_info = f"匹配到 {match_result.get('match_count', 0)} 条黑名单记录"
+                new_matches += 1
                 
-            except Exception as e:
-                logger.error(f"检测订单 {order.id} 时出错: {e}")
-                continue
+                # 记录匹配详情
+                if match_result["matches"]:
+                    match_details = []
+                    for match in match_result["matches"][:3]:  # 只显示前3个匹配
+                        match_details.append(f"{match['match_type']}: {match['match_details']}")
+                    order.blacklist_match_details = "; ".join(match_details)
+            else:
+                order.blacklist_match_info = "未匹配到黑名单"
+                order.blacklist_match_details = ""
+            
+            checked_count += 1
+            logger.info(f"订单 {order.id} 检测完成: 风险等级={match_result['risk_level']}, 匹配={match_result['is_blacklist']}")
+        
+        except Exception as e:
+            logger.error(f"检测订单 {order.id} 时出错: {e}")
+            continue
     
     # 重新计算总黑名单匹配数（包括之前已检测的）
     total_blacklist_matches = db.query(Order).filter(
@@ -281,6 +276,21 @@ async def batch_check_blacklist(
     )
 
 
+@router.post("/batch-check", response_model=GroupBatchCheckResponse)
+async def batch_check_blacklist(
+    request: GroupBatchCheckRequest,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """批量检测分组中的订单黑名单"""
+    # 检查权限
+    if not current_user.role or current_user.role.name not in ["超级管理员", "管理员", "操作员"]:
+        raise ForbiddenError("没有权限执行批量检测")
+    
+    # 查询、匹配和写库在检测线程池中执行，不阻塞事件循环
+    return await detection_executor.run(_batch_check_group, request, db)
+
+
 @router.post("/upload-excel")
 async def upload_excel_to_group(
     group_id: int,
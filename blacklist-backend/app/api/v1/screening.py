@@ -2,6 +2,7 @@
 订单筛查API
 """
 from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from typing import List, Optional
 import logging
@@ -14,6 +15,7 @@ from app.core.config import settings
 from app.models.user import User
 from app.models.screening import ScreeningTask, ScreeningResult
 from app.schemas.screening import ScreeningTaskResponse, ScreeningResultResponse, ScreeningTaskCreate
+from app.services.screening_runner import screening_runner
 from app.api.v1.auth import get_current_user
 
 logger = logging.getLogger(__name__)
@@ -136,11 +138,46 @@ async def start_screening_task(
     task.status = "processing"
     db.commit()
     
-    # 这里应该启动异步筛查任务
-    # 在实际应用中，可以使用Celery等任务队列
+    # 提交到后台执行（Celery 或进程内执行器）
+    executor = await run_in_threadpool(screening_runner.submit, task_id)
     logger.info(f"筛查任务 {task_id} 开始执行")
     
-    return {"message": "筛查任务已开始", "task_id": task_id}
+    return {"message": "筛查任务已开始", "task_id": task_id, "executor": executor}
+
+
+@router.post("/tasks/{task_id}/resume")
+async def resume_screening_task(
+    task_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """从检查点继续执行失败或中断的筛查任务"""
+    # 检查权限
+    if not current_user.role or current_user.role.name not in ["超级管理员", "管理员", "操作员"]:
+        raise ForbiddenError("没有权限执行筛查任务")
+    
+    task = db.query(ScreeningTask).filter(ScreeningTask.id == task_id).first()
+    if not task:
+        raise NotFoundError("筛查任务", str(task_id))
+    
+    if task.status not in ("failed", "processing"):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="只有失败或中断的任务可以继续"
+        )
+    
+    task.status = "processing"
+    db.commit()
+    
+    executor = await run_in_threadpool(screening_runner.submit, task_id)
+    logger.info(f"筛查任务 {task_id} 从第 {task.processed_records} 行继续执行")
+    
+    return {
+        "message": "筛查任务已继续",
+        "task_id": task_id,
+        "processed_records": task.processed_records,
+        "executor": executor
+    }
 
 
 @router.get("/tasks/{task_id}/results", response_model=List[ScreeningResultResponse])
@@ -0,0 +1,37 @@
+"""
+Celery 应用配置
+
+启动 worker：celery -A app.core.celery_app worker --loglevel=info
+"""
+from celery import Celery
+
+from app.core.config import settings
+
+
+def get_redis_url() -> str:
+    """根据配置生成 Redis 连接地址"""
+    auth = f":{settings.REDIS_PASSWORD}@" if settings.REDIS_PASSWORD else ""
+    return f"redis://{auth}{settings.REDIS_HOST}:{settings.REDIS_PORT}/{settings.REDIS_DB}"
+
+
+celery_app = Celery(
+    "blacklist",
+    broker=get_redis_url(),
+    backend=get_redis_url()
+)
+
+celery_app.conf.update(
+    task_serializer="json",
+    result_serializer="json",
+    accept_content=["json"],
+    timezone="Asia/Shanghai",
+    task_acks_late=True,
+    worker_prefetch_multiplier=1
+)
+
+
+@celery_app.task(name="screening.run_task")
+def run_screening_task(task_id: int):
+    """执行筛查任务"""
+    from app.services.screening_runner import screening_runner
+    screening_runner.run_task(task_id)
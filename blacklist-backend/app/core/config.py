@@ -40,6 +40,7 @@ class Settings(BaseSettings):
     ALLOWED_EXTENSIONS: list = ["xlsx", "xls", "csv"]
     UPLOAD_PATH: str = "./data/uploads"
     EXPORT_PATH: str = "./data/exports"
+    ORDER_IMPORT_BATCH_SIZE: int = 1000  # 订单导入每批读取和写入的行数
     
     # 匹配算法配置
     PHONE_WEIGHT: int = 100
@@ -48,6 +49,45 @@ class Settings(BaseSettings):
     ADDRESS_WEIGHT: int = 40
     MATCH_THRESHOLD: int = 70
     FUZZY_THRESHOLD: int = 80
+    TEXT_SCAN_ENABLED: bool = True  # 扫描订单备注、地址中夹带的黑名单电话/微信号（黑名单号码越多，自动机占用内存越多）
+    SIMILARITY_BACKEND: str = "difflib"  # 相似度实现：difflib（参考实现）或 levenshtein（C实现，分数略有差异）
+    NORMALIZATION_CACHE_SIZE: int = 100000  # 姓名标准化、电话/微信号提取等各缓存保留的字符串数（LRU）
+    
+    # 并行匹配配置
+    MATCHER_PROCESSES: int = min(2, os.cpu_count() or 1)  # 匹配进程数，1表示不启用进程池（接口请求已在线程池中并发执行，默认只用少量进程）
+    MATCHER_PARALLEL_MIN_ORDERS: int = 2000  # 订单数达到该值才使用进程池
+    MATCHER_CHUNK_SIZE: int = 500  # 每个进程任务处理的订单数
+    
+    # 地址LSH索引配置（黑名单地址很多时启用，近似检索，可能漏掉刚过阈值的地址）
+    ADDRESS_LSH_ENABLED: bool = False
+    ADDRESS_LSH_BANDS: int = 64  # 分段数，越多召回越高、候选越多
+    ADDRESS_LSH_ROWS: int = 2  # 每段的签名行数，越多候选越少、召回越低（同城不同街道的地址字符相似度只有0.4左右，行数为3时会漏掉）
+    ADDRESS_LSH_SHINGLE_SIZE: int = 2  # 字符片段长度
+    ADDRESS_LSH_PATH: str = "./data/index"  # 索引文件保存目录
+    
+    # 黑名单快照共享文件配置（各 worker/匹配进程只读映射同一文件，内存不随进程数增长）
+    # 所有索引都在映射上查询，打开文件不解码任何表；命中条目逐次从映射解码，匹配约比进程内快照慢 1 倍，worker 多、内存紧张时再开启
+    SNAPSHOT_STORE_ENABLED: bool = False
+    SNAPSHOT_STORE_PATH: str = "./data/snapshot"  # 快照文件保存目录
+    SNAPSHOT_PRELOAD_ON_STARTUP: bool = True  # 启动时加载已保存的快照文件（未启用共享文件时解码为进程内快照），版本过期时后台重建并暂用旧快照；重建后保存文件
+    SNAPSHOT_INCREMENTAL_ENABLED: bool = True  # 按黑名单变更历史增量更新快照
+    SNAPSHOT_INCREMENTAL_MAX_CHANGES: int = 1000  # 累计变更的黑名单超过该数量时整体重建
+    
+    # 反向筛查配置（黑名单增删改后只重新检测可能受影响的已有订单）
+    REVERSE_SCREENING_ENABLED: bool = True
+    REVERSE_SCREENING_MAX_DELTA_ORDERS: int = 20000  # 订单索引的增量订单超过该数量时整体重建
+    
+    # 检测任务执行器配置
+    DETECTION_MAX_WORKERS: int = 4  # 同时执行的检测/导入任务数
+    DETECTION_MAX_QUEUE: int = 16  # 排队等待的任务数上限，超过时返回503
+    
+    # 筛查任务配置
+    SCREENING_EXECUTOR: str = "local"  # local：进程内线程执行；celery：提交到Celery worker（需要Redis）
+    SCREENING_LOCAL_WORKERS: int = 1  # 进程内执行时同时运行的筛查任务数
+    SCREENING_CHUNK_SIZE: int = 1000  # 每批匹配并写入结果的记录数（每批提交一次检查点）
+    SCREENING_RESUME_ON_STARTUP: bool = True  # 启动时从检查点继续中断的筛查任务，并定期接管租约过期的任务
+    SCREENING_LEASE_SECONDS: int = 600  # 执行租约时长（秒），每提交一批续约；租约过期的任务可被其他执行器接管
+    SCREENING_RESUME_INTERVAL: int = 60  # 检查租约过期任务的间隔（秒）
     
     # 日志配置
     LOG_LEVEL: str = "INFO"
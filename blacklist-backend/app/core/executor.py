@@ -0,0 +1,94 @@
+"""
+阻塞任务执行器
+
+同步的数据库读写、Excel解析和黑名单匹配放到有界线程池中执行，
+避免占住事件循环导致健康检查、登录等其他请求被阻塞。
+"""
+import asyncio
+import functools
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict
+
+from app.core.config import settings
+from app.core.exceptions import ServiceUnavailableError
+
+logger = logging.getLogger(__name__)
+
+
+class BlockingTaskExecutor:
+    """有界的阻塞任务执行器（限制并发数和排队数，并记录运行指标）"""
+    
+    def __init__(self, name: str, max_workers: int, max_queue: int):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._lock = threading.Lock()
+        self._pending = 0  # 已提交未完成（排队中 + 执行中）
+        self._running = 0
+        self._completed = 0
+        self._failed = 0
+        self._rejected = 0
+    
+    async def run(self, func: Callable, *args, **kwargs) -> Any:
+        """在线程池中执行同步函数；排队已满时拒绝请求"""
+        with self._lock:
+            if self._pending >= self.max_workers + self.max_queue:
+                self._rejected += 1
+                logger.warning(f"{self.name} 执行器已满: 执行中={self._running}, 排队={self._pending - self._running}")
+                raise ServiceUnavailableError("系统繁忙，请稍后重试")
+            self._pending += 1
+        
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(
+                self._executor, functools.partial(self._call, func, *args, **kwargs)
+            )
+        finally:
+            with self._lock:
+                self._pending -= 1
+    
+    def _call(self, func: Callable, *args, **kwargs) -> Any:
+        """在工作线程中执行并统计"""
+        with self._lock:
+            self._running += 1
+        try:
+            result = func(*args, **kwargs)
+        except Exception:
+            with self._lock:
+                self._failed += 1
+            raise
+        else:
+            with self._lock:
+                self._completed += 1
+            return result
+        finally:
+            with self._lock:
+                self._running -= 1
+    
+    def stats(self) -> Dict[str, int]:
+        """运行指标"""
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "running": self._running,
+                "queued": self._pending - self._running,
+                "completed": self._completed,
+                "failed": self._failed,
+                "rejected": self._rejected
+            }
+    
+    def shutdown(self):
+        """关闭线程池"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+# 检测/导入任务执行器
+detection_executor = BlockingTaskExecutor(
+    "detection",
+    max_workers=settings.DETECTION_MAX_WORKERS,
+    max_queue=settings.DETECTION_MAX_QUEUE
+)
@@ -6,6 +6,7 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
 from fastapi.responses import JSONResponse
 from fastapi.staticfiles import StaticFiles
+from starlette.concurrency import run_in_threadpool
 import logging
 import os
 from pathlib import Path
@@ -13,6 +14,7 @@ from pathlib import Path
 from app.core.config import settings
 from app.core.database import init_db, test_connection
 from app.core.exceptions import BlacklistException
+from app.core.executor import detection_executor
 from app.api.v1 import auth, users, blacklist, screening, admin, roles, orders, blacklist_check, groups, group_detection, group_detection_simple
 
 # 配置日志
@@ -102,6 +104,17 @@ async def startup_event():
             # 初始化数据库
             init_db()
             logger.info("数据库初始化完成")
+            
+            # 映射上次保存的黑名单快照，过期时在后台重建
+            if settings.SNAPSHOT_PRELOAD_ON_STARTUP:
+                from app.services.blacklist_snapshot import blacklist_snapshot_cache
+                blacklist_snapshot_cache.preload()
+            
+            # 继续上次中断的筛查任务，并定期接管租约过期的任务
+            if settings.SCREENING_RESUME_ON_STARTUP:
+                from app.services.screening_runner import screening_runner
+                screening_runner.resume_unfinished()
+                screening_runner.start_monitor()
         else:
             logger.warning("数据库连接失败，但应用继续启动")
     except Exception as e:
@@ -113,6 +126,21 @@ async def startup_event():
 async def shutdown_event():
     """应用关闭事件"""
     logger.info("应用正在关闭...")
+    
+    # 关闭匹配进程池
+    from app.services.parallel_matcher import parallel_matcher
+    parallel_matcher.shutdown()
+    
+    # 关闭检测任务线程池
+    detection_executor.shutdown()
+    
+    # 关闭进程内筛查执行器
+    from app.services.screening_runner import screening_runner
+    screening_runner.shutdown()
+    
+    # 关闭反向筛查执行器
+    from app.services.reverse_screening import reverse_screening_runner
+    reverse_screening_runner.shutdown()
 
 
 # 根路径
@@ -130,11 +158,16 @@ async def root():
 @app.get("/health")
 async def health_check():
     """健康检查"""
-    db_status = test_connection()
+    db_status = await run_in_threadpool(test_connection)
+    from app.services.blacklist_matcher import blacklist_matcher
+    from app.services.normalization import normalization_service
     return {
         "status": "healthy" if db_status else "unhealthy",
         "database": "connected" if db_status else "disconnected",
-        "version": settings.APP_VERSION
+        "version": settings.APP_VERSION,
+        "detection_executor": detection_executor.stats(),
+        "order_fingerprint_cache": blacklist_matcher.fingerprint_stats(),
+        "normalization_cache": normalization_service.stats()
     }
 
 
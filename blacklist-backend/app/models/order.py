@@ -45,6 +45,7 @@ class Order(BaseModel):
     blacklist_risk_level = Column(String(20), comment="黑名单风险等级")
     blacklist_match_info = Column(Text, comment="黑名单匹配信息")
     blacklist_match_details = Column(Text, comment="黑名单匹配详情")
+    blacklist_checked_version = Column(String(100), comment="检测时使用的黑名单快照版本")
     
     # 关系
     group = relationship("Group", back_populates="orders")
@@ -1,7 +1,7 @@
 """
 筛查相关模型
 """
-from sqlalchemy import Column, String, Integer, ForeignKey, Text, JSON, Enum, Index, DECIMAL, Boolean
+from sqlalchemy import Column, String, Integer, ForeignKey, Text, JSON, Enum, Index, DECIMAL, Boolean, DateTime
 from sqlalchemy.orm import relationship
 from app.models.base import BaseModel
 from app.models.user import RiskLevel
@@ -22,6 +22,8 @@ class ScreeningTask(BaseModel):
     error_message = Column(Text, comment="错误信息")
     created_by = Column(Integer, ForeignKey("users.id"), comment="创建用户ID")
     completed_at = Column(String(50), comment="完成时间")
+    runner_id = Column(String(100), comment="当前执行器标识")
+    lease_expires_at = Column(DateTime, comment="执行租约到期时间")
     
     # 关系
     creator = relationship("User", back_populates="screening_tasks")
@@ -42,7 +44,7 @@ class ScreeningResult(BaseModel):
     task_id = Column(Integer, ForeignKey("screening_tasks.id"), nullable=False, comment="任务ID")
     blacklist_id = Column(Integer, ForeignKey("blacklist.id"), nullable=False, comment="黑名单ID")
     order_data = Column(JSON, comment="订单数据")
-    match_type = Column(Enum("phone", "name", "ktt_name", "address"), 
+    match_type = Column(Enum("phone", "wechat_id", "text", "name", "ktt_name", "address"), 
                        nullable=False, comment="匹配类型")
     match_score = Column(DECIMAL(5, 2), comment="匹配分数")
     match_details = Column(Text, comment="匹配详情")
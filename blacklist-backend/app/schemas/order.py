@@ -58,6 +58,7 @@ class OrderInDB(OrderBase):
     created_at: datetime
     updated_at: datetime
     is_active: bool
+    blacklist_checked_version: Optional[str] = None
 
     class Config:
         from_attributes = True
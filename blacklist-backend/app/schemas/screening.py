@@ -18,6 +18,8 @@ class TaskStatus(str, Enum):
 class MatchType(str, Enum):
     """匹配类型枚举"""
     PHONE = "phone"
+    WECHAT_ID = "wechat_id"
+    TEXT = "text"
     NAME = "name"
     KTT_NAME = "ktt_name"
     ADDRESS = "address"
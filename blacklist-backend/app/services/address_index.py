@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+地址解析与地区索引
+
+在构建黑名单快照时把标准化后的地址拆分为 省/市/区县/街道/详细地址，
+并按区县建立索引；匹配时只与同一区县（以及无法解析出区县）的黑名单地址比对。
+"""
+
+import re
+from array import array
+from typing import List, Dict, Optional, Tuple, NamedTuple, Iterable, Iterator
+
+
+# 直辖市（地址中常省略“市”，也没有省级前缀）
+MUNICIPALITIES = ("北京", "上海", "天津", "重庆")
+
+# 省级简称（地址中常省略“省”“自治区”）
+PROVINCE_NAMES = (
+    "河北", "山西", "辽宁", "吉林", "黑龙江", "江苏", "浙江", "安徽", "福建", "江西",
+    "山东", "河南", "湖北", "湖南", "广东", "海南", "四川", "贵州", "云南", "陕西",
+    "甘肃", "青海", "台湾", "内蒙古", "广西", "西藏", "宁夏", "新疆", "香港", "澳门"
+)
+
+# 行政区名称中不会出现的字符（出现即说明已进入街道/门牌部分）
+_NAME_CHARS = r"[^省路街巷号弄]"
+
+PROVINCE_PATTERN = re.compile(rf"^({_NAME_CHARS}{{1,8}}?(?:特别行政区|自治区|省))")
+CITY_PATTERN = re.compile(rf"^({_NAME_CHARS}{{1,8}}?(?:自治州|地区|盟|市))")
+DISTRICT_PATTERN = re.compile(rf"^({_NAME_CHARS}{{1,6}}?(?:区|县|旗|市))")
+STREET_PATTERN = re.compile(r"^(.{1,12}?(?:街道|大道|路|街|巷|镇|乡))")
+
+# 以“区”结尾但不是行政区的地名
+NON_DISTRICT_SUFFIXES = ("小区", "社区", "校区", "景区", "园区", "片区")
+
+
+class AddressParts(NamedTuple):
+    """地址的层级结构（未解析出的层级为空字符串）"""
+    province: str
+    city: str
+    district: str
+    street: str
+    detail: str
+
+
+def parse_address(address: str) -> AddressParts:
+    """
+    解析标准化后的地址（只含中文和字母）
+    
+    例：山东省青岛市市南区仙居路号楼单元室 ->
+    (山东省, 青岛市, 市南区, 仙居路, 号楼单元室)
+    """
+    rest = address or ""
+    province = city = district = street = ""
+    
+    # 省（直辖市同时作为省和市）
+    for name in MUNICIPALITIES:
+        if rest.startswith(name):
+            province = name
+            city = name + "市"
+            rest = rest[len(name):]
+            if rest.startswith("市"):
+                rest = rest[1:]
+            break
+    else:
+        match = PROVINCE_PATTERN.match(rest)
+        if match:
+            province = match.group(1)
+            rest = rest[match.end():]
+        else:
+            province = next((name for name in PROVINCE_NAMES if rest.startswith(name)), "")
+            rest = rest[len(province):]
+    
+    # 市
+    if not city:
+        match = CITY_PATTERN.match(rest)
+        if match:
+            city = match.group(1)
+            rest = rest[match.end():]
+    
+    # 区县
+    match = DISTRICT_PATTERN.match(rest)
+    if match and not match.group(1).endswith(NON_DISTRICT_SUFFIXES):
+        district = match.group(1)
+        rest = rest[match.end():]
+    
+    # 街道
+    match = STREET_PATTERN.match(rest)
+    if match:
+        street = match.group(1)
+        rest = rest[match.end():]
+    
+    return AddressParts(province, city, district, street, rest)
+
+
+def district_key(parts: AddressParts) -> str:
+    """
+    区县索引键
+    
+    取区县名的最后两个字：省略“市”时城市名会并入区县（如 杭州西湖区），
+    “青岛市南区”也可能被拆成 青岛市/南区，截取后与完整写法得到相同的键；
+    不同区县截取后相同只会多出候选。
+    """
+    return parts.district[-2:]
+
+
+# 未解析出区县的地址值的区县编号
+UNSCOPED = -1
+
+
+class RegionScope:
+    """
+    地址查询的候选范围：同区县的值下标加上无法解析区县的值下标
+    
+    直接引用索引中的两组下标，不拼接、不排序；按值的区县编号判断成员，
+    字符索引可以用它过滤倒排表。
+    """
+    
+    __slots__ = ("district_ids", "unscoped", "district", "value_districts")
+    
+    def __init__(self, district_ids: Tuple[int, ...], unscoped: Tuple[int, ...], district: int, value_districts: array):
+        self.district_ids = district_ids
+        self.unscoped = unscoped
+        self.district = district
+        self.value_districts = value_districts
+    
+    def __len__(self) -> int:
+        return len(self.district_ids) + len(self.unscoped)
+    
+    def __iter__(self) -> Iterator[int]:
+        yield from self.district_ids
+        yield from self.unscoped
+    
+    def __contains__(self, value_idx: int) -> bool:
+        district = self.value_districts[value_idx]
+        return district == self.district or district == UNSCOPED
+
+
+class RegionIndex:
+    """
+    地址地区索引
+    
+    按区县登记地址值的下标；未解析出区县的地址无法判断所在地区，
+    任何查询都会把它们作为候选。构建时为每个值记下区县编号，查询范围不需要再合并。
+    """
+    
+    __slots__ = ("parts", "by_district", "unscoped", "district_codes", "value_districts")
+    
+    def __init__(self, values: Iterable[str]):
+        self.parts: Tuple[AddressParts, ...] = tuple(parse_address(value) for value in values)
+        
+        by_district: Dict[str, List[int]] = {}
+        unscoped: List[int] = []
+        for value_idx, parts in enumerate(self.parts):
+            if parts.district:
+                by_district.setdefault(district_key(parts), []).append(value_idx)
+            else:
+                unscoped.append(value_idx)
+        self._index_districts(
+            {district: tuple(value_ids) for district, value_ids in by_district.items()}, tuple(unscoped)
+        )
+    
+    def _index_districts(self, by_district: Dict[str, Tuple[int, ...]], unscoped: Tuple[int, ...]):
+        """登记各区县的值下标，并为每个值记下区县编号"""
+        self.by_district = by_district
+        self.unscoped = unscoped
+        self.district_codes: Dict[str, int] = {district: code for code, district in enumerate(by_district)}
+        self.value_districts = array("i", [UNSCOPED]) * len(self)
+        for code, value_ids in enumerate(by_district.values()):
+            for value_idx in value_ids:
+                self.value_districts[value_idx] = code
+    
+    def __len__(self) -> int:
+        return len(self.parts)
+    
+    def district_code(self, district: str) -> int:
+        """区县编号（登记顺序），索引中没有的区县返回 UNSCOPED - 1"""
+        return self.district_codes.get(district, UNSCOPED - 1)
+    
+    def scope(self, address: str) -> Optional[RegionScope]:
+        """与地址同区县的候选值下标；地址没有区县信息时返回 None（不限制）"""
+        parts = parse_address(address)
+        if not parts.district:
+            return None
+        district = district_key(parts)
+        # 索引中没有的区县编号为 -2，只匹配无法解析区县的值
+        return RegionScope(
+            self.by_district.get(district, ()), self.unscoped, self.district_code(district), self.value_districts
+        )
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+地址 MinHash/LSH 索引
+
+黑名单地址达到几十万条时，字符倒排索引的候选集会随地址数线性增长
+（同省同市的地址共有大量字符）。这里把地址切成字符片段（shingle），
+计算 MinHash 签名并分段（band）分桶，查询只取至少一个分段落入同一桶的地址，
+候选数与地址总数基本无关；候选再用 SequenceMatcher 精确确认。
+
+分段数越多、每段行数越少，召回越高、候选越多；LSH 是近似检索，
+相似度刚过阈值的地址有可能漏掉。索引可以保存到磁盘，
+相同的地址集合在进程重启后直接加载，不必重新计算签名；
+地址集合变化后旧的索引文件只保留最近使用的两个。
+"""
+
+import os
+import pickle
+import hashlib
+import logging
+import zlib
+from typing import List, Dict, Optional, Tuple, Iterable
+
+import numpy as np
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+# 哈希取模用的素数（大于 2^32）
+_PRIME = np.uint64(4294967311)
+
+# 索引文件格式版本（签名计算方式变化时递增）
+INDEX_FORMAT_VERSION = 1
+
+# 保留的索引文件数（最近使用的）
+_KEEP_INDEX_FILES = 2
+
+
+def shingles(value: str, size: int) -> List[str]:
+    """切分字符片段（不足一个片段长度的地址整体作为一个片段）"""
+    if len(value) <= size:
+        return [value] if value else []
+    return [value[i:i + size] for i in range(len(value) - size + 1)]
+
+
+class AddressLSH:
+    """
+    地址 MinHash/LSH 索引
+    
+    values 是快照地址索引中的地址值，查询结果为这些值的下标。
+    """
+    
+    __slots__ = ("bands", "rows", "shingle_size", "seed", "size", "coef_a", "coef_b", "buckets")
+    
+    def __init__(
+        self,
+        values: Iterable[str],
+        bands: int = None,
+        rows: int = None,
+        shingle_size: int = None,
+        seed: int = 1
+    ):
+        self.bands = bands or settings.ADDRESS_LSH_BANDS
+        self.rows = rows or settings.ADDRESS_LSH_ROWS
+        self.shingle_size = shingle_size or settings.ADDRESS_LSH_SHINGLE_SIZE
+        self.seed = seed
+        
+        # 每个签名位置使用一个 (a*h+b) mod p 的哈希函数
+        num_perm = self.bands * self.rows
+        generator = np.random.RandomState(seed)
+        self.coef_a = generator.randint(1, 2 ** 31, size=num_perm, dtype=np.int64).astype(np.uint64)
+        self.coef_b = generator.randint(0, 2 ** 31, size=num_perm, dtype=np.int64).astype(np.uint64)
+        
+        buckets: List[Dict[bytes, List[int]]] = [{} for _ in range(self.bands)]
+        size = 0
+        for value_idx, value in enumerate(values):
+            size += 1
+            signature = self.signature(value)
+            if signature is None:
+                continue
+            for band, key in enumerate(self._band_keys(signature)):
+                buckets[band].setdefault(key, []).append(value_idx)
+        self.size = size
+        self.buckets: Tuple[Dict[bytes, Tuple[int, ...]], ...] = tuple(
+            {key: tuple(value_ids) for key, value_ids in band_buckets.items()}
+            for band_buckets in buckets
+        )
+    
+    def __len__(self) -> int:
+        return self.size
+    
+    def __repr__(self):
+        return f"<AddressLSH(size={self.size}, bands={self.bands}, rows={self.rows})>"
+    
+    def signature(self, value: str) -> Optional[np.ndarray]:
+        """计算 MinHash 签名，空地址返回 None"""
+        parts = shingles(value, self.shingle_size)
+        if not parts:
+            return None
+        hashes = np.fromiter(
+            (zlib.crc32(part.encode("utf-8")) for part in set(parts)),
+            dtype=np.uint64
+        )
+        return ((np.outer(self.coef_a, hashes) + self.coef_b[:, None]) % _PRIME).min(axis=1)
+    
+    def _band_keys(self, signature: np.ndarray) -> List[bytes]:
+        """签名按分段切开作为桶键"""
+        return [signature[band * self.rows:(band + 1) * self.rows].tobytes() for band in range(self.bands)]
+    
+    def query(self, value: str) -> List[int]:
+        """返回与地址至少有一个分段落入同一桶的地址下标（升序）"""
+        signature = self.signature(value)
+        if signature is None:
+            return []
+        
+        value_ids = set()
+        for band, key in enumerate(self._band_keys(signature)):
+            value_ids.update(self.buckets[band].get(key, ()))
+        return sorted(value_ids)
+    
+    def save(self, path: str):
+        """保存到磁盘（先写临时文件再替换，避免其他进程读到不完整的文件）"""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as f:
+            pickle.dump((INDEX_FORMAT_VERSION, self), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, path)
+    
+    @classmethod
+    def load(cls, path: str) -> Optional["AddressLSH"]:
+        """从磁盘加载，文件不存在或格式不符时返回 None"""
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "rb") as f:
+                format_version, index = pickle.load(f)
+        except Exception as e:
+            logger.warning(f"地址LSH索引文件读取失败: {path}: {e}")
+            return None
+        if format_version != INDEX_FORMAT_VERSION or not isinstance(index, cls):
+            return None
+        return index
+
+
+def index_path(values: Tuple[str, ...], bands: int, rows: int, shingle_size: int) -> str:
+    """索引文件路径（由地址集合和索引参数决定，地址变化后自动使用新文件）"""
+    digest = hashlib.sha1()
+    digest.update(f"{INDEX_FORMAT_VERSION}:{bands}:{rows}:{shingle_size}".encode("utf-8"))
+    for value in values:
+        digest.update(b"\0")
+        digest.update(value.encode("utf-8"))
+    return os.path.join(settings.ADDRESS_LSH_PATH, f"address_lsh_{digest.hexdigest()[:16]}.pkl")
+
+
+def _remove_old_indexes(keep: str):
+    """删除旧地址集合的索引文件（按修改时间保留最近使用的几个，加载时会更新修改时间）"""
+    directory = settings.ADDRESS_LSH_PATH
+    if not os.path.isdir(directory):
+        return
+    paths = [
+        os.path.join(directory, name) for name in os.listdir(directory)
+        if name.startswith("address_lsh_") and name.endswith(".pkl")
+    ]
+    paths.sort(key=os.path.getmtime, reverse=True)
+    for path in paths[_KEEP_INDEX_FILES:]:
+        if path == keep:
+            continue
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def get_address_lsh(values: Tuple[str, ...]) -> AddressLSH:
+    """加载与地址集合对应的索引文件，不存在时构建并保存"""
+    bands = settings.ADDRESS_LSH_BANDS
+    rows = settings.ADDRESS_LSH_ROWS
+    shingle_size = settings.ADDRESS_LSH_SHINGLE_SIZE
+    path = index_path(values, bands, rows, shingle_size)
+    
+    index = AddressLSH.load(path)
+    if index is not None and len(index) == len(values):
+        logger.info(f"已加载地址LSH索引: {path}")
+        try:
+            # 标记为最近使用，清理时保留
+            os.utime(path)
+        except OSError:
+            pass
+        return index
+    
+    index = AddressLSH(values, bands=bands, rows=rows, shingle_size=shingle_size)
+    try:
+        index.save(path)
+        logger.info(f"地址LSH索引已保存: {path}, 地址数={len(index)}")
+        _remove_old_indexes(path)
+    except OSError as e:
+        logger.warning(f"地址LSH索引保存失败: {e}")
+    return index
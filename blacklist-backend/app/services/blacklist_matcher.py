@@ -4,41 +4,275 @@
 黑名单匹配服务
 """
 
-import re
-from typing import List, Dict, Any, Optional, Tuple
+import time
+import logging
+import threading
+from typing import List, Dict, Any, Optional, Tuple, Iterable, NamedTuple
 from difflib import SequenceMatcher
+from app.core.config import settings
 from app.models.blacklist import Blacklist
 from app.models.order import Order
-from app.models.user import RiskLevel
+from app.services.normalization import normalization_service
+
+logger = logging.getLogger(__name__)
+
+
+class OrderFingerprint(NamedTuple):
+    """订单指纹：参与匹配的各字段标准化后的值，指纹相同的订单匹配结果相同"""
+    phones: Tuple[str, ...]
+    name: str
+    consignee: str
+    address: str
+    wechat_text: str
+    free_text: str
+
+
+class DifflibSimilarity:
+    """
+    difflib 相似度（参考实现）
+    
+    ratio() = 2*M/(len(a)+len(b))，M 为 SequenceMatcher 找到的匹配块字符数。
+    """
+    
+    name = "difflib"
+    
+    def ratio(self, str1: str, str2: str) -> float:
+        return SequenceMatcher(None, str1, str2).ratio()
+    
+    def ratio_at_least(self, str1: str, str2: str, threshold: float) -> float:
+        """
+        计算相似度，确定达不到阈值时提前返回 0.0
+        
+        依次用三个上界排除：长度比 2*min/(len1+len2)、real_quick_ratio（同为长度上界）、
+        quick_ratio（共有字符多重集合上界），都达到阈值才计算精确的 ratio()。
+        """
+        length1 = len(str1)
+        length2 = len(str2)
+        if 2.0 * min(length1, length2) / (length1 + length2) < threshold:
+            return 0.0
+        
+        matcher = SequenceMatcher(None, str1, str2)
+        if matcher.real_quick_ratio() < threshold or matcher.quick_ratio() < threshold:
+            return 0.0
+        return matcher.ratio()
+
+
+class LevenshteinSimilarity:
+    """
+    python-Levenshtein 相似度（C 实现）
+    
+    ratio() = 2*LCS/(len(a)+len(b))（插入/删除编辑距离归一化）。SequenceMatcher
+    的匹配字符数不超过最长公共子序列，因此分数不低于 difflib，个别字符串会高出一些；
+    字符索引和删除邻域索引的候选上界对两种实现都成立。
+    """
+    
+    name = "levenshtein"
+    
+    def __init__(self):
+        from Levenshtein import ratio
+        self._ratio = ratio
+    
+    def ratio(self, str1: str, str2: str) -> float:
+        return self._ratio(str1, str2)
+    
+    def ratio_at_least(self, str1: str, str2: str, threshold: float) -> float:
+        """
+        计算相似度，低于阈值时返回 0.0
+        
+        不使用 score_cutoff 参数：它在分数恰好等于阈值时（如 0.8）会因浮点误差返回 0。
+        """
+        similarity = self._ratio(str1, str2)
+        return similarity if similarity >= threshold else 0.0
+
+
+# 可选的相似度实现
+SIMILARITY_BACKENDS = {
+    DifflibSimilarity.name: DifflibSimilarity,
+    LevenshteinSimilarity.name: LevenshteinSimilarity
+}
+
+
+def get_similarity_backend(name: str = None) -> Any:
+    """按名称创建相似度实现，C 扩展不可用时退回 difflib"""
+    name = name or settings.SIMILARITY_BACKEND
+    backend_class = SIMILARITY_BACKENDS.get(name)
+    if backend_class is None:
+        raise ValueError(f"未知的相似度实现: {name}，可选: {', '.join(SIMILARITY_BACKENDS)}")
+    try:
+        return backend_class()
+    except ImportError as e:
+        logger.warning(f"相似度实现 {name} 不可用，改用 difflib: {e}")
+        return DifflibSimilarity()
+
+
+def calibrate_similarity_backends(
+    samples: Iterable[Tuple[str, str, Optional[bool]]],
+    threshold: float,
+    backend_names: List[str] = None
+) -> Dict[str, Any]:
+    """
+    校准：在带标注的样本上比较各相似度实现
+    
+    samples 逐个产生 (值1, 值2, 是否应当匹配)，标注可以为 None。值按 normalize_name 标准化。
+    以 difflib 为基准统计分数偏差和阈值判定不一致的样本数；有标注时统计各实现的查准率/召回率。
+    """
+    backend_names = backend_names or list(SIMILARITY_BACKENDS)
+    backends = {name: get_similarity_backend(name) for name in backend_names}
+    reference = DifflibSimilarity()
+    matcher = BlacklistMatcher()
+    
+    pairs = []
+    for value1, value2, label in samples:
+        normalized1 = matcher.normalize_name(value1)
+        normalized2 = matcher.normalize_name(value2)
+        if normalized1 and normalized2:
+            pairs.append((normalized1, normalized2, label))
+    reference_scores = [reference.ratio(value1, value2) for value1, value2, _ in pairs]
+    
+    report = {"samples": len(pairs), "threshold": threshold, "backends": {}}
+    for name, backend in backends.items():
+        start = time.perf_counter()
+        scores = [backend.ratio(value1, value2) for value1, value2, _ in pairs]
+        elapsed = time.perf_counter() - start
+        
+        differences = [abs(score - reference_score) for score, reference_score in zip(scores, reference_scores)]
+        disagreements = [
+            {"value1": value1, "value2": value2, "score": score, "reference_score": reference_score}
+            for (value1, value2, _), score, reference_score in zip(pairs, scores, reference_scores)
+            if (score >= threshold) != (reference_score >= threshold)
+        ]
+        
+        stats = {
+            "backend": backend.name,
+            "seconds": round(elapsed, 4),
+            "mean_difference": sum(differences) / len(differences) if differences else 0.0,
+            "max_difference": max(differences, default=0.0),
+            "decision_disagreements": len(disagreements),
+            "disagreement_examples": disagreements[:20]
+        }
+        
+        labeled = [(score >= threshold, label) for score, (_, _, label) in zip(scores, pairs) if label is not None]
+        if labeled:
+            true_positive = sum(1 for predicted, label in labeled if predicted and label)
+            predicted_positive = sum(1 for predicted, _ in labeled if predicted)
+            actual_positive = sum(1 for _, label in labeled if label)
+            stats["precision"] = true_positive / predicted_positive if predicted_positive else None
+            stats["recall"] = true_positive / actual_positive if actual_positive else None
+        
+        report["backends"][name] = stats
+    return report
 
 
 class BlacklistMatcher:
     """黑名单匹配器"""
     
-    def __init__(self):
-        self.phone_pattern = re.compile(r'1[3-9]\d{9}')  # 手机号正则
+    def __init__(self, similarity_backend: Any = None):
+        self.normalizer = normalization_service  # 字段标准化（按原始字符串缓存结果）
+        self.wechat_text_fields = ("member_remarks", "group_leader_remarks", "consignee")  # 订单中查找微信号的字段
+        self.free_text_fields = ("member_remarks", "group_leader_remarks", "detailed_address")  # 扫描黑名单电话/微信号的字段
         self.name_similarity_threshold = 0.8  # 姓名相似度阈值
         self.phone_similarity_threshold = 0.9  # 电话相似度阈值
         self.address_similarity_threshold = 0.7  # 地址相似度阈值
+        self.address_region_filter = True  # 地址只与同区县（或无法解析区县）的黑名单地址比对
+        self.similarity_backend = similarity_backend or get_similarity_backend()  # 相似度实现
+        self.pinyin_name_match = True  # 下单人/收货人与黑名单姓名拼音相同也视为姓名匹配（需要 pypinyin）
+        self.pinyin_full_score = 0.9  # 全拼相同的匹配分数
+        self.pinyin_initials_score = 0.8  # 首字母相同（至少三个字）且全拼或字面相似度达到姓名阈值的匹配分数
+        self._fingerprint_lock = threading.Lock()
+        self._fingerprint_orders = 0  # 批量检测累计订单数
+        self._fingerprint_hits = 0  # 其中指纹与同批前面订单相同、直接复用结果的订单数
     
     def extract_phones(self, text: str) -> List[str]:
-        """从文本中提取电话号码"""
-        if not text:
-            return []
-        phones = self.phone_pattern.findall(str(text))
-        return list(set(phones))  # 去重
+        """从文本中提取电话号码（去重，保持出现顺序）"""
+        return list(self.normalizer.extract_phones(text))
+    
+    def extract_wechat_ids(self, text: str) -> List[str]:
+        """从文本中提取微信号（转为小写，去重并保持顺序）"""
+        return list(self.normalizer.extract_wechat_ids(text))
+    
+    def order_wechat_text(self, order: Any) -> str:
+        """订单中查找微信号的文本（备注、收货人等字段拼接）"""
+        texts = [getattr(order, field) for field in self.wechat_text_fields]
+        return "\n".join(str(text) for text in texts if text)
+    
+    def order_wechat_ids(self, order: Any) -> List[str]:
+        """提取订单备注、收货人等字段中的微信号（各字段拼接后一次扫描）"""
+        return self.extract_wechat_ids(self.order_wechat_text(order))
+    
+    def lookup_wechat(self, wechat_ids: List[str], wechat_index: Dict[str, Tuple[int, ...]]) -> Dict[int, Tuple[float, str]]:
+        """通过微信号索引查找精确命中的黑名单项"""
+        hits: Dict[int, Tuple[float, str]] = {}
+        if not wechat_index:
+            return hits
+        for wechat_id in wechat_ids:
+            for entry_pos in wechat_index.get(wechat_id, ()):
+                hits.setdefault(entry_pos, (1.0, f"微信号匹配: {wechat_id}"))
+        return hits
+    
+    def order_free_text(self, order: Any) -> str:
+        """订单自由文本（各字段用换行分隔，命中不会跨字段）"""
+        texts = [getattr(order, field) for field in self.free_text_fields]
+        return "\n".join(str(text) for text in texts if text)
+    
+    def lookup_free_text(self, text: str, snapshot: Any) -> Dict[int, Tuple[float, str]]:
+        """用快照的 Aho–Corasick 扫描器查找自由文本中出现的黑名单电话/微信号"""
+        from app.services.text_scanner import PHONE_TOKEN
+        
+        hits: Dict[int, Tuple[float, str]] = {}
+        scanner = snapshot.text_scanner
+        if not text or scanner is None:
+            return hits
+        
+        for token_idx in scanner.scan(text):
+            token = scanner.tokens[token_idx]
+            label = "电话" if scanner.kinds[token_idx] == PHONE_TOKEN else "微信号"
+            for entry_pos in scanner.owners[token_idx]:
+                hits.setdefault(entry_pos, (1.0, f"文本中出现黑名单{label}: {token}"))
+        return hits
+    
+    def order_fingerprint(self, order: Any) -> OrderFingerprint:
+        """计算订单指纹"""
+        return OrderFingerprint(
+            tuple(self.extract_phones(order.contact_phone)),
+            self.normalize_name(order.orderer),
+            self.normalize_name(order.consignee),
+            self.normalize_name(order.detailed_address),
+            self.order_wechat_text(order),
+            self.order_free_text(order)
+        )
+    
+    def fingerprint_stats(self) -> Dict[str, Any]:
+        """批量检测的指纹去重统计（命中即复用同批订单的匹配结果）"""
+        with self._fingerprint_lock:
+            orders, hits = self._fingerprint_orders, self._fingerprint_hits
+        return {
+            "orders": orders,
+            "distinct": orders - hits,
+            "hits": hits,
+            "hit_rate": round(hits / orders, 4) if orders else 0.0
+        }
     
     def normalize_name(self, name: str) -> str:
         """标准化姓名（去除空格、特殊字符）"""
-        if not name:
-            return ""
-        return re.sub(r'[^\u4e00-\u9fa5a-zA-Z]', '', str(name)).strip()
+        return self.normalizer.normalize_name(name)
     
     def calculate_similarity(self, str1: str, str2: str) -> float:
         """计算字符串相似度"""
         if not str1 or not str2:
             return 0.0
-        return SequenceMatcher(None, str1, str2).ratio()
+        return self.similarity_backend.ratio(str1, str2)
+    
+    def similarity_at_least(self, str1: str, str2: str, threshold: float) -> float:
+        """
+        计算字符串相似度，确定达不到阈值时提前返回 0.0
+        
+        达到阈值时返回值与 calculate_similarity 完全相同。
+        """
+        if not str1 or not str2:
+            return 0.0
+        if threshold <= 0:
+            return self.calculate_similarity(str1, str2)
+        return self.similarity_backend.ratio_at_least(str1, str2, threshold)
     
     def match_phone(self, order_phone: str, blacklist_phones: List[str]) -> Tuple[bool, float, str]:
         """匹配电话号码"""
@@ -54,92 +288,427 @@ class BlacklistMatcher:
                 if isinstance(blacklist_phone, str):
                     blacklist_phones_extracted = self.extract_phones(blacklist_phone)
                     for bp in blacklist_phones_extracted:
-                        similarity = self.calculate_similarity(order_phone_num, bp)
+                        similarity = self.similarity_at_least(order_phone_num, bp, self.phone_similarity_threshold)
                         if similarity >= self.phone_similarity_threshold:
                             return True, similarity, f"电话匹配: {order_phone_num} ≈ {bp}"
         
         return False, 0.0, ""
     
-    def match_name(self, order_name: str, blacklist_names: List[str]) -> Tuple[bool, float, str]:
-        """匹配姓名"""
-        if not order_name or not blacklist_names:
-            return False, 0.0, ""
+    def get_blacklist_phones(self, blacklist_item: Blacklist) -> List[str]:
+        """提取黑名单项中的手机号（去重，保持原有顺序）"""
+        raw_phones = blacklist_item.phone_numbers
+        if not raw_phones:
+            return []
+        if not isinstance(raw_phones, list):
+            raw_phones = [str(raw_phones)]
         
-        normalized_order_name = self.normalize_name(order_name)
-        if not normalized_order_name:
-            return False, 0.0, ""
+        phones = []
+        for raw_phone in raw_phones:
+            if not isinstance(raw_phone, str):
+                continue
+            for phone in self.normalizer.extract_phones(raw_phone):
+                if phone not in phones:
+                    phones.append(phone)
+        return phones
+    
+    def find_near_phones(
+        self,
+        phone: str,
+        phone_index: Dict[str, Tuple[int, ...]],
+        deletion_index: Optional[Any] = None
+    ) -> Dict[str, float]:
+        """
+        查找与单个号码近似（错一位等，不含完全相同）的黑名单号码，返回 号码 -> 相似度
         
-        for blacklist_name in blacklist_names:
-            if not blacklist_name:
+        有删除邻域索引且阈值在其覆盖范围内时只比对索引给出的候选号码，
+        否则逐个比对索引中的全部号码。
+        """
+        if deletion_index is not None and deletion_index.covers(phone, self.phone_similarity_threshold):
+            candidate_phones = deletion_index.candidates(phone)
+        else:
+            candidate_phones = phone_index.keys()
+        
+        near_phones: Dict[str, float] = {}
+        for blacklist_phone in candidate_phones:
+            if blacklist_phone == phone:
                 continue
-            normalized_blacklist_name = self.normalize_name(str(blacklist_name))
-            if not normalized_blacklist_name:
+            similarity = self.similarity_at_least(phone, blacklist_phone, self.phone_similarity_threshold)
+            if similarity >= self.phone_similarity_threshold:
+                near_phones[blacklist_phone] = similarity
+        return near_phones
+    
+    def merge_phone_hits(
+        self,
+        order_phones: List[str],
+        phone_index: Dict[str, Tuple[int, ...]],
+        near_phones: Dict[str, Dict[str, float]],
+        entries: Any
+    ) -> Dict[int, Tuple[float, str]]:
+        """
+        合并一个订单所有号码的命中
+        
+        与逐项比对的顺序相同：按订单号码的顺序，每个号码再按黑名单项中号码的顺序，
+        取第一个达到阈值（精确或近似）的号码对作为该黑名单项的命中。
+        """
+        hits: Dict[int, Tuple[float, str]] = {}
+        for order_phone_num in order_phones:
+            matched_phones = dict(near_phones[order_phone_num])
+            if order_phone_num in phone_index:
+                matched_phones[order_phone_num] = 1.0
+            if not matched_phones:
                 continue
             
-            similarity = self.calculate_similarity(normalized_order_name, normalized_blacklist_name)
-            if similarity >= self.name_similarity_threshold:
-                return True, similarity, f"姓名匹配: {normalized_order_name} ≈ {normalized_blacklist_name}"
+            entry_positions = set()
+            for blacklist_phone in matched_phones:
+                entry_positions.update(phone_index[blacklist_phone])
+            for entry_pos in sorted(entry_positions):
+                if entry_pos in hits:
+                    continue
+                for blacklist_phone in entries[entry_pos].phones:
+                    if blacklist_phone in matched_phones:
+                        hits[entry_pos] = (
+                            matched_phones[blacklist_phone], f"电话匹配: {order_phone_num} ≈ {blacklist_phone}"
+                        )
+                        break
+        return hits
+    
+    def lookup_phone(self, order_phone: str, snapshot: Any) -> Dict[int, Tuple[float, str]]:
+        """
+        通过快照的电话索引查找命中的黑名单项
+        
+        精确命中直接查字典；近似命中（错一位等）通过删除邻域索引取候选号码后
+        再计算相似度。返回 快照条目位置 -> (相似度, 匹配详情)。
+        """
+        phone_index = snapshot.phone_index
+        if not order_phone or not phone_index:
+            return {}
+        
+        order_phones = self.extract_phones(order_phone)
+        near_phones = {
+            phone: self.find_near_phones(phone, phone_index, snapshot.phone_deletion_index) for phone in order_phones
+        }
+        return self.merge_phone_hits(order_phones, phone_index, near_phones, snapshot.entries)
+    
+    def match_normalized(
+        self,
+        normalized_value: str,
+        normalized_candidates: Tuple[str, ...],
+        threshold: float,
+        label: str
+    ) -> Tuple[bool, float, str]:
+        """在已标准化的候选值中查找第一个达到阈值的匹配"""
+        if not normalized_value:
+            return False, 0.0, ""
+        
+        for normalized_candidate in normalized_candidates:
+            similarity = self.similarity_at_least(normalized_value, normalized_candidate, threshold)
+            if similarity >= threshold:
+                return True, similarity, f"{label}: {normalized_value} ≈ {normalized_candidate}"
         
         return False, 0.0, ""
     
+    def normalize_values(self, values: List[Optional[str]]) -> Tuple[str, ...]:
+        """批量标准化，丢弃空值"""
+        normalized_values = []
+        for value in values:
+            if not value:
+                continue
+            normalized = self.normalize_name(str(value))
+            if normalized:
+                normalized_values.append(normalized)
+        return tuple(normalized_values)
+    
+    def lookup_indexed(
+        self,
+        normalized_value: str,
+        snapshot: Any,
+        index: Any,
+        entry_field: str,
+        threshold: float,
+        label: str,
+        scope: Optional[List[int]] = None
+    ) -> Dict[int, Tuple[float, str]]:
+        """
+        通过快照的字符索引查找模糊命中的黑名单项
+        
+        只对索引筛出的候选值计算相似度；同一黑名单项有多个值命中时按字段顺序取第一个，
+        与逐项调用 match_name / match_address 的结果一致。
+        scope 为候选值下标范围（如同区县的地址），为 None 时不限制。
+        返回 快照条目位置 -> (相似度, 匹配详情)。
+        """
+        hits: Dict[int, Tuple[float, str]] = {}
+        if not normalized_value:
+            return hits
+        
+        matched_values: Dict[str, float] = {}
+        matched_entries = set()
+        for value_idx in index.candidates(normalized_value, threshold, scope):
+            value = index.values[value_idx]
+            similarity = self.similarity_at_least(normalized_value, value, threshold)
+            if similarity >= threshold:
+                matched_values[value] = similarity
+                matched_entries.update(index.owners[value_idx])
+        
+        for entry_pos in sorted(matched_entries):
+            for value in getattr(snapshot.entries[entry_pos], entry_field):
+                if value in matched_values:
+                    hits[entry_pos] = (matched_values[value], f"{label}: {normalized_value} ≈ {value}")
+                    break
+        
+        return hits
+    
+    def lookup_name(self, normalized_order_name: str, snapshot: Any) -> Dict[int, Tuple[float, str]]:
+        """通过姓名索引查找命中的黑名单项（ktt_name、wechat_name、order_name_phone 依次优先）"""
+        return self.lookup_indexed(
+            normalized_order_name, snapshot, snapshot.name_index, "names", self.name_similarity_threshold, "姓名匹配"
+        )
+    
+    def pinyin_hit(self, normalized_name: str, keys: Any, value: str, value_full: str) -> Optional[Tuple[float, str]]:
+        """
+        拼音键命中的姓名值是否算作匹配（keys 为订单姓名的拼音键，value_full 为姓名值的全拼）
+        
+        全拼相同即匹配；只有首字母相同时，全拼或字面相似度达到姓名阈值才算匹配。
+        """
+        if keys.full == value_full:
+            return self.pinyin_full_score, f"姓名拼音匹配: {normalized_name} ≈ {value} ({keys.full})"
+        threshold = self.name_similarity_threshold
+        if (
+            self.similarity_at_least(keys.full, value_full, threshold) < threshold
+            and self.similarity_at_least(normalized_name, value, threshold) < threshold
+        ):
+            return None
+        return (
+            self.pinyin_initials_score,
+            f"姓名拼音首字母匹配: {normalized_name} ≈ {value} ({keys.initials}, {keys.full} ≈ {value_full})"
+        )
+    
+    def lookup_pinyin(self, normalized_name: str, snapshot: Any) -> Dict[int, Tuple[float, str]]:
+        """
+        通过拼音索引查找同音/异体字姓名命中的黑名单项
+        
+        全拼相同优先于首字母相同；首字母相同只是候选，全拼或字面相似度达到姓名阈值
+        才算命中。同一黑名单项有多个姓名命中时取分数最高的，分数相同按字段顺序取第一个。
+        """
+        hits: Dict[int, Tuple[float, str]] = {}
+        pinyin_index = snapshot.name_pinyin
+        if not normalized_name or not self.pinyin_name_match or pinyin_index is None:
+            return hits
+        
+        keys, full_ids, initials_ids = pinyin_index.lookup(normalized_name)
+        if keys is None or not (full_ids or initials_ids):
+            return hits
+        
+        index = snapshot.name_index
+        matched_values: Dict[str, Tuple[float, str]] = {}
+        matched_entries = set()
+        for value_idx in initials_ids:
+            value = index.values[value_idx]
+            hit = self.pinyin_hit(normalized_name, keys, value, pinyin_index.full_key(value_idx))
+            if hit is not None:
+                matched_values[value] = hit
+                matched_entries.update(index.owners[value_idx])
+        for value_idx in full_ids:
+            value = index.values[value_idx]
+            matched_values[value] = self.pinyin_hit(normalized_name, keys, value, keys.full)
+            matched_entries.update(index.owners[value_idx])
+        
+        for entry_pos in sorted(matched_entries):
+            entry_hits = [matched_values[value] for value in snapshot.entries[entry_pos].names if value in matched_values]
+            hits[entry_pos] = max(entry_hits, key=lambda hit: hit[0])
+        
+        return hits
+    
+    def merge_hits(self, *hit_groups: Dict[int, Tuple[float, str]]) -> Dict[int, Tuple[float, str]]:
+        """合并多组命中，同一黑名单项取排在前面的一组"""
+        non_empty = [hits for hits in hit_groups if hits]
+        if len(non_empty) <= 1:
+            return non_empty[0] if non_empty else {}
+        
+        merged: Dict[int, Tuple[float, str]] = {}
+        for hits in non_empty:
+            for entry_pos, hit in hits.items():
+                merged.setdefault(entry_pos, hit)
+        return merged
+    
+    def lookup_order_names(self, order: Any, snapshot: Any) -> Dict[int, Tuple[float, str]]:
+        """订单的姓名命中：下单人字面匹配优先，再补充下单人、收货人的拼音匹配"""
+        normalized_orderer = self.normalize_name(order.orderer)
+        return self.merge_hits(
+            self.lookup_name(normalized_orderer, snapshot),
+            self.lookup_pinyin(normalized_orderer, snapshot),
+            self.lookup_pinyin(self.normalize_name(order.consignee), snapshot)
+        )
+    
+    def lookup_address(self, normalized_order_address: str, snapshot: Any) -> Dict[int, Tuple[float, str]]:
+        """
+        通过地址索引查找命中的黑名单项（order_address1、order_address2 依次优先）
+        
+        订单地址能解析出区县时，只与同区县及无法解析区县的黑名单地址比对；
+        快照带有地址LSH索引时，只比对LSH检索出的候选地址。
+        """
+        if not normalized_order_address:
+            return {}
+        
+        scope = None
+        if self.address_region_filter:
+            scope = snapshot.address_regions.scope(normalized_order_address)
+        if snapshot.address_lsh is not None:
+            lsh_candidates = snapshot.address_lsh.query(normalized_order_address)
+            scope = lsh_candidates if scope is None else [value_idx for value_idx in lsh_candidates if value_idx in scope]
+        return self.lookup_indexed(
+            normalized_order_address, snapshot, snapshot.address_index, "addresses",
+            self.address_similarity_threshold, "地址匹配", scope
+        )
+    
+    def match_name(self, order_name: str, blacklist_names: List[str]) -> Tuple[bool, float, str]:
+        """匹配姓名"""
+        if not order_name or not blacklist_names:
+            return False, 0.0, ""
+        
+        return self.match_normalized(
+            self.normalize_name(order_name), self.normalize_values(blacklist_names),
+            self.name_similarity_threshold, "姓名匹配"
+        )
+    
     def match_address(self, order_address: str, blacklist_addresses: List[str]) -> Tuple[bool, float, str]:
         """匹配地址"""
         if not order_address or not blacklist_addresses:
             return False, 0.0, ""
         
-        normalized_order_address = self.normalize_name(order_address)
-        if not normalized_order_address:
-            return False, 0.0, ""
+        return self.match_normalized(
+            self.normalize_name(order_address), self.normalize_values(blacklist_addresses),
+            self.address_similarity_threshold, "地址匹配"
+        )
+    
+    def match_order_with_blacklist(self, order: Order, blacklist_item: Blacklist) -> Dict[str, Any]:
+        """
+        匹配单个订单与黑名单项
         
-        for blacklist_address in blacklist_addresses:
-            if not blacklist_address:
-                continue
-            normalized_blacklist_address = self.normalize_name(str(blacklist_address))
-            if not normalized_blacklist_address:
+        不建立索引，直接逐个比较这一条黑名单的值，结果与快照匹配时该黑名单项的结果相同
+        （地址LSH为近似检索，这里总是精确比较）。
+        """
+        from app.services.blacklist_snapshot import BlacklistSnapshot
+        
+        entry = BlacklistSnapshot.build_entry(blacklist_item, self)
+        normalized_orderer = self.normalize_name(order.orderer)
+        name_hit = self.match_entry_name(normalized_orderer, entry)
+        for normalized_name in (normalized_orderer, self.normalize_name(order.consignee)):
+            if name_hit is None:
+                name_hit = self.match_entry_pinyin(normalized_name, entry)
+        
+        return self.build_match_result(
+            entry,
+            self.match_entry_phone(self.extract_phones(order.contact_phone), entry),
+            name_hit,
+            self.match_entry_address(self.normalize_name(order.detailed_address), entry),
+            self.match_entry_wechat(self.order_wechat_ids(order), entry),
+            self.match_entry_text(self.order_free_text(order), entry)
+        )
+    
+    def match_entry_phone(self, order_phones: Iterable[str], entry: Any) -> Optional[Tuple[float, str]]:
+        """订单号码与单个快照条目的电话命中（按订单号码、条目号码的顺序取第一个达到阈值的号码对）"""
+        for order_phone_num in order_phones:
+            for blacklist_phone in entry.phones:
+                similarity = self.similarity_at_least(order_phone_num, blacklist_phone, self.phone_similarity_threshold)
+                if similarity >= self.phone_similarity_threshold:
+                    return similarity, f"电话匹配: {order_phone_num} ≈ {blacklist_phone}"
+        return None
+    
+    def match_entry_wechat(self, wechat_ids: Iterable[str], entry: Any) -> Optional[Tuple[float, str]]:
+        """订单微信号与单个快照条目的精确命中"""
+        for wechat_id in wechat_ids:
+            if wechat_id in entry.wechat_ids:
+                return 1.0, f"微信号匹配: {wechat_id}"
+        return None
+    
+    def match_entry_text(self, text: str, entry: Any) -> Optional[Tuple[float, str]]:
+        """自由文本中完整出现的该条目电话/微信号（按条目中的顺序取第一个）"""
+        from app.services.text_scanner import whole_tokens
+        
+        if not text or not settings.TEXT_SCAN_ENABLED or not (entry.phones or entry.wechat_ids):
+            return None
+        tokens = whole_tokens(text)
+        for label, values in (("电话", entry.phones), ("微信号", entry.wechat_ids)):
+            for value in values:
+                if value in tokens:
+                    return 1.0, f"文本中出现黑名单{label}: {value}"
+        return None
+    
+    def match_entry_name(self, normalized_name: str, entry: Any) -> Optional[Tuple[float, str]]:
+        """姓名与单个快照条目的字面命中"""
+        is_match, similarity, detail = self.match_normalized(
+            normalized_name, entry.names, self.name_similarity_threshold, "姓名匹配"
+        )
+        return (similarity, detail) if is_match else None
+    
+    def match_entry_pinyin(self, normalized_name: str, entry: Any) -> Optional[Tuple[float, str]]:
+        """姓名与单个快照条目的拼音命中（取分数最高的，分数相同按字段顺序取第一个）"""
+        from app.services.name_pinyin import pinyin_keys, INITIALS_MIN_LENGTH
+        
+        if not normalized_name or not self.pinyin_name_match:
+            return None
+        keys = pinyin_keys(normalized_name)
+        if keys is None:
+            return None
+        
+        entry_hits = []
+        for value in entry.names:
+            value_keys = pinyin_keys(value)
+            if value_keys is None:
                 continue
-            
-            similarity = self.calculate_similarity(normalized_order_address, normalized_blacklist_address)
-            if similarity >= self.address_similarity_threshold:
-                return True, similarity, f"地址匹配: {normalized_order_address} ≈ {normalized_blacklist_address}"
+            if value_keys.full == keys.full or (
+                len(keys.initials) >= INITIALS_MIN_LENGTH and value_keys.initials == keys.initials
+            ):
+                hit = self.pinyin_hit(normalized_name, keys, value, value_keys.full)
+                if hit is not None:
+                    entry_hits.append(hit)
+        return max(entry_hits, key=lambda hit: hit[0]) if entry_hits else None
+    
+    def match_entry_address(self, normalized_address: str, entry: Any) -> Optional[Tuple[float, str]]:
+        """地址与单个快照条目的命中（启用地区过滤时只比较同区县或无法解析区县的地址）"""
+        from app.services.address_index import parse_address, district_key
         
-        return False, 0.0, ""
+        if not normalized_address:
+            return None
+        addresses = entry.addresses
+        if self.address_region_filter:
+            parts = parse_address(normalized_address)
+            if parts.district:
+                district = district_key(parts)
+                scoped_addresses = []
+                for address in addresses:
+                    address_parts = parse_address(address)
+                    if not address_parts.district or district_key(address_parts) == district:
+                        scoped_addresses.append(address)
+                addresses = tuple(scoped_addresses)
+        is_match, similarity, detail = self.match_normalized(
+            normalized_address, addresses, self.address_similarity_threshold, "地址匹配"
+        )
+        return (similarity, detail) if is_match else None
     
-    def match_order_with_blacklist(self, order: Order, blacklist_item: Blacklist) -> Dict[str, Any]:
-        """匹配单个订单与黑名单项"""
+    def build_match_result(
+        self,
+        entry: Any,
+        phone_hit: Optional[Tuple[float, str]],
+        name_hit: Optional[Tuple[float, str]],
+        address_hit: Optional[Tuple[float, str]],
+        wechat_hit: Optional[Tuple[float, str]] = None,
+        text_hit: Optional[Tuple[float, str]] = None
+    ) -> Dict[str, Any]:
+        """按 电话 > 微信号 > 文本中的电话/微信号 > 姓名 > 地址 的优先级生成订单与单条黑名单的匹配结果"""
         match_result = {
             "is_match": False,
             "match_type": None,
             "match_score": 0.0,
             "match_details": "",
             "risk_level": "LOW",
-            "blacklist_id": blacklist_item.id,
-            "blacklist_reason": blacklist_item.blacklist_reason
+            "blacklist_id": entry.id,
+            "blacklist_reason": entry.blacklist_reason
         }
         
-        # 准备黑名单数据
-        blacklist_phones = []
-        if blacklist_item.phone_numbers:
-            if isinstance(blacklist_item.phone_numbers, list):
-                blacklist_phones.extend(blacklist_item.phone_numbers)
-            else:
-                blacklist_phones.append(str(blacklist_item.phone_numbers))
-        
-        blacklist_names = [
-            blacklist_item.ktt_name,
-            blacklist_item.wechat_name,
-            blacklist_item.order_name_phone
-        ]
-        
-        blacklist_addresses = [
-            blacklist_item.order_address1,
-            blacklist_item.order_address2
-        ]
-        
         # 1. 电话匹配（优先级最高）
-        phone_match, phone_score, phone_detail = self.match_phone(
-            order.contact_phone, blacklist_phones
-        )
-        if phone_match:
+        if phone_hit:
+            phone_score, phone_detail = phone_hit
             match_result.update({
                 "is_match": True,
                 "match_type": "phone",
@@ -149,11 +718,33 @@ class BlacklistMatcher:
             })
             return match_result
         
-        # 2. 姓名匹配
-        name_match, name_score, name_detail = self.match_name(
-            order.orderer, blacklist_names
-        )
-        if name_match:
+        # 2. 微信号精确匹配（与电话同等可靠）
+        if wechat_hit:
+            wechat_score, wechat_detail = wechat_hit
+            match_result.update({
+                "is_match": True,
+                "match_type": "wechat_id",
+                "match_score": wechat_score,
+                "match_details": wechat_detail,
+                "risk_level": "HIGH"
+            })
+            return match_result
+        
+        # 3. 备注、地址中夹带的黑名单电话/微信号
+        if text_hit:
+            text_score, text_detail = text_hit
+            match_result.update({
+                "is_match": True,
+                "match_type": "text",
+                "match_score": text_score,
+                "match_details": text_detail,
+                "risk_level": "HIGH"
+            })
+            return match_result
+        
+        # 4. 姓名匹配
+        if name_hit:
+            name_score, name_detail = name_hit
             match_result.update({
                 "is_match": True,
                 "match_type": "name",
@@ -163,11 +754,9 @@ class BlacklistMatcher:
             })
             return match_result
         
-        # 3. 地址匹配
-        address_match, address_score, address_detail = self.match_address(
-            order.detailed_address, blacklist_addresses
-        )
-        if address_match:
+        # 5. 地址匹配
+        if address_hit:
+            address_score, address_detail = address_hit
             match_result.update({
                 "is_match": True,
                 "match_type": "address",
@@ -179,15 +768,38 @@ class BlacklistMatcher:
         
         return match_result
     
-    def check_order_blacklist(self, order: Order, blacklist_items: List[Blacklist]) -> Dict[str, Any]:
-        """检查订单是否在黑名单中"""
-        matches = []
-        
-        for blacklist_item in blacklist_items:
-            match_result = self.match_order_with_blacklist(order, blacklist_item)
-            if match_result["is_match"]:
-                matches.append(match_result)
+    def collect_matches(
+        self,
+        snapshot: Any,
+        phone_hits: Dict[int, Tuple[float, str]],
+        name_hits: Dict[int, Tuple[float, str]],
+        address_hits: Dict[int, Tuple[float, str]],
+        wechat_hits: Optional[Dict[int, Tuple[float, str]]] = None,
+        text_hits: Optional[Dict[int, Tuple[float, str]]] = None
+    ) -> List[Dict[str, Any]]:
+        """把各阶段的命中合并为匹配列表（按快照中的黑名单顺序）"""
+        wechat_hits = wechat_hits or {}
+        text_hits = text_hits or {}
+        entry_positions = set(phone_hits)
+        entry_positions.update(name_hits)
+        entry_positions.update(address_hits)
+        entry_positions.update(wechat_hits)
+        entry_positions.update(text_hits)
         
+        return [
+            self.build_match_result(
+                snapshot.entries[entry_pos],
+                phone_hits.get(entry_pos),
+                name_hits.get(entry_pos),
+                address_hits.get(entry_pos),
+                wechat_hits.get(entry_pos),
+                text_hits.get(entry_pos)
+            )
+            for entry_pos in sorted(entry_positions)
+        ]
+    
+    def summarize_matches(self, matches: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """汇总订单的匹配列表，得到最终检测结果"""
         if not matches:
             return {
                 "is_blacklist": False,
@@ -213,6 +825,226 @@ class BlacklistMatcher:
             "matches": matches,
             "match_count": len(matches)
         }
+    
+    def ensure_snapshot(self, blacklist: Any) -> Any:
+        """传入 Blacklist 列表时临时构建快照"""
+        from app.services.blacklist_snapshot import BlacklistSnapshot, LayeredBlacklistSnapshot
+        
+        if isinstance(blacklist, (BlacklistSnapshot, LayeredBlacklistSnapshot)):
+            return blacklist
+        return BlacklistSnapshot.build(blacklist, matcher=self)
+    
+    def merge_layer_matches(self, layer_matches: List[Tuple[List[Dict[str, Any]], Any]]) -> List[Dict[str, Any]]:
+        """
+        合并增量快照各层的匹配列表
+        
+        layer_matches 为 (该层的匹配列表, 该层中已被上层覆盖的黑名单ID)。
+        合并后按黑名单ID排序，与整体重建的快照（按ID顺序）得到的列表一致。
+        """
+        merged = [
+            match for matches, excluded_ids in layer_matches
+            for match in matches if match["blacklist_id"] not in excluded_ids
+        ]
+        merged.sort(key=lambda match: match["blacklist_id"])
+        return merged
+    
+    def check_order_blacklist(self, order: Order, blacklist: Any) -> Dict[str, Any]:
+        """
+        检查订单是否在黑名单中
+        
+        blacklist 应为 BlacklistSnapshot（由 get_blacklist_snapshot 获取，各接口共享）；
+        传入 Blacklist 列表时会临时构建快照。
+        """
+        return self.summarize_matches(self.collect_order_matches(order, self.ensure_snapshot(blacklist)))
+    
+    def collect_order_matches(self, order: Order, snapshot: Any) -> List[Dict[str, Any]]:
+        """单个订单在快照中的匹配列表（未排序汇总）"""
+        layers = getattr(snapshot, "layers", None)
+        if layers is not None:
+            return self.merge_layer_matches([
+                (self.collect_order_matches(order, layer), excluded_ids) for layer, excluded_ids in layers
+            ])
+        
+        return self.collect_matches(
+            snapshot,
+            self.lookup_phone(order.contact_phone, snapshot),
+            self.lookup_order_names(order, snapshot),
+            self.lookup_address(self.normalize_name(order.detailed_address), snapshot),
+            self.lookup_wechat(self.order_wechat_ids(order), snapshot.wechat_index),
+            self.lookup_free_text(self.order_free_text(order), snapshot)
+        )
+    
+    def check_orders_bulk(
+        self,
+        orders: List[Order],
+        blacklist: Any,
+        parallel: Optional[bool] = None
+    ) -> Dict[str, List[Any]]:
+        """
+        批量检测订单（分组检测、Excel导入等大批量场景）
+        
+        先计算每个订单的指纹（电话、下单人、收货人、地址及备注等字段标准化后的值），
+        同一批中指纹相同的订单只匹配一次，结果复制给其余订单。
+        电话精确命中通过号码集合与电话索引求交集得到，近似电话、姓名、地址的模糊匹配
+        只对索引筛出的候选计算，且相同的号码/姓名/地址在整批中只计算一次；
+        备注等字段中的微信号逐个指纹查微信号索引（黑名单没有微信号时跳过）。
+        每个订单的结果与 check_order_blacklist 一致。
+        
+        parallel 为 None 时按配置（MATCHER_PROCESSES 等）决定是否分发到进程池，
+        False 强制在当前进程执行。
+        
+        返回列式结果：order_id、is_blacklist、risk_level、match_count、matches
+        各为与 orders 等长的列表。
+        """
+        snapshot = self.ensure_snapshot(blacklist)
+        
+        # 指纹去重：distinct_positions 记录每个指纹第一次出现时在 distinct_orders 中的位置
+        fingerprints = [self.order_fingerprint(order) for order in orders]
+        distinct_positions: Dict[OrderFingerprint, int] = {}
+        distinct_orders = []
+        for order, fingerprint in zip(orders, fingerprints):
+            if fingerprint not in distinct_positions:
+                distinct_positions[fingerprint] = len(distinct_orders)
+                distinct_orders.append(order)
+        self._record_fingerprints(len(orders), len(distinct_orders))
+        
+        if parallel is not False:
+            from app.services.parallel_matcher import parallel_matcher
+            if parallel or parallel_matcher.should_parallelize(len(distinct_orders)):
+                distinct_results = parallel_matcher.check_orders_bulk(distinct_orders, snapshot)
+                return self._fan_out_results(orders, fingerprints, distinct_positions, distinct_results)
+        
+        distinct_results: Dict[str, List[Any]] = {
+            "is_blacklist": [],
+            "risk_level": [],
+            "match_count": [],
+            "matches": []
+        }
+        for matches in self.collect_fingerprint_matches(list(distinct_positions), snapshot):
+            result = self.summarize_matches(matches)
+            distinct_results["is_blacklist"].append(result["is_blacklist"])
+            distinct_results["risk_level"].append(result["risk_level"])
+            distinct_results["match_count"].append(result.get("match_count", 0))
+            distinct_results["matches"].append(result["matches"])
+        
+        return self._fan_out_results(orders, fingerprints, distinct_positions, distinct_results)
+    
+    def _record_fingerprints(self, order_count: int, distinct_count: int):
+        """累计指纹去重统计"""
+        with self._fingerprint_lock:
+            self._fingerprint_orders += order_count
+            self._fingerprint_hits += order_count - distinct_count
+        if distinct_count < order_count:
+            logger.info(
+                f"订单指纹去重: 订单数={order_count}, 不同指纹数={distinct_count}, "
+                f"命中率={(order_count - distinct_count) / order_count:.1%}"
+            )
+    
+    def _fan_out_results(
+        self,
+        orders: List[Order],
+        fingerprints: List[OrderFingerprint],
+        distinct_positions: Dict[OrderFingerprint, int],
+        distinct_results: Dict[str, List[Any]]
+    ) -> Dict[str, List[Any]]:
+        """把每个指纹的检测结果展开到各订单（复用的匹配列表复制一份，订单之间互不影响）"""
+        results: Dict[str, List[Any]] = {
+            "order_id": [],
+            "is_blacklist": [],
+            "risk_level": [],
+            "match_count": [],
+            "matches": []
+        }
+        used_positions = set()
+        for order, fingerprint in zip(orders, fingerprints):
+            distinct_pos = distinct_positions[fingerprint]
+            matches = distinct_results["matches"][distinct_pos]
+            if distinct_pos in used_positions:
+                matches = [dict(match) for match in matches]
+            else:
+                used_positions.add(distinct_pos)
+            results["order_id"].append(order.id)
+            results["is_blacklist"].append(distinct_results["is_blacklist"][distinct_pos])
+            results["risk_level"].append(distinct_results["risk_level"][distinct_pos])
+            results["match_count"].append(distinct_results["match_count"][distinct_pos])
+            results["matches"].append(matches)
+        return results
+    
+    def collect_fingerprint_matches(
+        self,
+        fingerprints: List[OrderFingerprint],
+        snapshot: Any
+    ) -> List[List[Dict[str, Any]]]:
+        """批量计算各指纹在快照中的匹配列表（未排序汇总，顺序与 fingerprints 一致）"""
+        layers = getattr(snapshot, "layers", None)
+        if layers is not None:
+            layer_results = [
+                (self.collect_fingerprint_matches(fingerprints, layer), excluded_ids) for layer, excluded_ids in layers
+            ]
+            return [
+                self.merge_layer_matches([(matches[order_pos], excluded_ids) for matches, excluded_ids in layer_results])
+                for order_pos in range(len(fingerprints))
+            ]
+        
+        phone_index = snapshot.phone_index
+        
+        # 1. 自由文本：相同的文本只扫描一次
+        text_hits = {
+            text: self.lookup_free_text(text, snapshot)
+            for text in {fingerprint.free_text for fingerprint in fingerprints}
+        }
+        
+        # 2. 电话：与索引求交集得到精确命中的号码，近似命中每个号码只算一次
+        distinct_phones = set()
+        for fingerprint in fingerprints:
+            distinct_phones.update(fingerprint.phones)
+        exact_phones = {phone for phone in distinct_phones if phone in phone_index}
+        near_phones = {
+            phone: self.find_near_phones(phone, phone_index, snapshot.phone_deletion_index)
+            for phone in distinct_phones
+        }
+        
+        # 3. 姓名、地址：相同的值只查一次
+        order_names = {fingerprint.name for fingerprint in fingerprints}
+        name_hits = {name: self.lookup_name(name, snapshot) for name in order_names}
+        pinyin_hits = {
+            name: self.lookup_pinyin(name, snapshot)
+            for name in order_names | {fingerprint.consignee for fingerprint in fingerprints}
+        }
+        address_hits = {
+            address: self.lookup_address(address, snapshot)
+            for address in {fingerprint.address for fingerprint in fingerprints}
+        }
+        
+        order_matches: List[List[Dict[str, Any]]] = []
+        for fingerprint in fingerprints:
+            phones = fingerprint.phones
+            phone_hits = {}
+            if any(phone in exact_phones or near_phones[phone] for phone in phones):
+                phone_hits = self.merge_phone_hits(phones, phone_index, near_phones, snapshot.entries)
+            order_name_hits = self.merge_hits(
+                name_hits[fingerprint.name], pinyin_hits[fingerprint.name], pinyin_hits[fingerprint.consignee]
+            )
+            wechat_hits = None
+            if snapshot.wechat_index:
+                wechat_hits = self.lookup_wechat(self.extract_wechat_ids(fingerprint.wechat_text), snapshot.wechat_index)
+            order_matches.append(self.collect_matches(
+                snapshot, phone_hits, order_name_hits, address_hits[fingerprint.address], wechat_hits,
+                text_hits[fingerprint.free_text]
+            ))
+        
+        return order_matches
+    
+    def bulk_result_at(self, results: Dict[str, List[Any]], index: int) -> Dict[str, Any]:
+        """从 check_orders_bulk 的列式结果中取出单个订单的结果（格式同 check_order_blacklist）"""
+        result = {
+            "is_blacklist": results["is_blacklist"][index],
+            "risk_level": results["risk_level"][index],
+            "matches": results["matches"][index]
+        }
+        if result["is_blacklist"]:
+            result["match_count"] = results["match_count"][index]
+        return result
 
 
 # 全局匹配器实例
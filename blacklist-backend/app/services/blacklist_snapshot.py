@@ -0,0 +1,637 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+黑名单快照服务
+
+把启用中的黑名单一次性加载并标准化为不可变快照，供各检测接口共享；
+只有黑名单数据发生变化（更新时间、条数或变更历史变化）时才重新构建。
+"""
+
+import logging
+import math
+import threading
+from datetime import datetime
+from collections import Counter
+from typing import List, Dict, Any, Optional, Tuple, NamedTuple, Iterable, FrozenSet
+
+from sqlalchemy import func, case
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.blacklist import Blacklist, BlacklistHistory
+from app.services.address_index import RegionIndex
+from app.services.address_lsh import AddressLSH, get_address_lsh
+from app.services.name_pinyin import PinyinIndex, build_pinyin_index
+from app.services.text_scanner import BlacklistTextScanner
+from app.services.blacklist_matcher import blacklist_matcher, BlacklistMatcher
+
+logger = logging.getLogger(__name__)
+
+
+class BlacklistEntry(NamedTuple):
+    """快照中的单条黑名单（已标准化）"""
+    id: int
+    blacklist_reason: Optional[str]
+    phones: Tuple[str, ...]  # 提取后的11位手机号
+    names: Tuple[str, ...]  # 标准化后的 ktt_name / wechat_name / order_name_phone（按优先顺序，去除空值）
+    addresses: Tuple[str, ...]  # 标准化后的 order_address1 / order_address2
+    wechat_ids: Tuple[str, ...] = ()  # 标准化后的微信号（小写）
+
+
+class CharIndex:
+    """
+    字符倒排索引（模糊匹配的候选生成）
+    
+    SequenceMatcher.ratio() = 2*M/(len(a)+len(b))，其中匹配字符数 M 不会超过
+    两个字符串共有字符的计数（按多重集合取交集）。按字符倒排累计共有字符数，
+    只保留上界能达到阈值的值，因此不会漏掉任何达到阈值的结果，
+    对两三个字的短姓名同样成立（字符二元组做不到这一点）。
+    """
+    
+    __slots__ = ("values", "owners", "lengths", "postings")
+    
+    def __init__(self, value_owners: Dict[str, List[int]]):
+        self.values: Tuple[str, ...] = tuple(value_owners)
+        self.owners: Tuple[Tuple[int, ...], ...] = tuple(tuple(owners) for owners in value_owners.values())
+        self.lengths: Tuple[int, ...] = tuple(len(value) for value in self.values)
+        
+        postings: Dict[str, List[Tuple[int, int]]] = {}
+        for value_idx, value in enumerate(self.values):
+            for char, count in Counter(value).items():
+                postings.setdefault(char, []).append((value_idx, count))
+        self.postings: Dict[str, Tuple[Tuple[int, int], ...]] = {
+            char: tuple(entries) for char, entries in postings.items()
+        }
+    
+    def __reduce__(self):
+        return (CharIndex, (dict(zip(self.values, self.owners)),))
+    
+    def __len__(self) -> int:
+        return len(self.values)
+    
+    def candidates(self, query: str, threshold: float, subset: Optional[Iterable[int]] = None) -> List[int]:
+        """
+        返回相似度上界不低于阈值的值下标
+        
+        subset 不为空时只在这些下标中筛选：范围比查询字符的倒排表小时逐个值计数，
+        否则遍历倒排表并跳过范围外的值（RegionScope 可直接判断成员，其他集合先转为 set）。
+        """
+        if not query:
+            return []
+        if threshold <= 0:
+            return list(range(len(self.values))) if subset is None else list(subset)
+        
+        query_counts = Counter(query)
+        if subset is not None:
+            postings_size = sum(len(self.postings.get(char, ())) for char in query_counts)
+            if len(subset) * len(query_counts) <= postings_size:
+                return self._filter_subset(query_counts, len(query), threshold, subset)
+            if isinstance(subset, (list, tuple)):
+                subset = set(subset)
+        
+        shared: Dict[int, int] = {}
+        for char, query_count in query_counts.items():
+            postings = self.postings.get(char, ())
+            if subset is not None:
+                postings = [(value_idx, value_count) for value_idx, value_count in postings if value_idx in subset]
+            for value_idx, value_count in postings:
+                shared[value_idx] = shared.get(value_idx, 0) + min(query_count, value_count)
+        
+        return [
+            value_idx for value_idx, shared_count in shared.items()
+            if 2.0 * shared_count / (len(query) + self.lengths[value_idx]) >= threshold
+        ]
+    
+    def _filter_subset(self, query_counts: Counter, query_length: int, threshold: float, subset: Iterable[int]) -> List[int]:
+        """在指定下标中逐个值按共有字符数上界筛选（用 str.count 计数，不为每个值建 Counter）"""
+        query_items = tuple(query_counts.items())
+        result = []
+        for value_idx in subset:
+            value = self.values[value_idx]
+            shared_count = 0
+            for char, count in query_items:
+                value_count = value.count(char)
+                shared_count += count if value_count > count else value_count
+            if 2.0 * shared_count / (query_length + self.lengths[value_idx]) >= threshold:
+                result.append(value_idx)
+        return result
+
+
+class PhoneDeletionIndex:
+    """
+    电话号码删除邻域索引（SymSpell 思路）
+    
+    等长号码的 SequenceMatcher.ratio() = M/n，匹配字符数 M 不超过最长公共子序列。
+    11位号码在 0.9 阈值下要求 M >= 10，即两个号码各删去一位后能得到相同的串。
+    因此把每个号码删去一位的所有变体建成字典，查询时只需 11 次字典查找就能拿到
+    全部候选，再用原相似度确认，命中集合与逐个比对完全一致。
+    """
+    
+    __slots__ = ("phones", "length", "variants")
+    
+    def __init__(self, phones: Iterable[str]):
+        self.phones: Tuple[str, ...] = tuple(phones)
+        lengths = {len(phone) for phone in self.phones}
+        # 只有所有号码等长时索引才成立
+        self.length: Optional[int] = lengths.pop() if len(lengths) == 1 else None
+        
+        variants: Dict[str, List[int]] = {}
+        for phone_idx, phone in enumerate(self.phones):
+            for variant in self.deletions(phone):
+                variants.setdefault(variant, []).append(phone_idx)
+        self.variants: Dict[str, Tuple[int, ...]] = {
+            variant: tuple(phone_ids) for variant, phone_ids in variants.items()
+        }
+    
+    def __reduce__(self):
+        return (PhoneDeletionIndex, (self.phones,))
+    
+    def __len__(self) -> int:
+        return len(self.phones)
+    
+    @staticmethod
+    def deletions(phone: str) -> set:
+        """号码删去一位得到的所有变体"""
+        return {phone[:i] + phone[i + 1:] for i in range(len(phone))}
+    
+    def covers(self, phone: str, threshold: float) -> bool:
+        """该阈值下的近似号码是否都能通过删一位变体找到"""
+        if self.length is None or len(phone) != self.length:
+            return False
+        required = math.ceil(threshold * self.length - 1e-9)
+        return self.length - required <= 1
+    
+    def candidates(self, phone: str) -> List[str]:
+        """与号码共享删一位变体的黑名单号码（按索引中的原顺序，不含号码本身）"""
+        phone_ids = set()
+        for variant in self.deletions(phone):
+            phone_ids.update(self.variants.get(variant, ()))
+        return [self.phones[phone_idx] for phone_idx in sorted(phone_ids) if self.phones[phone_idx] != phone]
+
+
+class BlacklistSnapshot:
+    """
+    不可变的黑名单快照
+    
+    构建后不允许修改；黑名单变化时整体替换为新快照。
+    """
+    
+    __slots__ = (
+        "version", "history_id", "entries", "phone_index", "phone_deletion_index",
+        "name_index", "address_index", "address_regions", "address_lsh",
+        "name_pinyin", "wechat_index", "text_scanner", "built_at", "store"
+    )
+    
+    def __init__(
+        self,
+        entries: Tuple[BlacklistEntry, ...],
+        phone_index: Dict[str, Tuple[int, ...]],
+        name_index: CharIndex,
+        address_index: CharIndex,
+        version: str = "",
+        history_id: int = 0,
+        built_at: Optional[datetime] = None,
+        phone_deletion_index: Optional[PhoneDeletionIndex] = None,
+        address_regions: Optional[RegionIndex] = None,
+        address_lsh: Optional[AddressLSH] = None,
+        name_pinyin: Optional[PinyinIndex] = None,
+        wechat_index: Optional[Dict[str, Tuple[int, ...]]] = None,
+        text_scanner: Optional[BlacklistTextScanner] = None,
+        store: Any = None
+    ):
+        object.__setattr__(self, "entries", entries)
+        object.__setattr__(self, "phone_index", phone_index)
+        object.__setattr__(self, "phone_deletion_index", phone_deletion_index or PhoneDeletionIndex(phone_index))
+        object.__setattr__(self, "name_index", name_index)
+        object.__setattr__(self, "address_index", address_index)
+        object.__setattr__(self, "address_regions", address_regions or RegionIndex(address_index.values))
+        object.__setattr__(self, "address_lsh", address_lsh)
+        object.__setattr__(self, "name_pinyin", name_pinyin)
+        object.__setattr__(self, "wechat_index", wechat_index or {})
+        object.__setattr__(self, "text_scanner", text_scanner)
+        object.__setattr__(self, "version", version)
+        object.__setattr__(self, "history_id", history_id)
+        object.__setattr__(self, "built_at", built_at or datetime.now())
+        # 映射自共享快照文件时为对应的 SnapshotStore
+        object.__setattr__(self, "store", store)
+    
+    def __setattr__(self, name, value):
+        raise AttributeError("黑名单快照不可修改")
+    
+    def __reduce__(self):
+        if self.store is not None:
+            # 映射的快照只传文件路径，工作进程重新映射同一文件，不复制数据
+            from app.services.snapshot_store import open_snapshot_store
+            return (open_snapshot_store, (self.store.path,))
+        return (BlacklistSnapshot, (
+            self.entries, self.phone_index, self.name_index, self.address_index,
+            self.version, self.history_id, self.built_at, self.phone_deletion_index, self.address_regions,
+            self.address_lsh, self.name_pinyin, self.wechat_index, self.text_scanner
+        ))
+    
+    def __len__(self) -> int:
+        return len(self.entries)
+    
+    def __repr__(self):
+        return f"<BlacklistSnapshot(version={self.version!r}, entries={len(self.entries)})>"
+    
+    def has_entry(self, blacklist_id: int) -> bool:
+        """快照中是否有该黑名单ID（条目按ID升序排列，二分查找）"""
+        entries = self.entries
+        low, high = 0, len(entries)
+        while low < high:
+            middle = (low + high) // 2
+            if entries[middle].id < blacklist_id:
+                low = middle + 1
+            else:
+                high = middle
+        return low < len(entries) and entries[low].id == blacklist_id
+    
+    @staticmethod
+    def build_entry(item: Any, matcher: Optional[BlacklistMatcher] = None) -> BlacklistEntry:
+        """把一条黑名单记录标准化为快照条目"""
+        matcher = matcher or blacklist_matcher
+        return BlacklistEntry(
+            item.id,
+            item.blacklist_reason,
+            tuple(matcher.get_blacklist_phones(item)),
+            matcher.normalize_values([item.ktt_name, item.wechat_name, item.order_name_phone]),
+            matcher.normalize_values([item.order_address1, item.order_address2]),
+            tuple(matcher.extract_wechat_ids(item.wechat_id))
+        )
+    
+    @classmethod
+    def build(
+        cls,
+        blacklist_items: Iterable[Any],
+        version: str = "",
+        history_id: int = 0,
+        matcher: Optional[BlacklistMatcher] = None,
+        use_address_lsh: Optional[bool] = None
+    ) -> "BlacklistSnapshot":
+        """
+        从黑名单记录构建快照
+        
+        blacklist_items 可以是 Blacklist 模型对象，也可以是带同名字段的查询行。
+        use_address_lsh 为 None 时按 ADDRESS_LSH_ENABLED 决定是否建立地址LSH索引。
+        """
+        matcher = matcher or blacklist_matcher
+        entries = tuple(cls.build_entry(item, matcher) for item in blacklist_items)
+        return cls.from_entries(entries, version, history_id, use_address_lsh=use_address_lsh)
+    
+    @classmethod
+    def from_entries(
+        cls,
+        entries: Tuple[BlacklistEntry, ...],
+        version: str = "",
+        history_id: int = 0,
+        built_at: Optional[datetime] = None,
+        use_address_lsh: Optional[bool] = None
+    ) -> "BlacklistSnapshot":
+        """由已标准化的条目建立各索引（不访问数据库）"""
+        if use_address_lsh is None:
+            use_address_lsh = settings.ADDRESS_LSH_ENABLED
+        
+        # 各索引记录的是条目在 entries 中的位置
+        phone_owners: Dict[str, List[int]] = {}
+        name_owners: Dict[str, List[int]] = {}
+        address_owners: Dict[str, List[int]] = {}
+        wechat_owners: Dict[str, List[int]] = {}
+        for entry_pos, entry in enumerate(entries):
+            cls._add_owner(phone_owners, entry.phones, entry_pos)
+            cls._add_owner(name_owners, entry.names, entry_pos)
+            cls._add_owner(address_owners, entry.addresses, entry_pos)
+            cls._add_owner(wechat_owners, entry.wechat_ids, entry_pos)
+        
+        phone_index = {phone: tuple(owners) for phone, owners in phone_owners.items()}
+        wechat_index = {wechat_id: tuple(owners) for wechat_id, owners in wechat_owners.items()}
+        text_scanner = None
+        if settings.TEXT_SCAN_ENABLED:
+            text_scanner = BlacklistTextScanner(phone_index, wechat_index)
+        name_index = CharIndex(name_owners)
+        address_index = CharIndex(address_owners)
+        address_lsh = None
+        if use_address_lsh:
+            address_lsh = get_address_lsh(address_index.values)
+        
+        return cls(
+            entries=entries,
+            phone_index=phone_index,
+            name_index=name_index,
+            address_index=address_index,
+            version=version,
+            history_id=history_id,
+            built_at=built_at,
+            address_lsh=address_lsh,
+            name_pinyin=build_pinyin_index(name_index.values),
+            wechat_index=wechat_index,
+            text_scanner=text_scanner
+        )
+    
+    @staticmethod
+    def _add_owner(value_owners: Dict[str, List[int]], values: Tuple[str, ...], entry_pos: int):
+        """登记值所属的条目位置（同一条目只登记一次）"""
+        for value in values:
+            owners = value_owners.setdefault(value, [])
+            if not owners or owners[-1] != entry_pos:
+                owners.append(entry_pos)
+
+
+class LayeredBlacklistSnapshot:
+    """
+    增量更新后的黑名单快照
+    
+    base 为整体构建（或映射）的快照，保持不变；delta 只包含 base 之后有变更的黑名单
+    （按当前数据库内容构建，已删除的不包含），changed_ids 为这些黑名单的ID，
+    匹配时 base 中这些ID的结果被忽略。与快照一样不可修改，每次更新生成新对象。
+    """
+    
+    __slots__ = ("base", "delta", "changed_ids", "version", "history_id", "built_at", "entry_count")
+    
+    def __init__(
+        self,
+        base: BlacklistSnapshot,
+        delta: BlacklistSnapshot,
+        changed_ids: FrozenSet[int],
+        version: str = "",
+        history_id: int = 0,
+        built_at: Optional[datetime] = None
+    ):
+        object.__setattr__(self, "base", base)
+        object.__setattr__(self, "delta", delta)
+        object.__setattr__(self, "changed_ids", changed_ids)
+        object.__setattr__(self, "version", version)
+        object.__setattr__(self, "history_id", history_id)
+        object.__setattr__(self, "built_at", built_at or datetime.now())
+        replaced = sum(1 for blacklist_id in changed_ids if base.has_entry(blacklist_id))
+        object.__setattr__(self, "entry_count", len(base) - replaced + len(delta))
+    
+    def __setattr__(self, name, value):
+        raise AttributeError("黑名单快照不可修改")
+    
+    def __reduce__(self):
+        return (LayeredBlacklistSnapshot, (
+            self.base, self.delta, self.changed_ids, self.version, self.history_id, self.built_at
+        ))
+    
+    def __len__(self) -> int:
+        return self.entry_count
+    
+    def __repr__(self):
+        return (
+            f"<LayeredBlacklistSnapshot(version={self.version!r}, entries={self.entry_count}, "
+            f"changed={len(self.changed_ids)})>"
+        )
+    
+    @property
+    def layers(self) -> Tuple[Tuple[BlacklistSnapshot, FrozenSet[int]], ...]:
+        """匹配时依次查询的 (快照, 需要忽略的黑名单ID)"""
+        return ((self.base, self.changed_ids), (self.delta, frozenset()))
+
+
+def get_snapshot_version(db: Session) -> Tuple[str, int]:
+    """
+    查询黑名单当前版本
+    
+    只做聚合查询，不加载黑名单记录。返回 (版本号, 最新变更历史ID)。
+    """
+    total_count, active_count, last_updated = db.query(
+        func.count(Blacklist.id),
+        func.sum(case((Blacklist.is_active == True, 1), else_=0)),
+        func.max(Blacklist.updated_at)
+    ).one()
+    history_id = db.query(func.max(BlacklistHistory.id)).scalar() or 0
+    
+    last_updated_str = last_updated.isoformat() if last_updated else ""
+    version = f"{history_id}-{int(active_count or 0)}-{total_count}-{last_updated_str}"
+    return version, history_id
+
+
+def parse_snapshot_version(version: str) -> Tuple[int, Optional[datetime]]:
+    """从版本号中取出 (启用中的黑名单数, 最后更新时间)"""
+    parts = version.split("-", 3)
+    if len(parts) != 4:
+        return 0, None
+    return int(parts[1]), datetime.fromisoformat(parts[3]) if parts[3] else None
+
+
+def parse_snapshot_history_id(version: str) -> Optional[int]:
+    """从版本号中取出最新变更历史ID（版本号无法解析时返回 None）"""
+    try:
+        return int(version.split("-", 1)[0])
+    except ValueError:
+        return None
+
+
+def query_blacklist_rows(db: Session, blacklist_ids: Optional[Iterable[int]] = None) -> List[Any]:
+    """查询启用中的黑名单（只查询匹配需要的列，按ID排序），可以只查指定ID"""
+    query = db.query(
+        Blacklist.id,
+        Blacklist.blacklist_reason,
+        Blacklist.phone_numbers,
+        Blacklist.ktt_name,
+        Blacklist.wechat_name,
+        Blacklist.wechat_id,
+        Blacklist.order_name_phone,
+        Blacklist.order_address1,
+        Blacklist.order_address2
+    ).filter(Blacklist.is_active == True)
+    if blacklist_ids is not None:
+        query = query.filter(Blacklist.id.in_(list(blacklist_ids)))
+    return query.order_by(Blacklist.id).all()
+
+
+def load_snapshot(db: Session, version: str = "", history_id: int = 0) -> BlacklistSnapshot:
+    """从数据库加载启用中的黑名单并构建快照"""
+    return BlacklistSnapshot.build(query_blacklist_rows(db), version=version, history_id=history_id)
+
+
+def apply_blacklist_history(
+    db: Session,
+    snapshot: Any,
+    version: str,
+    history_id: int
+) -> Optional[LayeredBlacklistSnapshot]:
+    """
+    按快照之后的变更历史增量更新快照
+    
+    只重新加载变更历史中涉及的黑名单并为它们单独建索引，原快照不变。
+    以下情况返回 None，由调用方整体重建：
+    - 没有新的变更历史（版本变化来自没有写历史的修改）；
+    - 累计变更的黑名单超过 SNAPSHOT_INCREMENTAL_MAX_CHANGES；
+    - 有没写变更历史的黑名单被修改（更新时间晚于快照但不在历史中）；
+    - 更新后的条数与数据库不一致。
+    """
+    if not settings.SNAPSHOT_INCREMENTAL_ENABLED or history_id <= snapshot.history_id:
+        return None
+    
+    if isinstance(snapshot, LayeredBlacklistSnapshot):
+        base, changed_ids = snapshot.base, set(snapshot.changed_ids)
+    else:
+        base, changed_ids = snapshot, set()
+    
+    new_ids = {
+        blacklist_id for (blacklist_id,) in db.query(BlacklistHistory.blacklist_id).filter(
+            BlacklistHistory.id > snapshot.history_id,
+            BlacklistHistory.id <= history_id
+        ).distinct()
+    }
+    changed_ids |= new_ids
+    if len(changed_ids) > settings.SNAPSHOT_INCREMENTAL_MAX_CHANGES:
+        return None
+    
+    _, last_updated = parse_snapshot_version(snapshot.version)
+    if last_updated is not None:
+        unlogged = db.query(func.count(Blacklist.id)).filter(
+            Blacklist.updated_at > last_updated,
+            Blacklist.id.notin_(list(new_ids))
+        ).scalar()
+        if unlogged:
+            return None
+    
+    delta = BlacklistSnapshot.build(
+        query_blacklist_rows(db, changed_ids), version=version, history_id=history_id, use_address_lsh=False
+    )
+    updated = LayeredBlacklistSnapshot(base, delta, frozenset(changed_ids), version, history_id)
+    if len(updated) != parse_snapshot_version(version)[0]:
+        return None
+    return updated
+
+
+class BlacklistSnapshotCache:
+    """
+    黑名单快照缓存（进程内共享，版本变化时按变更历史增量更新，无法增量时重建）
+    
+    启动时可先映射上次保存的快照文件；文件版本已过期时在后台线程重建，
+    重建完成前的请求继续使用旧快照，worker 重启不会卡在全表加载上。
+    """
+    
+    def __init__(self, session_factory=None):
+        self._snapshot: Optional[BlacklistSnapshot] = None
+        self._lock = threading.Lock()
+        self._refresh_thread: Optional[threading.Thread] = None
+        self.session_factory = session_factory
+    
+    @property
+    def refreshing(self) -> bool:
+        """是否正在后台重建"""
+        thread = self._refresh_thread
+        return thread is not None and thread.is_alive()
+    
+    def get(self, db: Session) -> BlacklistSnapshot:
+        """获取与数据库版本一致的快照（后台重建期间返回旧快照）"""
+        version, history_id = get_snapshot_version(db)
+        snapshot = self._snapshot
+        if snapshot is not None and (snapshot.version == version or self.refreshing):
+            return snapshot
+        
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is not None and snapshot.version == version:
+                return snapshot
+            
+            snapshot = self._update(db, snapshot, version, history_id)
+            self._snapshot = snapshot
+            return snapshot
+    
+    def preload(self) -> Optional[BlacklistSnapshot]:
+        """
+        启动时加载已保存的快照文件
+        
+        启用共享快照文件时直接映射，否则把文件解码为进程内快照，都不扫描黑名单表；
+        文件版本与数据库一致时直接使用，不一致时先用旧文件提供服务并在后台重建。
+        """
+        from app.services.snapshot_store import open_saved_snapshot
+        db = self._new_session()
+        try:
+            version, history_id = get_snapshot_version(db)
+        finally:
+            db.close()
+        
+        snapshot = open_saved_snapshot(version, history_id, mapped=settings.SNAPSHOT_STORE_ENABLED)
+        if snapshot is not None:
+            with self._lock:
+                if self._snapshot is None:
+                    self._snapshot = snapshot
+            logger.info(f"已加载黑名单快照文件: 版本={snapshot.version}, 记录数={len(snapshot)}")
+        
+        if snapshot is None or snapshot.version != version:
+            self.refresh_in_background()
+        return snapshot
+    
+    def refresh_in_background(self):
+        """在后台线程中重建快照（已有重建在进行时不重复启动）"""
+        with self._lock:
+            if self.refreshing:
+                return
+            self._refresh_thread = threading.Thread(
+                target=self._refresh, name="blacklist-snapshot-refresh", daemon=True
+            )
+            self._refresh_thread.start()
+    
+    def _refresh(self):
+        """后台重建快照"""
+        db = self._new_session()
+        try:
+            version, history_id = get_snapshot_version(db)
+            snapshot = self._update(db, self._snapshot, version, history_id)
+            with self._lock:
+                # 重建期间请求线程可能已经换上了更新的快照
+                current = self._snapshot
+                if current is None or current.history_id <= snapshot.history_id:
+                    self._snapshot = snapshot
+            logger.info(f"黑名单快照已在后台更新: 版本={version}, 记录数={len(snapshot)}")
+        except Exception as e:
+            logger.error(f"后台重建黑名单快照失败: {e}", exc_info=True)
+        finally:
+            db.close()
+    
+    def _new_session(self) -> Session:
+        """创建独立的数据库会话（后台重建不与HTTP请求共用会话）"""
+        if self.session_factory is None:
+            from app.core.database import SessionLocal
+            return SessionLocal()
+        return self.session_factory()
+    
+    def _update(self, db: Session, current: Any, version: str, history_id: int) -> Any:
+        """把快照更新到指定版本：能按变更历史增量更新时不整体重建"""
+        if current is not None:
+            snapshot = apply_blacklist_history(db, current, version, history_id)
+            if snapshot is not None:
+                logger.info(f"黑名单快照已增量更新: 版本={version}, 变更记录数={len(snapshot.changed_ids)}")
+                return snapshot
+        
+        snapshot = self._load(db, version, history_id)
+        logger.info(f"黑名单快照已重建: 版本={version}, 记录数={len(snapshot)}")
+        return snapshot
+    
+    def _load(self, db: Session, version: str, history_id: int) -> BlacklistSnapshot:
+        """
+        加载快照：优先映射共享快照文件，文件不可用时退回进程内构建
+        
+        进程内构建的快照在启用启动预加载时也保存为文件，供下次启动直接加载。
+        """
+        from app.services.snapshot_store import load_shared_snapshot, save_snapshot_store
+        if settings.SNAPSHOT_STORE_ENABLED:
+            try:
+                return load_shared_snapshot(version, history_id, lambda: load_snapshot(db, version, history_id))
+            except (OSError, ValueError) as e:
+                logger.warning(f"黑名单快照文件不可用，使用进程内快照: {e}")
+        snapshot = load_snapshot(db, version, history_id)
+        if settings.SNAPSHOT_PRELOAD_ON_STARTUP:
+            save_snapshot_store(snapshot)
+        return snapshot
+    
+    def invalidate(self):
+        """清除缓存的快照"""
+        with self._lock:
+            self._snapshot = None
+
+
+# 全局快照缓存实例
+blacklist_snapshot_cache = BlacklistSnapshotCache()
+
+
+def get_blacklist_snapshot(db: Session) -> BlacklistSnapshot:
+    """获取当前黑名单快照"""
+    return blacklist_snapshot_cache.get(db)
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+姓名拼音索引
+
+被拉黑的买家常换用同音字或异体字的昵称重新下单（如 张三 -> 章叁），
+字面相似度识别不出来。构建快照时为每个黑名单姓名（ktt_name、wechat_name、
+order_name_phone 中的姓名）预先计算全拼和首字母两个键并建立哈希索引，
+订单的下单人/收货人只需计算自己的键查字典，不需要逐个比对。
+
+拼音转换依赖 pypinyin；未安装时不建立索引，匹配退回只比较字面。
+"""
+
+import logging
+from functools import lru_cache
+from typing import List, Dict, Optional, Tuple, NamedTuple, Iterable
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+# 登记首字母键的最短长度（两个字的姓名首字母太容易撞车）
+INITIALS_MIN_LENGTH = 3
+
+
+class PinyinKeys(NamedTuple):
+    """姓名的拼音键"""
+    full: str  # 全拼（不带声调），如 zhangsan
+    initials: str  # 首字母，如 zs
+
+
+@lru_cache(maxsize=None)
+def load_pinyin():
+    """加载 pypinyin，未安装时返回 None（只提示一次）"""
+    try:
+        from pypinyin import lazy_pinyin, Style
+    except ImportError:
+        logger.warning("未安装 pypinyin，姓名拼音匹配不可用")
+        return None
+    return lazy_pinyin, Style
+
+
+@lru_cache(maxsize=settings.NORMALIZATION_CACHE_SIZE)
+def pinyin_keys(name: str, converter=None) -> Optional[PinyinKeys]:
+    """
+    计算标准化姓名的拼音键（按姓名缓存，拼音转换比字面比较慢得多）
+    
+    姓名中没有汉字时返回 None（纯字母昵称的字面匹配已经覆盖）。
+    """
+    if not name or not any("一" <= char <= "龥" for char in name):
+        return None
+    converter = converter or load_pinyin()
+    if converter is None:
+        return None
+    
+    lazy_pinyin, Style = converter
+    full = "".join(lazy_pinyin(name)).lower()
+    initials = "".join(lazy_pinyin(name, style=Style.FIRST_LETTER)).lower()
+    return PinyinKeys(full, initials)
+
+
+class PinyinIndex:
+    """
+    拼音哈希索引
+    
+    values 是快照姓名索引中的姓名值，索引结果为这些值的下标。
+    首字母键很容易撞车（两个字的姓名只有两个字母），只登记不短于
+    initials_min_length 的首字母键；即使三个字也会撞车（王小明、吴晓梅都是 wxm），
+    首字母相同的值只能作为候选，需再用 full_key 取全拼确认。
+    """
+    
+    __slots__ = ("full", "initials", "initials_min_length", "_converter", "_full_keys")
+    
+    def __init__(self, values: Iterable[str], converter, initials_min_length: int = INITIALS_MIN_LENGTH):
+        self.initials_min_length = initials_min_length
+        self._converter = converter
+        self._full_keys: Optional[Dict[int, str]] = None
+        
+        full: Dict[str, List[int]] = {}
+        initials: Dict[str, List[int]] = {}
+        for value_idx, value in enumerate(values):
+            keys = pinyin_keys(value, converter)
+            if keys is None:
+                continue
+            full.setdefault(keys.full, []).append(value_idx)
+            if len(keys.initials) >= initials_min_length:
+                initials.setdefault(keys.initials, []).append(value_idx)
+        self.full: Dict[str, Tuple[int, ...]] = {key: tuple(ids) for key, ids in full.items()}
+        self.initials: Dict[str, Tuple[int, ...]] = {key: tuple(ids) for key, ids in initials.items()}
+    
+    def __reduce__(self):
+        # pypinyin 的函数在工作进程中重新加载
+        return (_restore_pinyin_index, (self.full, self.initials, self.initials_min_length))
+    
+    def __len__(self) -> int:
+        return len(self.full)
+    
+    def keys(self, name: str) -> Optional[PinyinKeys]:
+        """计算姓名的拼音键"""
+        return pinyin_keys(name, self._converter)
+    
+    def full_key(self, value_idx: int) -> str:
+        """值的全拼（首次调用时由全拼索引反查生成）"""
+        if self._full_keys is None:
+            self._full_keys = {value_idx: key for key, ids in self.full.items() for value_idx in ids}
+        return self._full_keys.get(value_idx, "")
+    
+    def lookup(self, name: str) -> Tuple[Optional[PinyinKeys], Tuple[int, ...], Tuple[int, ...]]:
+        """返回 (拼音键, 全拼相同的值下标, 首字母相同的值下标)"""
+        keys = self.keys(name)
+        if keys is None:
+            return None, (), ()
+        
+        initials_ids: Tuple[int, ...] = ()
+        if len(keys.initials) >= self.initials_min_length:
+            initials_ids = self.initials.get(keys.initials, ())
+        return keys, self.full.get(keys.full, ()), initials_ids
+
+
+def _restore_pinyin_index(full, initials, initials_min_length) -> PinyinIndex:
+    """反序列化拼音索引"""
+    index = PinyinIndex((), load_pinyin(), initials_min_length)
+    index.full = full
+    index.initials = initials
+    return index
+
+
+def build_pinyin_index(values: Iterable[str]) -> Optional[PinyinIndex]:
+    """构建拼音索引，未安装 pypinyin 时返回 None"""
+    converter = load_pinyin()
+    if converter is None:
+        return None
+    return PinyinIndex(values, converter)
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+字段标准化服务
+
+姓名/地址标准化、电话和微信号提取会在同一批黑名单、订单字符串上反复执行
+（同一买家在一个分组里出现几十次，导入时同一段文本也会被多列重复处理）。
+这里按原始字符串做带上限的 LRU 缓存，每个进程中同一个字符串只计算一次，
+并提供命中/未命中统计。匹配器和导入脚本共用同一份实现。
+"""
+
+import re
+from functools import lru_cache
+from typing import Any, Dict, Optional, Tuple
+
+from app.core.config import settings
+
+
+class NormalizationService:
+    """带 LRU 缓存的字段标准化（线程安全，缓存结果均为不可变对象）"""
+    
+    def __init__(self, maxsize: Optional[int] = None):
+        self.maxsize = maxsize if maxsize is not None else settings.NORMALIZATION_CACHE_SIZE
+        self.phone_pattern = re.compile(r'1[3-9]\d{9}')  # 手机号正则
+        # 微信号正则（字母开头，6-20位字母、数字、下划线或减号，前后不能紧接同类字符）
+        self.wechat_id_pattern = re.compile(r'(?<![A-Za-z0-9_-])[A-Za-z][A-Za-z0-9_-]{5,19}(?![A-Za-z0-9_-])')
+        self.name_pattern = re.compile(r'[^\u4e00-\u9fa5a-zA-Z]')  # 姓名中要去掉的字符
+        self.whitespace_pattern = re.compile(r'\s+')
+        
+        self._caches = {
+            "name": lru_cache(maxsize=self.maxsize)(self._normalize_name),
+            "phones": lru_cache(maxsize=self.maxsize)(self._extract_phones),
+            "wechat_ids": lru_cache(maxsize=self.maxsize)(self._extract_wechat_ids),
+            "whitespace": lru_cache(maxsize=self.maxsize)(self._collapse_whitespace)
+        }
+    
+    def _normalize_name(self, name: str) -> str:
+        return self.name_pattern.sub('', name).strip()
+    
+    def _extract_phones(self, text: str) -> Tuple[str, ...]:
+        return tuple(dict.fromkeys(self.phone_pattern.findall(text)))
+    
+    def _extract_wechat_ids(self, text: str) -> Tuple[str, ...]:
+        return tuple(dict.fromkeys(wechat_id.lower() for wechat_id in self.wechat_id_pattern.findall(text)))
+    
+    def _collapse_whitespace(self, text: str) -> str:
+        return self.whitespace_pattern.sub(' ', text.strip())
+    
+    def normalize_name(self, name: Any) -> str:
+        """标准化姓名/地址（只保留中文和字母）"""
+        if not name:
+            return ""
+        return self._caches["name"](name if isinstance(name, str) else str(name))
+    
+    def extract_phones(self, text: Any) -> Tuple[str, ...]:
+        """提取文本中的手机号（去重，保持出现顺序）"""
+        if not text:
+            return ()
+        return self._caches["phones"](text if isinstance(text, str) else str(text))
+    
+    def extract_wechat_ids(self, text: Any) -> Tuple[str, ...]:
+        """提取文本中的微信号（转为小写，去重，保持出现顺序）"""
+        if not text:
+            return ()
+        return self._caches["wechat_ids"](text if isinstance(text, str) else str(text))
+    
+    def collapse_whitespace(self, text: Any) -> str:
+        """去掉首尾空白，连续的空白（含换行）合并为一个空格"""
+        if not text:
+            return ""
+        return self._caches["whitespace"](text if isinstance(text, str) else str(text))
+    
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """各缓存的命中/未命中统计"""
+        stats = {}
+        for name, cache in self._caches.items():
+            info = cache.cache_info()
+            lookups = info.hits + info.misses
+            stats[name] = {
+                "hits": info.hits,
+                "misses": info.misses,
+                "size": info.currsize,
+                "maxsize": info.maxsize,
+                "hit_rate": round(info.hits / lookups, 4) if lookups else 0.0
+            }
+        return stats
+    
+    def clear(self):
+        """清空缓存和统计"""
+        for cache in self._caches.values():
+            cache.cache_clear()
+
+
+# 全局标准化服务实例（每个进程一份缓存）
+normalization_service = NormalizationService()
@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+订单导入服务
+
+流式读取订单Excel/CSV文件：xlsx 使用 openpyxl 只读模式逐行读取，csv 按块读取，
+按固定批次用 executemany 批量写入数据库，内存占用不随文件大小增长。
+"""
+
+import re
+import logging
+from datetime import datetime
+from decimal import Decimal
+from itertools import islice
+from typing import List, Dict, Any, Optional, Iterator, Iterable, Tuple, BinaryIO, Callable
+
+import pandas as pd
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.order import Order as OrderModel, OrderStatus
+
+logger = logging.getLogger(__name__)
+
+
+# 订单文件必要列
+REQUIRED_COLUMNS = [
+    '跟团号', '下单人', '团员备注', '支付时间', '团长备注',
+    '商品', '订单金额', '退款金额', '订单状态',
+    '自提点', '收货人', '联系电话', '详细地址'
+]
+
+# 可选列
+OPTIONAL_COLUMNS = ['分类', '数量']
+
+# 支持的文件类型
+ORDER_FILE_EXTENSIONS = ('.xlsx', '.xls', '.csv')
+
+# 整数值的浮点数文本
+_FLOAT_DIGITS = re.compile(r"\d+\.0+")
+
+
+def map_order_status(status_str: str) -> OrderStatus:
+    """将中文订单状态映射为英文枚举"""
+    status_mapping = {
+        '已支付': OrderStatus.PAID,
+        '已发货': OrderStatus.SHIPPED,
+        '已送达': OrderStatus.DELIVERED,
+        '已取消': OrderStatus.CANCELLED,
+        '已退款': OrderStatus.REFUNDED,
+        '待处理': OrderStatus.PENDING,
+        'pending': OrderStatus.PENDING,
+        'paid': OrderStatus.PAID,
+        'shipped': OrderStatus.SHIPPED,
+        'delivered': OrderStatus.DELIVERED,
+        'cancelled': OrderStatus.CANCELLED,
+        'refunded': OrderStatus.REFUNDED,
+    }
+    
+    # 去除空格并转换为小写进行匹配
+    clean_status = status_str.strip().lower()
+    
+    # 先尝试直接匹配
+    if clean_status in status_mapping:
+        return status_mapping[clean_status]
+    
+    # 尝试中文匹配
+    if status_str in status_mapping:
+        return status_mapping[status_str]
+    
+    # 默认返回待处理状态
+    return OrderStatus.PENDING
+
+
+def _xlsx_rows(fileobj: BinaryIO) -> Tuple[List[str], Iterator[Tuple[int, Dict[str, Any]]]]:
+    """openpyxl 只读模式逐行读取第一个工作表"""
+    from openpyxl import load_workbook
+    
+    workbook = load_workbook(fileobj, read_only=True, data_only=True)
+    sheet = workbook.worksheets[0]
+    rows = sheet.iter_rows(values_only=True)
+    header = next(rows, None) or ()
+    columns = [str(name).strip() if name is not None else "" for name in header]
+    
+    def generate():
+        try:
+            for row_number, values in enumerate(rows, start=2):
+                # 跳过空行（只读模式下工作表尺寸可能包含大量空行）
+                if all(value is None or value == "" for value in values):
+                    continue
+                yield row_number, dict(zip(columns, values))
+        finally:
+            workbook.close()
+    
+    return columns, generate()
+
+
+def _csv_rows(fileobj: BinaryIO, chunk_size: int) -> Tuple[List[str], Iterator[Tuple[int, Dict[str, Any]]]]:
+    """按块读取csv（全部按字符串读取，空单元格为 None，跳过空行且行号与文件一致）"""
+    reader = pd.read_csv(
+        fileobj, dtype=str, chunksize=chunk_size, encoding="utf-8-sig", skip_blank_lines=False
+    )
+    first_chunk = next(reader, None)
+    if first_chunk is None:
+        return [], iter(())
+    columns = [str(name).strip() for name in first_chunk.columns]
+    
+    def generate():
+        row_number = 2
+        for chunk in ([first_chunk], reader):
+            for frame in chunk:
+                frame.columns = columns
+                frame = frame.astype(object).where(frame.notna(), None)
+                for values in frame.itertuples(index=False, name=None):
+                    if any(value is not None for value in values):
+                        yield row_number, dict(zip(columns, values))
+                    row_number += 1
+    
+    return columns, generate()
+
+
+def _legacy_excel_rows(fileobj: BinaryIO) -> Tuple[List[str], Iterator[Tuple[int, Dict[str, Any]]]]:
+    """旧版 .xls 文件（openpyxl 不支持，仍通过 pandas 整体读取）"""
+    df = pd.read_excel(fileobj)
+    df = df.astype(object).where(df.notna(), None)
+    columns = [str(name).strip() for name in df.columns]
+    
+    def generate():
+        for row_number, values in enumerate(df.itertuples(index=False, name=None), start=2):
+            yield row_number, dict(zip(columns, values))
+    
+    return columns, generate()
+
+
+def open_order_rows(
+    fileobj: BinaryIO,
+    filename: str,
+    chunk_size: int = None
+) -> Tuple[List[str], Iterator[Tuple[int, Dict[str, Any]]]]:
+    """
+    打开订单文件，返回 (列名, 行迭代器)
+    
+    行迭代器逐行产生 (文件行号, {列名: 值})，行号从表头下一行的 2 开始。
+    """
+    chunk_size = chunk_size or settings.ORDER_IMPORT_BATCH_SIZE
+    lower_name = filename.lower()
+    if lower_name.endswith('.csv'):
+        return _csv_rows(fileobj, chunk_size)
+    if lower_name.endswith('.xls'):
+        return _legacy_excel_rows(fileobj)
+    return _xlsx_rows(fileobj)
+
+
+def iter_batches(rows: Iterable[Any], batch_size: int) -> Iterator[List[Any]]:
+    """按固定大小分批"""
+    iterator = iter(rows)
+    while True:
+        batch = list(islice(iterator, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def cell_text(value: Any) -> Optional[str]:
+    """
+    单元格转换为字符串，空值返回 None
+    
+    xlsx 中按数字保存的手机号、跟团号读出来可能是浮点数，整数值去掉小数部分（13800138000.0 -> "13800138000"）。
+    """
+    if value is None or not pd.notna(value):
+        return None
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def phone_text(value: Any) -> Optional[str]:
+    """电话单元格转换为字符串（csv 中由浮点列导出的 "13800138000.0" 同样去掉小数部分）"""
+    text = cell_text(value)
+    if text and _FLOAT_DIGITS.fullmatch(text):
+        return text.split(".", 1)[0]
+    return text
+
+
+def _payment_time(value: Any) -> Any:
+    """支付时间：日期单元格原样使用，文本按日期解析（空白文本视为没有支付时间）"""
+    if not pd.notna(value):
+        return None
+    if isinstance(value, str):
+        value = value.strip()
+        if not value:
+            return None
+        try:
+            return datetime.fromisoformat(value)
+        except ValueError:
+            timestamp = pd.Timestamp(value)
+            # "NaT"、"nan" 等文本解析为 NaT，不能写入数据库
+            return timestamp.to_pydatetime() if pd.notna(timestamp) else None
+    return value
+
+
+def build_order_data(row: Dict[str, Any], group_id: int) -> Dict[str, Any]:
+    """把文件中的一行转换为订单字段"""
+    return {
+        'group_id': group_id,
+        'group_tour_number': cell_text(row['跟团号']),
+        'orderer': cell_text(row['下单人']),
+        'member_remarks': cell_text(row['团员备注']),
+        'payment_time': _payment_time(row['支付时间']),
+        'group_leader_remarks': cell_text(row['团长备注']),
+        'product': cell_text(row['商品']),
+        'order_amount': Decimal(str(row['订单金额'])) if pd.notna(row['订单金额']) else None,
+        'refund_amount': Decimal(str(row['退款金额'])) if pd.notna(row['退款金额']) else Decimal('0'),
+        'order_status': map_order_status(str(row['订单状态'])) if pd.notna(row['订单状态']) else OrderStatus.PENDING,
+        'pickup_point': cell_text(row['自提点']),
+        'consignee': cell_text(row['收货人']),
+        'contact_phone': phone_text(row['联系电话']),
+        'detailed_address': cell_text(row['详细地址']),
+    }
+
+
+def _db_error(error: Exception) -> str:
+    """数据库错误信息（去掉SQL语句和参数）"""
+    return str(getattr(error, "orig", None) or error)
+
+
+def bulk_insert_orders(
+    db: Session,
+    rows: Iterable[Tuple[int, Any]],
+    convert: Callable[[Any], Dict[str, Any]],
+    batch_size: int = None
+) -> Tuple[int, List[str]]:
+    """
+    批量写入订单（不提交事务）
+    
+    rows 逐行产生 (文件行号, 原始行)，convert 把原始行转换为订单字段。
+    每批用一条 executemany 插入；某批写入失败时在该批内逐行重试，
+    只跳过出错的行，其余行照常写入。返回 (导入条数, 错误信息列表)。
+    """
+    batch_size = batch_size or settings.ORDER_IMPORT_BATCH_SIZE
+    insert_statement = insert(OrderModel.__table__)
+    imported_count = 0
+    errors: List[str] = []
+    
+    for batch in iter_batches(rows, batch_size):
+        row_numbers = []
+        mappings = []
+        for row_number, row in batch:
+            try:
+                mappings.append(convert(row))
+                row_numbers.append(row_number)
+            except Exception as e:
+                errors.append(f"第{row_number}行数据错误: {str(e)}")
+        if not mappings:
+            continue
+        
+        try:
+            with db.begin_nested():
+                db.execute(insert_statement, mappings)
+            imported_count += len(mappings)
+            continue
+        except Exception as e:
+            logger.warning(f"第{row_numbers[0]}-{row_numbers[-1]}行批量写入失败，逐行重试: {_db_error(e)}")
+        
+        # 逐行重试，定位出错的行
+        for row_number, mapping in zip(row_numbers, mappings):
+            try:
+                with db.begin_nested():
+                    db.execute(insert_statement, [mapping])
+                imported_count += 1
+            except Exception as e:
+                errors.append(f"第{row_number}行数据错误: {_db_error(e)}")
+    
+    return imported_count, errors
+
+
+def import_order_rows(
+    db: Session,
+    rows: Iterable[Tuple[int, Dict[str, Any]]],
+    group_id: int,
+    batch_size: int = None
+) -> Tuple[int, List[str]]:
+    """
+    把订单文件中的行批量导入到分组（不提交事务）
+    
+    返回 (导入条数, 错误信息列表)。
+    """
+    return bulk_insert_orders(db, rows, lambda row: build_order_data(row, group_id), batch_size)
@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+订单侧索引（反向筛查）
+
+新增或修改一条黑名单时，需要找出可能与它匹配的已有订单。这里按订单建立与黑名单快照
+相同口径的索引：电话及其删一位变体、下单人姓名字符倒排、下单人/收货人拼音、
+地址字符倒排及区县、备注中的微信号，以及自由文本中的完整数字串/微信号串。
+查询只访问与这条黑名单相关的倒排表，代价与命中数成正比，与订单总数无关。
+
+索引给出的是候选订单（不会漏掉正向匹配能命中的订单），最终结果仍由
+BlacklistMatcher 对候选订单重新匹配得到。
+"""
+
+import logging
+import threading
+from datetime import datetime
+from typing import List, Dict, Any, Optional, Tuple, Set, Iterable, NamedTuple
+
+from sqlalchemy import func, or_
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.order import Order
+from app.services.address_index import RegionIndex
+from app.services.blacklist_matcher import blacklist_matcher, BlacklistMatcher
+from app.services.blacklist_snapshot import CharIndex, PhoneDeletionIndex
+from app.services.name_pinyin import build_pinyin_index
+from app.services.text_scanner import whole_tokens
+
+logger = logging.getLogger(__name__)
+
+
+class OrderIndexVersion(NamedTuple):
+    """订单表版本（订单数、最大ID、最后更新时间）"""
+    order_count: int
+    max_id: int
+    last_updated: Optional[datetime]
+
+
+def get_order_index_version(db: Session) -> OrderIndexVersion:
+    """查询订单表当前版本（只做聚合查询）"""
+    order_count, max_id, last_updated = db.query(
+        func.count(Order.id),
+        func.max(Order.id),
+        func.max(Order.updated_at)
+    ).filter(Order.is_active == True).one()
+    return OrderIndexVersion(order_count or 0, max_id or 0, last_updated)
+
+
+class OrderIndex:
+    """
+    一组订单的倒排索引
+    
+    各索引记录的是订单在 order_ids 中的位置。
+    """
+    
+    __slots__ = (
+        "order_ids", "phone_index", "phone_deletion_index", "name_index", "pinyin_values",
+        "pinyin_owners", "name_pinyin", "address_index", "address_regions", "wechat_index", "token_index"
+    )
+    
+    def __init__(self, orders: Iterable[Any], matcher: Optional[BlacklistMatcher] = None):
+        matcher = matcher or blacklist_matcher
+        
+        order_ids: List[int] = []
+        phone_owners: Dict[str, List[int]] = {}
+        name_owners: Dict[str, List[int]] = {}
+        pinyin_owners: Dict[str, List[int]] = {}
+        address_owners: Dict[str, List[int]] = {}
+        wechat_owners: Dict[str, List[int]] = {}
+        token_owners: Dict[str, List[int]] = {}
+        for order_pos, order in enumerate(orders):
+            order_ids.append(order.id)
+            orderer = matcher.normalize_name(order.orderer)
+            consignee = matcher.normalize_name(order.consignee)
+            self._add_owner(phone_owners, matcher.extract_phones(order.contact_phone), order_pos)
+            self._add_owner(name_owners, [orderer], order_pos)
+            self._add_owner(pinyin_owners, [orderer, consignee], order_pos)
+            self._add_owner(address_owners, [matcher.normalize_name(order.detailed_address)], order_pos)
+            self._add_owner(wechat_owners, matcher.order_wechat_ids(order), order_pos)
+            self._add_owner(token_owners, whole_tokens(matcher.order_free_text(order)), order_pos)
+        
+        self.order_ids: Tuple[int, ...] = tuple(order_ids)
+        self.phone_index: Dict[str, Tuple[int, ...]] = {phone: tuple(owners) for phone, owners in phone_owners.items()}
+        self.phone_deletion_index = PhoneDeletionIndex(self.phone_index)
+        self.name_index = CharIndex(name_owners)
+        self.pinyin_values: Tuple[str, ...] = tuple(pinyin_owners)
+        self.pinyin_owners: Tuple[Tuple[int, ...], ...] = tuple(tuple(owners) for owners in pinyin_owners.values())
+        self.name_pinyin = build_pinyin_index(self.pinyin_values)
+        self.address_index = CharIndex(address_owners)
+        self.address_regions = RegionIndex(self.address_index.values)
+        self.wechat_index: Dict[str, Tuple[int, ...]] = {key: tuple(owners) for key, owners in wechat_owners.items()}
+        self.token_index: Dict[str, Tuple[int, ...]] = {key: tuple(owners) for key, owners in token_owners.items()}
+    
+    @staticmethod
+    def _add_owner(value_owners: Dict[str, List[int]], values: Iterable[str], order_pos: int):
+        """登记值所属的订单位置（忽略空值，同一订单只登记一次）"""
+        for value in values:
+            if not value:
+                continue
+            owners = value_owners.setdefault(value, [])
+            if not owners or owners[-1] != order_pos:
+                owners.append(order_pos)
+    
+    def __len__(self) -> int:
+        return len(self.order_ids)
+    
+    def candidates(self, entry: Any, matcher: Optional[BlacklistMatcher] = None) -> Set[int]:
+        """
+        可能与黑名单条目（BlacklistEntry）匹配的订单ID
+        
+        相似度与正向匹配一样以订单值在前计算，区县范围、拼音键的判定也与正向相同。
+        """
+        matcher = matcher or blacklist_matcher
+        positions: Set[int] = set()
+        
+        # 电话：精确、近似、自由文本中出现
+        for phone in entry.phones:
+            positions.update(self.phone_index.get(phone, ()))
+            positions.update(self.token_index.get(phone, ()))
+            if self.phone_deletion_index.covers(phone, matcher.phone_similarity_threshold):
+                candidate_phones = self.phone_deletion_index.candidates(phone)
+            else:
+                candidate_phones = self.phone_index.keys()
+            for order_phone in candidate_phones:
+                similarity = matcher.similarity_at_least(order_phone, phone, matcher.phone_similarity_threshold)
+                if similarity >= matcher.phone_similarity_threshold:
+                    positions.update(self.phone_index[order_phone])
+        
+        # 微信号：备注中的微信号、自由文本中出现
+        for wechat_id in entry.wechat_ids:
+            positions.update(self.wechat_index.get(wechat_id, ()))
+            positions.update(self.token_index.get(wechat_id, ()))
+        
+        # 姓名：字面相似、拼音相同
+        for name in entry.names:
+            positions.update(self._similar(self.name_index, name, matcher.name_similarity_threshold, None, matcher))
+            if matcher.pinyin_name_match and self.name_pinyin is not None:
+                _, full_ids, initials_ids = self.name_pinyin.lookup(name)
+                for value_idx in (*full_ids, *initials_ids):
+                    positions.update(self.pinyin_owners[value_idx])
+        
+        # 地址：同区县（或无法解析区县）的相似地址
+        for address in entry.addresses:
+            scope = self.address_regions.scope(address) if matcher.address_region_filter else None
+            positions.update(self._similar(self.address_index, address, matcher.address_similarity_threshold, scope, matcher))
+        
+        return {self.order_ids[order_pos] for order_pos in positions}
+    
+    @staticmethod
+    def _similar(
+        index: CharIndex,
+        value: str,
+        threshold: float,
+        scope: Optional[Iterable[int]],
+        matcher: BlacklistMatcher
+    ) -> Set[int]:
+        """与值相似度达到阈值的订单位置"""
+        positions: Set[int] = set()
+        for value_idx in index.candidates(value, threshold, scope):
+            if matcher.similarity_at_least(index.values[value_idx], value, threshold) >= threshold:
+                positions.update(index.owners[value_idx])
+        return positions
+
+
+def query_order_rows(db: Session, since: Optional[OrderIndexVersion] = None) -> List[Any]:
+    """
+    查询建立订单索引需要的字段
+    
+    since 不为空时只查询该版本之后新增或修改过的订单（更新时间取 >=，
+    同一秒内的修改不会漏掉）。
+    """
+    query = db.query(
+        Order.id,
+        Order.contact_phone,
+        Order.orderer,
+        Order.consignee,
+        Order.detailed_address,
+        Order.member_remarks,
+        Order.group_leader_remarks
+    ).filter(Order.is_active == True)
+    if since is not None:
+        conditions = [Order.id > since.max_id]
+        if since.last_updated is not None:
+            conditions.append(Order.updated_at >= since.last_updated)
+        query = query.filter(or_(*conditions))
+    return query.order_by(Order.id).all()
+
+
+class OrderIndexCache:
+    """
+    订单索引缓存（进程内共享）
+    
+    订单表变化时不整体重建：base 之后新增或修改的订单单独建一个增量索引，
+    查询时合并两者的候选（base 中的旧值只会多给候选，不会漏）；
+    增量订单超过 REVERSE_SCREENING_MAX_DELTA_ORDERS 时再整体重建。
+    """
+    
+    def __init__(self):
+        self._base: Optional[OrderIndex] = None
+        self._base_version: Optional[OrderIndexVersion] = None
+        self._delta: Optional[OrderIndex] = None
+        self._version: Optional[OrderIndexVersion] = None
+        self._lock = threading.Lock()
+    
+    def get(self, db: Session) -> List[OrderIndex]:
+        """获取与订单表一致的索引（base 和增量索引）"""
+        version = get_order_index_version(db)
+        with self._lock:
+            if self._base is None or version != self._version:
+                self._update(db, version)
+            return [index for index in (self._base, self._delta) if index is not None]
+    
+    def _update(self, db: Session, version: OrderIndexVersion):
+        """按订单表版本更新索引"""
+        if self._base is not None:
+            rows = query_order_rows(db, since=self._base_version)
+            if len(rows) <= settings.REVERSE_SCREENING_MAX_DELTA_ORDERS:
+                self._delta = OrderIndex(rows) if rows else None
+                self._version = version
+                logger.info(f"订单索引已增量更新: 增量订单数={len(rows)}")
+                return
+        
+        self._base = OrderIndex(query_order_rows(db))
+        self._base_version = version
+        self._delta = None
+        self._version = version
+        logger.info(f"订单索引已重建: 订单数={len(self._base)}")
+    
+    def invalidate(self):
+        """清除缓存的索引"""
+        with self._lock:
+            self._base = self._delta = None
+            self._base_version = self._version = None
+
+
+# 全局订单索引缓存实例
+order_index_cache = OrderIndexCache()
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+多进程黑名单匹配服务
+
+把大批量订单按顺序切分后分发到进程池中匹配，结果按原顺序合并，
+与单进程的 check_orders_bulk 完全一致。进程池常驻，快照保存为文件，
+任务只带文件路径和订单数据，工作进程按路径打开快照并缓存，每个版本只加载一次。
+"""
+
+import logging
+import multiprocessing
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import ExitStack
+from typing import List, Dict, Any, Optional, NamedTuple, Tuple
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class OrderRecord(NamedTuple):
+    """传给工作进程的订单字段（只包含匹配需要的字段）"""
+    id: Optional[int]
+    contact_phone: Optional[str]
+    orderer: Optional[str]
+    detailed_address: Optional[str]
+    consignee: Optional[str] = None
+    member_remarks: Optional[str] = None
+    group_leader_remarks: Optional[str] = None
+
+
+def to_order_record(order: Any) -> OrderRecord:
+    """把订单对象转换为可跨进程传递的记录"""
+    return OrderRecord(
+        order.id, order.contact_phone, order.orderer, order.detailed_address,
+        order.consignee, order.member_remarks, order.group_leader_remarks
+    )
+
+
+class SnapshotMessage(NamedTuple):
+    """
+    随任务发给工作进程的快照信息
+    
+    只带快照文件路径（增量快照再带上增量文件路径），工作进程按路径缓存打开的快照，
+    快照内容不随任务发送。
+    """
+    version: str
+    base_path: str
+    delta_path: Optional[str] = None
+    
+    @property
+    def paths(self) -> Tuple[str, ...]:
+        return (self.base_path, self.delta_path) if self.delta_path else (self.base_path,)
+
+
+# 工作进程内按文件路径缓存的快照（最近使用的在后）
+_worker_snapshots: "OrderedDict[str, Any]" = OrderedDict()
+_WORKER_SNAPSHOT_LIMIT = 3
+
+
+def _remember_snapshot(path: str, snapshot: Any):
+    """在工作进程中缓存快照"""
+    _worker_snapshots[path] = snapshot
+    _worker_snapshots.move_to_end(path)
+    while len(_worker_snapshots) > _WORKER_SNAPSHOT_LIMIT:
+        _worker_snapshots.popitem(last=False)
+
+
+def _resolve_snapshot(message: SnapshotMessage) -> Any:
+    """
+    取得任务对应的快照
+    
+    缓存中没有时打开快照文件：启用共享快照文件时直接映射，否则解码为进程内快照；
+    增量快照由基础快照和增量文件组合。
+    """
+    from app.core.config import settings
+    from app.services.snapshot_store import decode_snapshot_store, open_layer_store, open_snapshot_store
+    mapped = settings.SNAPSHOT_STORE_ENABLED
+    
+    base = _worker_snapshots.get(message.base_path)
+    if base is None:
+        base = open_snapshot_store(message.base_path) if mapped else decode_snapshot_store(message.base_path)
+    _remember_snapshot(message.base_path, base)
+    if message.delta_path is None:
+        return base
+    
+    snapshot = _worker_snapshots.get(message.delta_path)
+    if snapshot is None:
+        snapshot = open_layer_store(message.delta_path, base, mapped)
+    _remember_snapshot(message.delta_path, snapshot)
+    return snapshot
+
+
+def _check_chunk(message: SnapshotMessage, records: List[OrderRecord]) -> Dict[str, List[Any]]:
+    """在工作进程中匹配一段订单"""
+    from app.services.blacklist_matcher import blacklist_matcher
+    return blacklist_matcher.check_orders_bulk(records, _resolve_snapshot(message), parallel=False)
+
+
+class ParallelMatcher:
+    """
+    进程池匹配器
+    
+    进程池只启动一次，黑名单更新后不重建：快照写成文件后只发送路径，
+    增量快照的增量部分单独写一个文件，基础快照的文件继续使用。
+    """
+    
+    def __init__(self, processes: int = None, chunk_size: int = None, min_orders: int = None):
+        self.processes = processes if processes is not None else settings.MATCHER_PROCESSES
+        self.chunk_size = chunk_size or settings.MATCHER_CHUNK_SIZE
+        self.min_orders = min_orders if min_orders is not None else settings.MATCHER_PARALLEL_MIN_ORDERS
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        # 最近发送的快照及其消息
+        self._snapshot: Any = None
+        self._message: Optional[SnapshotMessage] = None
+        # 本进程为发送快照写入的临时文件（没有版本号的快照、增量部分），换用新快照或关闭时删除
+        self._temp_files: List[str] = []
+    
+    @property
+    def enabled(self) -> bool:
+        """是否启用进程池"""
+        return self.processes > 1
+    
+    def should_parallelize(self, order_count: int) -> bool:
+        """订单数量足够大时才值得分发到进程池"""
+        return self.enabled and order_count >= self.min_orders
+    
+    def _get_executor(self) -> ProcessPoolExecutor:
+        """获取进程池（首次使用时启动）"""
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.processes,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+                logger.info(f"匹配进程池已启动: 进程数={self.processes}")
+            return self._executor
+    
+    def _snapshot_message(self, snapshot: Any) -> SnapshotMessage:
+        """生成快照消息，快照变化时写入工作进程要打开的文件（调用方持有 self._lock）"""
+        if self._snapshot is snapshot:
+            return self._message
+        
+        from app.services.snapshot_store import (
+            remove_stores, shared_store_path, temp_store_path, write_layer_store, write_snapshot_store
+        )
+        base = getattr(snapshot, "base", None)
+        temp_files = []
+        base_path = shared_store_path(base if base is not None else snapshot)
+        if not base_path:
+            base_path = temp_store_path("parallel")
+            write_snapshot_store(base if base is not None else snapshot, base_path)
+            temp_files.append(base_path)
+        delta_path = None
+        if base is not None:
+            delta_path = temp_store_path("delta")
+            write_layer_store(snapshot, delta_path)
+            temp_files.append(delta_path)
+        
+        # 旧快照的临时文件还在被其他匹配使用时保留，下次再删
+        self._temp_files = remove_stores(self._temp_files) + temp_files
+        self._snapshot = snapshot
+        self._message = SnapshotMessage(snapshot.version, base_path, delta_path)
+        return self._message
+    
+    def _reset_executor(self, executor: ProcessPoolExecutor):
+        """进程池异常退出后丢弃，下次使用时重新启动"""
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+    
+    def check_orders_bulk(self, orders: List[Any], snapshot: Any) -> Dict[str, List[Any]]:
+        """分片并行匹配，结果格式与 BlacklistMatcher.check_orders_bulk 相同"""
+        from app.services.blacklist_matcher import blacklist_matcher
+        from app.services.snapshot_store import pinned_stores
+        
+        records = [to_order_record(order) for order in orders]
+        chunks = [records[i:i + self.chunk_size] for i in range(0, len(records), self.chunk_size)]
+        
+        executor = self._get_executor()
+        with ExitStack() as stack:
+            try:
+                with self._lock:
+                    message = self._snapshot_message(snapshot)
+                    # 工作进程按路径打开快照文件，匹配期间不能删除
+                    stack.enter_context(pinned_stores(message.paths))
+            except (OSError, ValueError) as e:
+                logger.warning(f"快照文件写入失败，改为在本进程匹配: {e}")
+                return blacklist_matcher.check_orders_bulk(orders, snapshot, parallel=False)
+            
+            futures = [executor.submit(_check_chunk, message, chunk) for chunk in chunks]
+            chunk_results: List[Dict[str, List[Any]]] = []
+            for chunk, future in zip(chunks, futures):
+                try:
+                    chunk_results.append(future.result())
+                except Exception as e:
+                    # 工作进程出错（如快照文件已被其他进程删除）时在本进程匹配这一片
+                    logger.warning(f"并行匹配分片失败，改为在本进程匹配: {e}")
+                    if isinstance(e, BrokenProcessPool):
+                        self._reset_executor(executor)
+                    chunk_results.append(blacklist_matcher.check_orders_bulk(chunk, snapshot, parallel=False))
+        
+        results: Dict[str, List[Any]] = {
+            "order_id": [],
+            "is_blacklist": [],
+            "risk_level": [],
+            "match_count": [],
+            "matches": []
+        }
+        # 按分片顺序合并，保证顺序与输入一致
+        for chunk_result in chunk_results:
+            for column, values in chunk_result.items():
+                results[column].extend(values)
+        
+        logger.info(f"并行匹配完成: 订单数={len(records)}, 分片数={len(chunks)}")
+        return results
+    
+    def shutdown(self):
+        """关闭进程池并删除临时快照文件"""
+        from app.services.snapshot_store import remove_stores
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+            self._snapshot = None
+            self._message = None
+            self._temp_files = remove_stores(self._temp_files)
+
+
+# 全局并行匹配器实例
+parallel_matcher = ParallelMatcher()
@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+反向筛查服务
+
+新增、修改或删除黑名单后，已有订单的检测结果会过期。这里只针对变更的黑名单，
+通过订单侧索引找出可能受影响的订单（变更前后的内容都查，删除或改掉的黑名单
+原来命中的订单也要更新），用当前黑名单快照对这些订单重新匹配，
+再用一条批量 UPDATE 写回检测结果，不需要对全部订单重新检测。
+
+订单会记录检测时使用的快照版本。分组复检时，检测版本较旧的订单只有在
+该版本之后变更过的黑名单可能命中它时才重新匹配。
+"""
+
+import logging
+import threading
+from types import SimpleNamespace
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Callable, Iterable, Sequence
+
+from sqlalchemy import func, update
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.blacklist import Blacklist, BlacklistHistory
+from app.models.group import Group
+from app.models.order import Order
+from app.services.blacklist_matcher import blacklist_matcher
+from app.services.blacklist_snapshot import (
+    BlacklistSnapshot, get_blacklist_snapshot, query_blacklist_rows,
+    parse_snapshot_version, parse_snapshot_history_id
+)
+from app.services.order_index import order_index_cache
+
+logger = logging.getLogger(__name__)
+
+# 构建黑名单条目需要的字段
+BLACKLIST_MATCH_FIELDS = (
+    "id", "blacklist_reason", "phone_numbers", "ktt_name", "wechat_name",
+    "wechat_id", "order_name_phone", "order_address1", "order_address2"
+)
+
+
+def order_check_values(match_result: Dict[str, Any]) -> Dict[str, Any]:
+    """检测结果对应的订单字段（与分组批量检测写入的内容一致）"""
+    if not match_result["is_blacklist"]:
+        return {
+            "is_blacklist_checked": "yes",
+            "blacklist_risk_level": match_result["risk_level"],
+            "blacklist_match_info": "未匹配到黑名单",
+            "blacklist_match_details": ""
+        }
+    
+    # 只显示前3个匹配
+    match_details = [f"{match['match_type']}: {match['match_details']}" for match in match_result["matches"][:3]]
+    return {
+        "is_blacklist_checked": "yes",
+        "blacklist_risk_level": match_result["risk_level"],
+        "blacklist_match_info": f"匹配到 {match_result.get('match_count', 0)} 条黑名单记录",
+        "blacklist_match_details": "; ".join(match_details)
+    }
+
+
+def previous_blacklist_items(previous_data: Iterable[Any]) -> List[SimpleNamespace]:
+    """把变更前的黑名单数据（变更历史中的 old_data）转换成可构建条目的对象，缺少的字段按空值处理"""
+    return [
+        SimpleNamespace(**{field: data.get(field) for field in BLACKLIST_MATCH_FIELDS})
+        for data in previous_data if isinstance(data, dict) and data.get("id") is not None
+    ]
+
+
+def blacklist_changes_since(db: Session, version: str, until_history_id: Optional[int] = None) -> Optional[List[Any]]:
+    """
+    快照版本之后变更过的黑名单（当前数据和变更前数据）
+    
+    until_history_id 为当前快照的最新变更历史ID：只统计到这条历史为止的变更，
+    之后的变更不在当前快照中，由下次复检处理（这些黑名单之后的变更前数据也一并返回，
+    其中包含快照中的内容）。
+    
+    以下情况无法确定变更范围，返回 None，由调用方按全部受影响处理：
+    - 版本号无法解析；
+    - 变更的黑名单超过 SNAPSHOT_INCREMENTAL_MAX_CHANGES；
+    - 有没写变更历史的黑名单被修改（更新时间晚于该版本但不在历史中）。
+    """
+    history_id = parse_snapshot_history_id(version)
+    if history_id is None:
+        return None
+    try:
+        _, last_updated = parse_snapshot_version(version)
+    except ValueError:
+        return None
+    
+    histories = db.query(BlacklistHistory.id, BlacklistHistory.blacklist_id, BlacklistHistory.old_data).filter(
+        BlacklistHistory.id > history_id
+    ).all()
+    changed_ids = {
+        history.blacklist_id for history in histories
+        if until_history_id is None or history.id <= until_history_id
+    }
+    if len(changed_ids) > settings.SNAPSHOT_INCREMENTAL_MAX_CHANGES:
+        return None
+    
+    logged_ids = [history.blacklist_id for history in histories]
+    unlogged = db.query(func.count(Blacklist.id)).filter(Blacklist.id.notin_(logged_ids))
+    if last_updated is not None:
+        unlogged = unlogged.filter(Blacklist.updated_at > last_updated)
+    if unlogged.scalar():
+        return None
+    
+    if not changed_ids:
+        return []
+    items = list(query_blacklist_rows(db, changed_ids))
+    items.extend(previous_blacklist_items(
+        history.old_data for history in histories if history.blacklist_id in changed_ids
+    ))
+    return items
+
+
+def select_orders_to_check(db: Session, orders: Sequence[Any], snapshot: Any, force_recheck: bool = False) -> List[Any]:
+    """
+    筛选分组检测需要重新匹配的订单（保持原顺序）
+    
+    未检测过或没有记录检测版本的订单都要检测；检测版本与快照一致的订单跳过；
+    检测版本较旧的订单只有可能被该版本之后变更的黑名单命中时才重新检测，
+    其余订单的结果不变，直接把检测版本更新为当前快照版本（不改动 updated_at）。
+    """
+    if force_recheck:
+        return list(orders)
+    
+    check_ids = set()
+    version_orders: Dict[str, List[int]] = {}
+    for order in orders:
+        version = order.blacklist_checked_version
+        if order.is_blacklist_checked != "yes" or not version:
+            check_ids.add(order.id)
+        elif version != snapshot.version:
+            version_orders.setdefault(version, []).append(order.id)
+    
+    unchanged_ids = []
+    for version, order_ids in version_orders.items():
+        # 检测时用的快照比当前快照新（其他进程已换上新快照），不退回旧结果
+        history_id = parse_snapshot_history_id(version)
+        if history_id is not None and history_id > snapshot.history_id:
+            continue
+        
+        changes = blacklist_changes_since(db, version, snapshot.history_id)
+        if changes is None:
+            check_ids.update(order_ids)
+            continue
+        affected_ids = set(find_affected_orders(db, changes)) if changes else set()
+        for order_id in order_ids:
+            if order_id in affected_ids:
+                check_ids.add(order_id)
+            else:
+                unchanged_ids.append(order_id)
+    
+    if unchanged_ids:
+        db.query(Order).filter(Order.id.in_(unchanged_ids)).update({
+            Order.blacklist_checked_version: snapshot.version,
+            Order.updated_at: Order.updated_at
+        }, synchronize_session=False)
+    
+    logger.info(
+        f"分组检测订单筛选: 订单数={len(orders)}, 需要检测={len(check_ids)}, "
+        f"未受黑名单变更影响={len(unchanged_ids)}"
+    )
+    return [order for order in orders if order.id in check_ids]
+
+
+def find_affected_orders(db: Session, blacklist_items: Iterable[Any]) -> List[int]:
+    """
+    找出可能与这些黑名单匹配的订单ID
+    
+    blacklist_items 可以是 Blacklist 模型对象、查询行或带同名字段的对象（如变更历史中的旧数据）。
+    """
+    entries = BlacklistSnapshot.build(blacklist_items, use_address_lsh=False).entries
+    order_ids = set()
+    for index in order_index_cache.get(db):
+        for entry in entries:
+            order_ids.update(index.candidates(entry))
+    return sorted(order_ids)
+
+
+def rescreen_orders(db: Session, order_ids: List[int]) -> Dict[str, int]:
+    """
+    用当前黑名单快照重新检测指定订单，并批量写回结果
+    
+    写回时保留订单原来的 updated_at，检测结果的变化不会被当作订单修改。
+    """
+    if not order_ids:
+        return {"checked_orders": 0, "blacklist_matches": 0}
+    
+    orders = db.query(
+        Order.id,
+        Order.group_id,
+        Order.updated_at,
+        Order.contact_phone,
+        Order.orderer,
+        Order.consignee,
+        Order.detailed_address,
+        Order.member_remarks,
+        Order.group_leader_remarks
+    ).filter(Order.id.in_(order_ids), Order.is_active == True).all()
+    if not orders:
+        return {"checked_orders": 0, "blacklist_matches": 0}
+    
+    snapshot = get_blacklist_snapshot(db)
+    bulk_results = blacklist_matcher.check_orders_bulk(orders, snapshot)
+    
+    values = []
+    for i, order in enumerate(orders):
+        values.append({
+            "id": order.id,
+            "updated_at": order.updated_at,
+            "blacklist_checked_version": snapshot.version,
+            **order_check_values(blacklist_matcher.bulk_result_at(bulk_results, i))
+        })
+    db.execute(update(Order), values)
+    
+    # 重新计算受影响分组的黑名单匹配数（口径与分组批量检测一致）
+    group_ids = {order.group_id for order in orders if order.group_id is not None}
+    if group_ids:
+        match_counts = dict(db.query(Order.group_id, func.count(Order.id)).filter(
+            Order.group_id.in_(group_ids),
+            Order.is_active == True,
+            Order.is_blacklist_checked == "yes",
+            Order.blacklist_risk_level != "none"
+        ).group_by(Order.group_id).all())
+        db.execute(update(Group), [
+            {"id": group_id, "blacklist_matches": match_counts.get(group_id, 0)} for group_id in group_ids
+        ])
+    db.commit()
+    
+    return {
+        "checked_orders": len(orders),
+        "blacklist_matches": sum(1 for is_blacklist in bulk_results["is_blacklist"] if is_blacklist)
+    }
+
+
+class ReverseScreeningRunner:
+    """反向筛查执行器（在后台线程中执行，不阻塞黑名单的增删改接口）"""
+    
+    def __init__(self, session_factory: Optional[Callable[[], Session]] = None):
+        self.session_factory = session_factory
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+    
+    def _new_session(self) -> Session:
+        """创建独立的数据库会话（任务不与HTTP请求共用会话）"""
+        if self.session_factory is None:
+            from app.core.database import SessionLocal
+            return SessionLocal()
+        return self.session_factory()
+    
+    def _get_executor(self) -> ThreadPoolExecutor:
+        """单线程执行，多次变更按提交顺序处理"""
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="reverse-screening")
+            return self._executor
+    
+    def submit(self, blacklist_ids: List[int], previous_data: Optional[List[Dict[str, Any]]] = None):
+        """
+        提交变更的黑名单
+        
+        previous_data 为变更前的黑名单数据（如变更历史中的 old_data），
+        用于找出原来命中、现在可能不再命中的订单。
+        """
+        if not settings.REVERSE_SCREENING_ENABLED:
+            return
+        self._get_executor().submit(self.run, list(blacklist_ids), list(previous_data or []))
+    
+    def run(self, blacklist_ids: List[int], previous_data: List[Dict[str, Any]]) -> Optional[Dict[str, int]]:
+        """执行反向筛查（同步执行，出错时只记录日志）"""
+        db = self._new_session()
+        try:
+            items = list(query_blacklist_rows(db, blacklist_ids))
+            items.extend(previous_blacklist_items(previous_data))
+            order_ids = find_affected_orders(db, items)
+            stats = rescreen_orders(db, order_ids)
+            logger.info(
+                f"反向筛查完成: 黑名单={blacklist_ids}, 候选订单数={len(order_ids)}, "
+                f"重新检测={stats['checked_orders']}, 命中={stats['blacklist_matches']}"
+            )
+            return stats
+        except Exception as e:
+            logger.error(f"反向筛查失败: 黑名单={blacklist_ids}, {e}", exc_info=True)
+            db.rollback()
+            return None
+        finally:
+            db.close()
+    
+    def shutdown(self):
+        """关闭执行线程"""
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+
+# 全局反向筛查执行器实例
+reverse_screening_runner = ReverseScreeningRunner()
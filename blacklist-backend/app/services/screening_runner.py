@@ -0,0 +1,357 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+筛查任务执行服务
+
+流式读取上传的筛查文件，按批次与黑名单快照匹配，批量写入筛查结果并逐批更新任务进度，
+内存占用不随文件大小增长。任务可以提交到 Celery worker 执行，未部署 Redis 时在进程内的线程池中执行。
+执行前先取得任务的执行租约，多个进程同时继续中断的任务时只有一个执行。
+"""
+
+import os
+import uuid
+import socket
+import logging
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import List, Dict, Any, Optional, Callable, Iterator, Tuple
+
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.exceptions import FileProcessingError
+from app.models.screening import ScreeningTask, ScreeningResult
+from app.models.user import RiskLevel
+from app.services.blacklist_matcher import blacklist_matcher
+from app.services.order_import import cell_text, iter_batches, open_order_rows, phone_text
+from app.services.parallel_matcher import OrderRecord
+
+logger = logging.getLogger(__name__)
+
+
+# 筛查文件中可识别的列名（按优先顺序）
+SCREENING_COLUMNS = {
+    "orderer": ["下单人", "姓名", "收货人"],
+    "contact_phone": ["联系电话", "手机号", "电话"],
+    "detailed_address": ["详细地址", "地址", "收货地址"]
+}
+
+# 匹配器风险等级 -> 筛查结果风险等级
+RISK_LEVELS = {
+    "HIGH": RiskLevel.HIGH,
+    "MEDIUM": RiskLevel.MEDIUM,
+    "LOW": RiskLevel.LOW
+}
+
+
+# 筛查文件的一行：(文件行号, {列名: 字符串值})
+ScreeningRow = Tuple[int, Dict[str, Optional[str]]]
+
+
+@contextmanager
+def open_screening_file(file_path: str) -> Iterator[Tuple[List[str], Iterator[ScreeningRow]]]:
+    """
+    流式打开筛查文件，产生 (列名, 行迭代器)
+    
+    与订单导入相同：xlsx 逐行读取，csv 按块读取；单元格值统一转换为字符串。
+    """
+    if not file_path or not os.path.exists(file_path):
+        raise FileProcessingError(f"筛查文件不存在: {file_path}")
+    
+    with open(file_path, "rb") as f:
+        columns, rows = open_order_rows(f, file_path, settings.SCREENING_CHUNK_SIZE)
+        yield columns, (
+            (row_number, {column: cell_text(value) for column, value in row.items()})
+            for row_number, row in rows
+        )
+
+
+def count_screening_rows(file_path: str) -> int:
+    """筛查文件的记录数（流式计数，不保留行内容）"""
+    with open(file_path, "rb") as f:
+        _, rows = open_order_rows(f, file_path, settings.SCREENING_CHUNK_SIZE)
+        return sum(1 for _ in rows)
+
+
+def resolve_columns(columns: List[str]) -> Dict[str, Optional[str]]:
+    """确定匹配字段对应的文件列"""
+    mapping = {
+        field: next((column for column in aliases if column in columns), None)
+        for field, aliases in SCREENING_COLUMNS.items()
+    }
+    if not mapping["orderer"] and not mapping["contact_phone"]:
+        raise FileProcessingError("筛查文件必须包含姓名或电话号码列")
+    return mapping
+
+
+class ScreeningRunner:
+    """
+    筛查任务执行器
+    
+    任务的 runner_id/lease_expires_at 记录执行租约：执行前用条件更新取得租约，
+    每提交一批续约；进程退出后租约过期，其他进程的执行器才能接管。
+    """
+    
+    def __init__(self, session_factory: Optional[Callable[[], Session]] = None, chunk_size: int = None):
+        self.session_factory = session_factory
+        self.chunk_size = chunk_size or settings.SCREENING_CHUNK_SIZE
+        self.runner_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        # 已提交到本进程执行器、尚未执行完的任务（定期检查时不重复提交）
+        self._submitted: set = set()
+        self._monitor: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+    
+    def _new_session(self) -> Session:
+        """创建独立的数据库会话（任务不与HTTP请求共用会话）"""
+        if self.session_factory is None:
+            from app.core.database import SessionLocal
+            return SessionLocal()
+        return self.session_factory()
+    
+    def _get_executor(self) -> ThreadPoolExecutor:
+        """进程内执行用的线程池"""
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=settings.SCREENING_LOCAL_WORKERS,
+                    thread_name_prefix="screening"
+                )
+            return self._executor
+    
+    def submit(self, task_id: int) -> str:
+        """提交筛查任务，返回实际使用的执行方式"""
+        if settings.SCREENING_EXECUTOR == "celery":
+            try:
+                from app.core.celery_app import celery_app
+                celery_app.send_task("screening.run_task", args=[task_id])
+                logger.info(f"筛查任务 {task_id} 已提交到Celery")
+                return "celery"
+            except Exception as e:
+                logger.warning(f"提交Celery失败，改为进程内执行: {e}")
+        
+        with self._lock:
+            self._submitted.add(task_id)
+        self._get_executor().submit(self.run_task, task_id)
+        logger.info(f"筛查任务 {task_id} 已提交到进程内执行器")
+        return "local"
+    
+    def run_task(self, task_id: int):
+        """执行筛查任务（同步执行，出错时把任务标记为失败，保留检查点以便继续）"""
+        db = self._new_session()
+        try:
+            if not self._claim(db, task_id):
+                logger.info(f"筛查任务 {task_id} 不存在、已完成或正由其他执行器执行，跳过")
+                return
+            task = db.query(ScreeningTask).filter(ScreeningTask.id == task_id).first()
+            self._run(db, task)
+        
+        except Exception as e:
+            logger.error(f"筛查任务 {task_id} 执行失败: {e}", exc_info=True)
+            db.rollback()
+            # 租约已被其他执行器接管时不覆盖它的状态
+            db.query(ScreeningTask).filter(
+                ScreeningTask.id == task_id,
+                ScreeningTask.runner_id == self.runner_id
+            ).update({
+                ScreeningTask.status: "failed",
+                ScreeningTask.error_message: str(e),
+                ScreeningTask.lease_expires_at: None
+            }, synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+            with self._lock:
+                self._submitted.discard(task_id)
+    
+    def _lease_deadline(self) -> datetime:
+        return datetime.now() + timedelta(seconds=settings.SCREENING_LEASE_SECONDS)
+    
+    def _claim(self, db: Session, task_id: int) -> bool:
+        """
+        取得任务的执行租约
+        
+        条件更新：任务未完成，且没有租约、租约已过期或租约本来就属于本执行器；
+        多个执行器同时继续同一任务时只有一个更新成功。
+        """
+        now = datetime.now()
+        claimed = db.query(ScreeningTask).filter(
+            ScreeningTask.id == task_id,
+            ScreeningTask.status != "completed",
+            or_(
+                ScreeningTask.lease_expires_at.is_(None),
+                ScreeningTask.lease_expires_at < now,
+                ScreeningTask.runner_id == self.runner_id
+            )
+        ).update({
+            ScreeningTask.runner_id: self.runner_id,
+            ScreeningTask.lease_expires_at: self._lease_deadline()
+        }, synchronize_session=False)
+        db.commit()
+        return bool(claimed)
+    
+    def _run(self, db: Session, task: ScreeningTask):
+        """解析文件并分批匹配，从上次的检查点继续"""
+        from app.services.blacklist_snapshot import get_blacklist_snapshot
+        
+        with open_screening_file(task.file_path) as (file_columns, rows):
+            columns = resolve_columns(file_columns)
+            
+            # 检查点：processed_records 是已提交的记录数，matched_records 是对应的匹配数
+            offset = task.processed_records or 0
+            if offset and offset <= (task.total_records or 0):
+                logger.info(f"筛查任务 {task.id} 从第 {offset} 条继续，已匹配 {task.matched_records}")
+            else:
+                if offset:
+                    logger.warning(f"筛查任务 {task.id} 的检查点与文件不一致，重新开始")
+                db.query(ScreeningResult).filter(ScreeningResult.task_id == task.id).delete(synchronize_session=False)
+                offset = 0
+                task.total_records = count_screening_rows(task.file_path)
+                task.processed_records = 0
+                task.matched_records = 0
+            
+            task.status = "processing"
+            task.error_message = None
+            db.commit()
+            
+            snapshot = get_blacklist_snapshot(db)
+            logger.info(f"筛查任务 {task.id} 开始: 记录数={task.total_records}, 黑名单快照={snapshot.version}")
+            
+            # 已提交的记录在读取时跳过，不做匹配
+            start = offset
+            for chunk in iter_batches(islice(rows, offset, None), self.chunk_size):
+                matched = self._process_chunk(db, task.id, chunk, columns, snapshot, start)
+                
+                if not self._save_checkpoint(db, task.id, start, len(chunk), matched):
+                    db.rollback()
+                    logger.warning(f"筛查任务 {task.id} 已被其他执行器接管，停止当前执行")
+                    return
+                start += len(chunk)
+        
+        db.refresh(task)
+        task.status = "completed"
+        task.completed_at = datetime.now().isoformat()
+        task.lease_expires_at = None
+        db.commit()
+        logger.info(f"筛查任务 {task.id} 完成: 处理={task.processed_records}, 匹配={task.matched_records}")
+    
+    def _save_checkpoint(self, db: Session, task_id: int, offset: int, count: int, matched: int) -> bool:
+        """
+        保存检查点并提交
+        
+        只有租约仍属于本执行器且检查点仍停在 offset 时才推进，同时续约；
+        结果和检查点在同一事务中提交，因此重复执行同一任务不会写入重复结果。
+        """
+        updated = db.query(ScreeningTask).filter(
+            ScreeningTask.id == task_id,
+            ScreeningTask.runner_id == self.runner_id,
+            ScreeningTask.processed_records == offset
+        ).update({
+            ScreeningTask.processed_records: offset + count,
+            ScreeningTask.matched_records: ScreeningTask.matched_records + matched,
+            ScreeningTask.lease_expires_at: self._lease_deadline()
+        }, synchronize_session=False)
+        if not updated:
+            return False
+        db.commit()
+        return True
+    
+    def resume_unfinished(self) -> List[int]:
+        """重新提交中断的筛查任务（状态仍为处理中、没有租约或租约已过期的任务）"""
+        db = self._new_session()
+        try:
+            task_ids = [
+                task_id for (task_id,) in
+                db.query(ScreeningTask.id).filter(
+                    ScreeningTask.status == "processing",
+                    or_(ScreeningTask.lease_expires_at.is_(None), ScreeningTask.lease_expires_at < datetime.now())
+                ).all()
+            ]
+        finally:
+            db.close()
+        
+        with self._lock:
+            task_ids = [task_id for task_id in task_ids if task_id not in self._submitted]
+        for task_id in task_ids:
+            self.submit(task_id)
+        if task_ids:
+            logger.info(f"已重新提交中断的筛查任务: {task_ids}")
+        return task_ids
+    
+    def start_monitor(self):
+        """启动后台线程，定期接管租约过期的任务（执行它们的进程已退出）"""
+        with self._lock:
+            if self._monitor is not None:
+                return
+            self._stopping.clear()
+            self._monitor = threading.Thread(target=self._watch, name="screening-monitor", daemon=True)
+            self._monitor.start()
+    
+    def _watch(self):
+        while not self._stopping.wait(settings.SCREENING_RESUME_INTERVAL):
+            try:
+                self.resume_unfinished()
+            except Exception as e:
+                logger.error(f"检查中断的筛查任务失败: {e}", exc_info=True)
+    
+    def _process_chunk(
+        self,
+        db: Session,
+        task_id: int,
+        chunk: List[ScreeningRow],
+        columns: Dict[str, Optional[str]],
+        snapshot: Any,
+        offset: int
+    ) -> int:
+        """匹配一批记录并批量写入结果，返回命中黑名单的记录数"""
+        rows = [row for _, row in chunk]
+        records = [
+            OrderRecord(
+                offset + i,
+                phone_text(row.get(columns["contact_phone"])) if columns["contact_phone"] else None,
+                row.get(columns["orderer"]) if columns["orderer"] else None,
+                row.get(columns["detailed_address"]) if columns["detailed_address"] else None
+            )
+            for i, row in enumerate(rows)
+        ]
+        bulk_results = blacklist_matcher.check_orders_bulk(records, snapshot)
+        
+        mappings = []
+        matched = 0
+        for i, (row_number, row) in enumerate(chunk):
+            if not bulk_results["is_blacklist"][i]:
+                continue
+            matched += 1
+            order_data = {**row, "行号": row_number}  # 文件中的行号（含表头）
+            for match in bulk_results["matches"][i]:
+                mappings.append({
+                    "task_id": task_id,
+                    "blacklist_id": match["blacklist_id"],
+                    "order_data": order_data,
+                    "match_type": match["match_type"],
+                    "match_score": match["match_score"],
+                    "match_details": match["match_details"],
+                    "risk_level": RISK_LEVELS[match["risk_level"]]
+                })
+        
+        if mappings:
+            db.bulk_insert_mappings(ScreeningResult, mappings)
+        return matched
+    
+    def shutdown(self):
+        """停止定期检查并关闭进程内线程池"""
+        self._stopping.set()
+        with self._lock:
+            self._monitor = None
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+
+# 全局筛查任务执行器实例
+screening_runner = ScreeningRunner()
@@ -0,0 +1,1001 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+黑名单快照共享存储
+
+多个 uvicorn worker 和匹配进程池各自持有一份黑名单快照及其索引时，内存随进程数成倍增长。
+这里把构建好的快照写成一个紧凑的二进制文件：字符串集中存放在字符串区，
+索引以偏移量数组（CSR）表示；电话号码存为 int64 定长数组，微信号、拼音、区县等键
+存为定长字节串数组，另存排序下标，查询时用 np.searchsorted 在映射的数组上二分。
+各进程以只读 mmap 方式打开，直接在映射的内存上查询，不复制数据，
+所有进程共享操作系统的页缓存，增加 worker 不会增加快照占用的内存。
+
+文件结构：
+    魔数(8字节) | 头部长度(8字节) | 头部JSON | 按 8 字节对齐的各数组段
+头部记录快照版本、各数组段的偏移、类型和长度。
+"""
+
+import os
+import sys
+import json
+import mmap
+import hashlib
+import logging
+import threading
+import uuid
+from array import array
+from contextlib import contextmanager
+from datetime import datetime
+from typing import List, Dict, Any, Optional, Tuple, Iterable, Iterator, Callable
+
+import numpy as np
+
+from app.core.config import settings
+from app.services.address_index import RegionIndex, UNSCOPED
+from app.services.blacklist_snapshot import (
+    BlacklistSnapshot, BlacklistEntry, CharIndex, LayeredBlacklistSnapshot, PhoneDeletionIndex
+)
+from app.services.name_pinyin import PinyinIndex, load_pinyin
+from app.services.text_scanner import BlacklistTextScanner, PHONE_TOKEN, WECHAT_TOKEN
+
+logger = logging.getLogger(__name__)
+
+
+MAGIC = b"BLSNAP01"
+
+# 文件格式版本（结构变化时递增，旧文件不再加载）
+STORE_FORMAT_VERSION = 2
+
+# 数组段对齐字节数
+_ALIGNMENT = 8
+
+# 词条类型编码
+_TOKEN_KINDS = (PHONE_TOKEN, WECHAT_TOKEN)
+
+# 存为 int64 的数字键的最大位数
+_MAX_NUMERIC_KEY_LENGTH = 18
+
+
+# ---------------------------------------------------------------------------
+# 只读视图
+# ---------------------------------------------------------------------------
+
+class MappedStrings:
+    """字符串区视图：第 i 个字符串为 arena[offsets[i]:offsets[i+1]]（UTF-8）"""
+    
+    __slots__ = ("arena", "offsets", "nulls")
+    
+    def __init__(self, arena: memoryview, offsets: memoryview, nulls: Optional[memoryview] = None):
+        self.arena = arena
+        self.offsets = offsets
+        self.nulls = nulls  # 可为空的字符串列：nulls[i] 为 1 表示 None
+    
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+    
+    def __getitem__(self, index: int) -> Optional[str]:
+        if index < 0:
+            index += len(self)
+        if self.nulls is not None and self.nulls[index]:
+            return None
+        return str(self.arena[self.offsets[index]:self.offsets[index + 1]], "utf-8")
+    
+    def __iter__(self) -> Iterator[Optional[str]]:
+        for index in range(len(self)):
+            yield self[index]
+
+
+class MappedCSR:
+    """压缩行视图：第 i 行为 data[offsets[i]:offsets[i+1]]，以元组返回"""
+    
+    __slots__ = ("offsets", "data")
+    
+    def __init__(self, offsets: memoryview, data: memoryview):
+        self.offsets = offsets
+        self.data = data
+    
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+    
+    def __getitem__(self, index: int) -> Tuple[int, ...]:
+        return tuple(self.data[self.offsets[index]:self.offsets[index + 1]])
+    
+    def __iter__(self) -> Iterator[Tuple[int, ...]]:
+        for index in range(len(self)):
+            yield self[index]
+
+
+def _numeric_key(key: Any) -> Optional[int]:
+    """能无歧义地存为 int64 的数字键（不带前导零）转换为整数，否则返回 None"""
+    if not isinstance(key, str) or not key.isdigit() or len(key) > _MAX_NUMERIC_KEY_LENGTH:
+        return None
+    number = int(key)
+    return number if str(number) == key else None
+
+
+class MappedKeys:
+    """
+    定长键数组视图：第 i 个键为 keys[i]
+    
+    数字键存为 int64，其他键存为 UTF-8 定长字节串（numpy 的 S 类型，末尾补零）。
+    """
+    
+    __slots__ = ("keys", "numeric")
+    
+    def __init__(self, keys: np.ndarray):
+        self.keys = keys
+        self.numeric = keys.dtype.kind == "i"
+    
+    def __len__(self) -> int:
+        return len(self.keys)
+    
+    def __getitem__(self, index: int) -> str:
+        key = self.keys[index]
+        return str(int(key)) if self.numeric else key.decode("utf-8")
+    
+    def __iter__(self) -> Iterator[str]:
+        if self.numeric:
+            return map(str, self.keys.tolist())
+        return (key.decode("utf-8") for key in self.keys.tolist())
+    
+    def encode(self, key: Any) -> Any:
+        """查询键转换为数组中的存储形式，不可能存在于数组中时返回 None"""
+        if self.numeric:
+            return _numeric_key(key)
+        if not isinstance(key, str):
+            return None
+        encoded = key.encode("utf-8")
+        if len(encoded) > self.keys.itemsize or b"\0" in encoded:
+            return None
+        return encoded
+
+
+class MappedKeyMap:
+    """
+    键 -> 整数元组 的只读映射
+    
+    键按插入顺序存放在定长数组中，另存一份按键排序的下标（sorter），
+    查询时用 np.searchsorted 二分，键数组和值都不复制到进程内；
+    keys()/items() 按原插入顺序遍历，与构建时的 dict 一致。
+    """
+    
+    __slots__ = ("key_list", "_sorter", "_values")
+    
+    def __init__(self, keys: MappedKeys, sorter: np.ndarray, values: MappedCSR):
+        self.key_list = keys
+        self._sorter = sorter
+        self._values = values
+    
+    def position(self, key: Any) -> int:
+        """键的插入顺序下标，不存在时返回 -1"""
+        encoded = self.key_list.encode(key)
+        if encoded is None:
+            return -1
+        keys = self.key_list.keys
+        sorted_pos = int(np.searchsorted(keys, encoded, sorter=self._sorter))
+        if sorted_pos == len(self._sorter):
+            return -1
+        key_idx = int(self._sorter[sorted_pos])
+        return key_idx if keys[key_idx] == encoded else -1
+    
+    def __len__(self) -> int:
+        return len(self.key_list)
+    
+    def __contains__(self, key: Any) -> bool:
+        return self.position(key) >= 0
+    
+    def __getitem__(self, key: str) -> Tuple[int, ...]:
+        key_idx = self.position(key)
+        if key_idx < 0:
+            raise KeyError(key)
+        return self._values[key_idx]
+    
+    def get(self, key: str, default: Any = None) -> Any:
+        key_idx = self.position(key)
+        return self._values[key_idx] if key_idx >= 0 else default
+    
+    def keys(self) -> Iterator[str]:
+        return iter(self.key_list)
+    
+    def items(self) -> Iterator[Tuple[str, Tuple[int, ...]]]:
+        return zip(self.key_list, self._values)
+    
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.key_list)
+    
+    def to_dict(self) -> Dict[str, Tuple[int, ...]]:
+        """解码为进程内字典（按插入顺序，与构建时的 dict 相同）"""
+        return dict(zip(self.key_list, self._values))
+
+
+class MappedVariants:
+    """
+    删一位变体 -> 号码下标 的只读映射
+    
+    号码等长且只含数字，变体也等长，可以无歧义地转换为整数，
+    按 (变体, 号码下标) 排序存为 int64 数组，查询时用 np.searchsorted 取出一段连续区间。
+    """
+    
+    __slots__ = ("keys", "phone_ids")
+    
+    def __init__(self, keys: np.ndarray, phone_ids: np.ndarray):
+        self.keys = keys
+        self.phone_ids = phone_ids
+    
+    def __len__(self) -> int:
+        return len(self.keys)
+    
+    def get(self, variant: str, default: Any = ()) -> Any:
+        if not variant.isdigit() or len(variant) > _MAX_NUMERIC_KEY_LENGTH:
+            return default
+        key = int(variant)
+        start = int(np.searchsorted(self.keys, key, "left"))
+        end = int(np.searchsorted(self.keys, key, "right"))
+        return tuple(self.phone_ids[start:end].tolist()) if end > start else default
+
+
+class MappedPostings:
+    """字符倒排表：字符 -> [(值下标, 出现次数)]，字符按码点排序"""
+    
+    __slots__ = ("chars", "offsets", "value_ids", "counts")
+    
+    def __init__(self, chars: memoryview, offsets: memoryview, value_ids: memoryview, counts: memoryview):
+        self.chars = chars
+        self.offsets = offsets
+        self.value_ids = value_ids
+        self.counts = counts
+    
+    def __len__(self) -> int:
+        return len(self.chars)
+    
+    def get(self, char: str, default: Any = ()) -> Any:
+        code = ord(char)
+        low, high = 0, len(self.chars)
+        while low < high:
+            middle = (low + high) // 2
+            if self.chars[middle] < code:
+                low = middle + 1
+            else:
+                high = middle
+        if low == len(self.chars) or self.chars[low] != code:
+            return default
+        start, end = self.offsets[low], self.offsets[low + 1]
+        return MappedPostingList(self.value_ids[start:end], self.counts[start:end])
+
+
+class MappedPostingList:
+    """单个字符的倒排列表（与内存版一样可以取长度、按 (值下标, 出现次数) 遍历）"""
+    
+    __slots__ = ("value_ids", "counts")
+    
+    def __init__(self, value_ids: memoryview, counts: memoryview):
+        self.value_ids = value_ids
+        self.counts = counts
+    
+    def __len__(self) -> int:
+        return len(self.value_ids)
+    
+    def __iter__(self) -> Iterator[Tuple[int, int]]:
+        return zip(self.value_ids, self.counts)
+
+
+class MappedKinds:
+    """词条类型视图（存储为编码）"""
+    
+    __slots__ = ("codes",)
+    
+    def __init__(self, codes: memoryview):
+        self.codes = codes
+    
+    def __len__(self) -> int:
+        return len(self.codes)
+    
+    def __getitem__(self, index: int) -> str:
+        return _TOKEN_KINDS[self.codes[index]]
+
+
+class MappedAhoCorasick:
+    """
+    映射到文件的 Aho–Corasick 自动机（与 text_scanner.AhoCorasick 结果一致）
+    
+    每个状态的转移字符按码点排序存放，转移时二分查找。
+    """
+    
+    __slots__ = ("edge_offsets", "edge_chars", "edge_targets", "fail", "outputs", "lengths")
+    
+    def __init__(
+        self,
+        edge_offsets: memoryview,
+        edge_chars: memoryview,
+        edge_targets: memoryview,
+        fail: memoryview,
+        outputs: MappedCSR,
+        lengths: memoryview
+    ):
+        self.edge_offsets = edge_offsets
+        self.edge_chars = edge_chars
+        self.edge_targets = edge_targets
+        self.fail = fail
+        self.outputs = outputs
+        self.lengths = lengths
+    
+    def __len__(self) -> int:
+        return len(self.lengths)
+    
+    def _next(self, state: int, code: int) -> int:
+        """状态的字符转移，没有时返回 -1"""
+        low, high = self.edge_offsets[state], self.edge_offsets[state + 1]
+        while low < high:
+            middle = (low + high) // 2
+            if self.edge_chars[middle] < code:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self.edge_offsets[state + 1] and self.edge_chars[low] == code:
+            return self.edge_targets[low]
+        return -1
+    
+    def iter_matches(self, text: str) -> Iterator[Tuple[int, int]]:
+        """扫描文本，逐个产生 (起始位置, 模式下标)"""
+        fail = self.fail
+        state = 0
+        for position, char in enumerate(text):
+            code = ord(char)
+            next_state = self._next(state, code)
+            while next_state < 0 and state:
+                state = fail[state]
+                next_state = self._next(state, code)
+            state = max(next_state, 0)
+            for pattern_idx in self.outputs[state]:
+                yield position + 1 - self.lengths[pattern_idx], pattern_idx
+
+
+class MappedEntry:
+    """
+    映射的单条黑名单（字段与 BlacklistEntry 相同）
+    
+    匹配结果只用到 id 和拉黑原因，电话、姓名等字段在访问时才从字符串区解码。
+    """
+    
+    __slots__ = ("_entries", "_pos")
+    
+    _fields = BlacklistEntry._fields
+    
+    def __init__(self, entries: "MappedEntries", entry_pos: int):
+        self._entries = entries
+        self._pos = entry_pos
+    
+    @property
+    def id(self) -> int:
+        return self._entries.ids[self._pos]
+    
+    @property
+    def blacklist_reason(self) -> Optional[str]:
+        return self._entries.reasons[self._pos]
+    
+    @property
+    def phones(self) -> Tuple[str, ...]:
+        return self._entries.decode(self._entries.phones, self._entries.phone_values, self._pos)
+    
+    @property
+    def names(self) -> Tuple[str, ...]:
+        return self._entries.decode(self._entries.names, self._entries.name_values, self._pos)
+    
+    @property
+    def addresses(self) -> Tuple[str, ...]:
+        return self._entries.decode(self._entries.addresses, self._entries.address_values, self._pos)
+    
+    @property
+    def wechat_ids(self) -> Tuple[str, ...]:
+        return self._entries.decode(self._entries.wechat_ids, self._entries.wechat_values, self._pos)
+    
+    def to_entry(self) -> BlacklistEntry:
+        """转换为 BlacklistEntry"""
+        return BlacklistEntry(*(getattr(self, field) for field in self._fields))
+    
+    def __eq__(self, other):
+        if isinstance(other, MappedEntry):
+            other = other.to_entry()
+        return self.to_entry() == other
+    
+    def __hash__(self):
+        return hash(self.to_entry())
+    
+    def __repr__(self):
+        return repr(self.to_entry())
+
+
+class MappedEntries:
+    """快照条目视图，按位置取出 MappedEntry"""
+    
+    __slots__ = ("ids", "reasons", "phones", "names", "addresses", "wechat_ids",
+                 "phone_values", "name_values", "address_values", "wechat_values")
+    
+    def __init__(self, ids, reasons, phones, names, addresses, wechat_ids,
+                 phone_values, name_values, address_values, wechat_values):
+        self.ids = ids
+        self.reasons = reasons
+        self.phones = phones
+        self.names = names
+        self.addresses = addresses
+        self.wechat_ids = wechat_ids
+        self.phone_values = phone_values
+        self.name_values = name_values
+        self.address_values = address_values
+        self.wechat_values = wechat_values
+    
+    def __len__(self) -> int:
+        return len(self.ids)
+    
+    def __getitem__(self, entry_pos: int) -> MappedEntry:
+        if entry_pos < 0:
+            entry_pos += len(self)
+        if not 0 <= entry_pos < len(self.ids):
+            raise IndexError(entry_pos)
+        return MappedEntry(self, entry_pos)
+    
+    def __iter__(self) -> Iterator[MappedEntry]:
+        for entry_pos in range(len(self)):
+            yield MappedEntry(self, entry_pos)
+    
+    @staticmethod
+    def decode(rows: MappedCSR, values: MappedStrings, entry_pos: int) -> Tuple[str, ...]:
+        """取出条目某一字段的值"""
+        return tuple(values[idx] for idx in rows[entry_pos])
+
+
+class MappedRegionIndex(RegionIndex):
+    """地区索引视图（区县表、每个值的区县编号都在映射上查询，scope 与 RegionIndex 相同）"""
+    
+    __slots__ = ()
+    
+    def __init__(self, by_district: MappedKeyMap, unscoped: memoryview, value_districts: memoryview):
+        self.parts = range(len(value_districts))  # 只用于 __len__
+        self.by_district = by_district
+        self.unscoped = unscoped
+        self.district_codes = None
+        self.value_districts = value_districts
+    
+    def district_code(self, district: str) -> int:
+        code = self.by_district.position(district)
+        return code if code >= 0 else UNSCOPED - 1
+
+
+class MappedPinyinIndex(PinyinIndex):
+    """拼音索引视图（全拼、首字母两张表和每个值的全拼下标都在映射上查询）"""
+    
+    __slots__ = ("value_full",)
+    
+    def __init__(self, full: MappedKeyMap, initials: MappedKeyMap, value_full: memoryview, initials_min_length: int):
+        super().__init__((), load_pinyin(), initials_min_length)
+        self.full = full
+        self.initials = initials
+        self.value_full = value_full  # 姓名值下标 -> 全拼在 full 中的下标（-1 表示没有）
+    
+    def full_key(self, value_idx: int) -> str:
+        key_idx = self.value_full[value_idx]
+        return self.full.key_list[key_idx] if key_idx >= 0 else ""
+
+
+# ---------------------------------------------------------------------------
+# 写入
+# ---------------------------------------------------------------------------
+
+class _StoreWriter:
+    """收集各数组段并写成快照文件"""
+    
+    def __init__(self):
+        self.sections: Dict[str, Tuple[str, bytes, int]] = {}
+    
+    def add_array(self, name: str, typecode: str, values: Iterable[int]):
+        data = array(typecode, values)
+        self.sections[name] = (typecode, data.tobytes(), len(data))
+    
+    def add_bytes(self, name: str, data: bytes):
+        self.sections[name] = ("B", data, len(data))
+    
+    def add_strings(self, name: str, values: Iterable[Optional[str]], nullable: bool = False):
+        arena = bytearray()
+        offsets = [0]
+        nulls = []
+        for value in values:
+            nulls.append(1 if value is None else 0)
+            arena += (value or "").encode("utf-8")
+            offsets.append(len(arena))
+        self.add_bytes(f"{name}.arena", bytes(arena))
+        self.add_array(f"{name}.offsets", "q", offsets)
+        if nullable:
+            self.add_array(f"{name}.nulls", "B", nulls)
+    
+    def add_csr(self, name: str, rows: Iterable[Iterable[int]]):
+        offsets = [0]
+        data = array("i")
+        for row in rows:
+            data.extend(row)
+            offsets.append(len(data))
+        self.add_array(f"{name}.offsets", "q", offsets)
+        self.sections[f"{name}.data"] = ("i", data.tobytes(), len(data))
+    
+    def add_keys(self, name: str, keys: List[str]):
+        """
+        定长键数组和排序下标
+        
+        键全部是不带前导零的数字（电话号码）时存为 int64，否则存为 UTF-8 定长字节串。
+        """
+        numbers = [_numeric_key(key) for key in keys]
+        if keys and None not in numbers:
+            typecode, data = "q", np.array(numbers, dtype=np.int64)
+        else:
+            encoded = [key.encode("utf-8") for key in keys]
+            if any(b"\0" in key for key in encoded):
+                raise ValueError(f"键中不能含有空字符: {name}")
+            typecode = f"S{max(map(len, encoded), default=0) or 1}"
+            data = np.array(encoded, dtype=typecode)
+        self.sections[name] = (typecode, data.tobytes(), len(data))
+        self.add_array(f"{name}.sorter", "q", np.argsort(data, kind="stable").tolist())
+    
+    def add_key_map(self, name: str, mapping: Dict[str, Iterable[int]]):
+        self.add_keys(f"{name}.keys", list(mapping))
+        self.add_csr(f"{name}.values", mapping.values())
+    
+    def write(self, path: str, metadata: Dict[str, Any]):
+        """先写临时文件再替换，其他进程不会读到不完整的文件"""
+        layout = {}
+        offset = 0
+        for name, (typecode, data, count) in self.sections.items():
+            layout[name] = [offset, typecode, count]
+            offset += len(data) + (-len(data)) % _ALIGNMENT
+        
+        header = json.dumps({**metadata, "sections": layout}, ensure_ascii=False).encode("utf-8")
+        header += b" " * ((-len(header)) % _ALIGNMENT)
+        
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(MAGIC)
+            f.write(len(header).to_bytes(8, "little"))
+            f.write(header)
+            for typecode, data, count in self.sections.values():
+                f.write(data)
+                f.write(b"\0" * ((-len(data)) % _ALIGNMENT))
+        os.replace(temp_path, path)
+
+
+def write_snapshot_store(snapshot: BlacklistSnapshot, path: str, metadata: Optional[Dict[str, Any]] = None):
+    """把内存中构建的快照写成共享存储文件（metadata 为附加写入文件头的信息）"""
+    writer = _StoreWriter()
+    
+    phone_ids = {phone: idx for idx, phone in enumerate(snapshot.phone_index.keys())}
+    wechat_ids = {wechat_id: idx for idx, wechat_id in enumerate(snapshot.wechat_index.keys())}
+    name_ids = {value: idx for idx, value in enumerate(snapshot.name_index.values)}
+    address_ids = {value: idx for idx, value in enumerate(snapshot.address_index.values)}
+    
+    # 条目
+    entries = snapshot.entries
+    writer.add_array("entries.ids", "q", (entry.id for entry in entries))
+    writer.add_strings("entries.reasons", (entry.blacklist_reason for entry in entries), nullable=True)
+    writer.add_csr("entries.phones", ([phone_ids[phone] for phone in entry.phones] for entry in entries))
+    writer.add_csr("entries.names", ([name_ids[value] for value in entry.names] for entry in entries))
+    writer.add_csr("entries.addresses", ([address_ids[value] for value in entry.addresses] for entry in entries))
+    writer.add_csr("entries.wechat_ids", ([wechat_ids[value] for value in entry.wechat_ids] for entry in entries))
+    
+    # 电话、微信号
+    writer.add_key_map("phones", snapshot.phone_index)
+    writer.add_key_map("wechat_ids", snapshot.wechat_index)
+    
+    # 删一位变体（号码不等长时索引不会被使用，不写入变体）
+    deletion_index = snapshot.phone_deletion_index
+    variant_rows = []
+    if deletion_index.length is not None:
+        variant_rows = sorted(
+            (int(variant), phone_idx)
+            for variant, phones in deletion_index.variants.items() if variant.isdigit()
+            for phone_idx in phones
+        )
+    writer.add_array("phone_variants.keys", "q", (key for key, _ in variant_rows))
+    writer.add_array("phone_variants.phone_ids", "i", (phone_idx for _, phone_idx in variant_rows))
+    
+    # 姓名、地址字符索引
+    for name, index in (("names", snapshot.name_index), ("addresses", snapshot.address_index)):
+        writer.add_strings(f"{name}.values", index.values)
+        writer.add_csr(f"{name}.owners", index.owners)
+        writer.add_array(f"{name}.lengths", "i", index.lengths)
+        chars = sorted(index.postings, key=ord)
+        writer.add_array(f"{name}.postings.chars", "i", (ord(char) for char in chars))
+        writer.add_csr(f"{name}.postings.value_ids", ([value_idx for value_idx, _ in index.postings[char]] for char in chars))
+        writer.add_array(
+            f"{name}.postings.counts", "i",
+            (count for char in chars for _, count in index.postings[char])
+        )
+    
+    # 地区索引
+    address_regions = snapshot.address_regions
+    writer.add_key_map("regions", address_regions.by_district)
+    writer.add_array("regions.unscoped", "i", address_regions.unscoped)
+    writer.add_array("regions.value_districts", "i", address_regions.value_districts)
+    
+    # 拼音索引
+    pinyin_index = snapshot.name_pinyin
+    if pinyin_index is not None:
+        writer.add_key_map("pinyin.full", pinyin_index.full)
+        writer.add_key_map("pinyin.initials", pinyin_index.initials)
+        value_full = [-1] * len(snapshot.name_index)
+        for key_idx, value_ids in enumerate(pinyin_index.full.values()):
+            for value_idx in value_ids:
+                value_full[value_idx] = key_idx
+        writer.add_array("pinyin.value_full", "i", value_full)
+    
+    # 自由文本扫描自动机
+    scanner = snapshot.text_scanner
+    if scanner is not None:
+        automaton = scanner.automaton
+        writer.add_strings("scanner.tokens", scanner.tokens)
+        writer.add_array("scanner.kinds", "B", (_TOKEN_KINDS.index(kind) for kind in scanner.kinds))
+        writer.add_csr("scanner.owners", scanner.owners)
+        edges = [sorted(transitions.items(), key=lambda item: ord(item[0])) for transitions in automaton.goto]
+        writer.add_csr("scanner.edges", ([ord(char) for char, _ in state_edges] for state_edges in edges))
+        writer.add_array("scanner.targets", "i", (target for state_edges in edges for _, target in state_edges))
+        writer.add_array("scanner.fail", "i", automaton.fail)
+        writer.add_csr("scanner.outputs", automaton.outputs)
+        writer.add_array("scanner.lengths", "i", automaton.lengths)
+    
+    writer.write(path, {
+        "format": STORE_FORMAT_VERSION,
+        "byteorder": sys.byteorder,
+        "version": snapshot.version,
+        "history_id": snapshot.history_id,
+        "built_at": snapshot.built_at.isoformat(),
+        "phone_length": deletion_index.length,
+        "pinyin_initials_min_length": pinyin_index.initials_min_length if pinyin_index is not None else None,
+        "address_lsh": snapshot.address_lsh is not None,
+        **(metadata or {})
+    })
+
+
+# ---------------------------------------------------------------------------
+# 读取
+# ---------------------------------------------------------------------------
+
+class SnapshotStore:
+    """只读映射的快照文件"""
+    
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._buffer = memoryview(self._mmap)
+        
+        if bytes(self._buffer[:len(MAGIC)]) != MAGIC:
+            raise ValueError(f"不是黑名单快照文件: {path}")
+        header_length = int.from_bytes(self._buffer[8:16], "little")
+        self.metadata: Dict[str, Any] = json.loads(bytes(self._buffer[16:16 + header_length]))
+        if self.metadata.get("format") != STORE_FORMAT_VERSION or self.metadata.get("byteorder") != sys.byteorder:
+            raise ValueError(f"快照文件格式不兼容: {path}")
+        self._data_start = 16 + header_length
+    
+    @property
+    def version(self) -> str:
+        return self.metadata["version"]
+    
+    def has(self, name: str) -> bool:
+        return name in self.metadata["sections"]
+    
+    def array(self, name: str) -> memoryview:
+        """数组段的零拷贝视图"""
+        offset, typecode, count = self.metadata["sections"][name]
+        start = self._data_start + offset
+        view = self._buffer[start:start + count * array(typecode).itemsize]
+        return view if typecode == "B" else view.cast(typecode)
+    
+    def numpy(self, name: str) -> np.ndarray:
+        """数组段的零拷贝 numpy 视图（只读）"""
+        offset, typecode, count = self.metadata["sections"][name]
+        return np.frombuffer(self._mmap, dtype=np.dtype(typecode), count=count, offset=self._data_start + offset)
+    
+    def strings(self, name: str) -> MappedStrings:
+        nulls = self.array(f"{name}.nulls") if self.has(f"{name}.nulls") else None
+        return MappedStrings(self.array(f"{name}.arena"), self.array(f"{name}.offsets"), nulls)
+    
+    def csr(self, name: str) -> MappedCSR:
+        return MappedCSR(self.array(f"{name}.offsets"), self.array(f"{name}.data"))
+    
+    def key_map(self, name: str) -> MappedKeyMap:
+        return MappedKeyMap(
+            MappedKeys(self.numpy(f"{name}.keys")), self.numpy(f"{name}.keys.sorter"), self.csr(f"{name}.values")
+        )
+
+
+def _char_index(store: SnapshotStore, name: str) -> CharIndex:
+    """在映射的数组上组装字符索引（查询逻辑与内存版相同）"""
+    index = CharIndex.__new__(CharIndex)
+    postings_ids = store.csr(f"{name}.postings.value_ids")
+    index.values = store.strings(f"{name}.values")
+    index.owners = store.csr(f"{name}.owners")
+    index.lengths = store.array(f"{name}.lengths")
+    index.postings = MappedPostings(
+        store.array(f"{name}.postings.chars"), postings_ids.offsets, postings_ids.data,
+        store.array(f"{name}.postings.counts")
+    )
+    return index
+
+
+def open_snapshot_store(path: str) -> BlacklistSnapshot:
+    """以只读映射方式打开快照文件"""
+    store = SnapshotStore(path)
+    metadata = store.metadata
+    
+    phone_index = store.key_map("phones")
+    wechat_index = store.key_map("wechat_ids")
+    name_index = _char_index(store, "names")
+    address_index = _char_index(store, "addresses")
+    
+    deletion_index = PhoneDeletionIndex.__new__(PhoneDeletionIndex)
+    deletion_index.phones = phone_index.key_list
+    deletion_index.length = metadata["phone_length"]
+    deletion_index.variants = MappedVariants(store.numpy("phone_variants.keys"), store.numpy("phone_variants.phone_ids"))
+    
+    entries = MappedEntries(
+        store.array("entries.ids"),
+        store.strings("entries.reasons"),
+        store.csr("entries.phones"),
+        store.csr("entries.names"),
+        store.csr("entries.addresses"),
+        store.csr("entries.wechat_ids"),
+        phone_index.key_list,
+        name_index.values,
+        address_index.values,
+        wechat_index.key_list
+    )
+    
+    address_regions = MappedRegionIndex(
+        store.key_map("regions"), store.array("regions.unscoped"), store.array("regions.value_districts")
+    )
+    
+    name_pinyin = None
+    if store.has("pinyin.value_full") and load_pinyin() is not None:
+        name_pinyin = MappedPinyinIndex(
+            store.key_map("pinyin.full"), store.key_map("pinyin.initials"), store.array("pinyin.value_full"),
+            metadata["pinyin_initials_min_length"]
+        )
+    
+    text_scanner = None
+    if store.has("scanner.kinds"):
+        edges = store.csr("scanner.edges")
+        text_scanner = BlacklistTextScanner.__new__(BlacklistTextScanner)
+        text_scanner.tokens = store.strings("scanner.tokens")
+        text_scanner.kinds = MappedKinds(store.array("scanner.kinds"))
+        text_scanner.owners = store.csr("scanner.owners")
+        text_scanner.automaton = MappedAhoCorasick(
+            edges.offsets, edges.data, store.array("scanner.targets"), store.array("scanner.fail"),
+            store.csr("scanner.outputs"), store.array("scanner.lengths")
+        )
+    
+    # 地址LSH索引本身已按地址集合保存在磁盘上，这里按需加载（不在进程间共享）
+    address_lsh = None
+    if metadata["address_lsh"]:
+        from app.services.address_lsh import get_address_lsh
+        address_lsh = get_address_lsh(tuple(address_index.values))
+    
+    return BlacklistSnapshot(
+        entries=entries,
+        phone_index=phone_index,
+        name_index=name_index,
+        address_index=address_index,
+        version=metadata["version"],
+        history_id=metadata["history_id"],
+        built_at=datetime.fromisoformat(metadata["built_at"]),
+        phone_deletion_index=deletion_index,
+        address_regions=address_regions,
+        address_lsh=address_lsh,
+        name_pinyin=name_pinyin,
+        wechat_index=wechat_index,
+        text_scanner=text_scanner,
+        store=store
+    )
+
+
+# ---------------------------------------------------------------------------
+# 进程间共享
+# ---------------------------------------------------------------------------
+
+# 同一进程内构建快照文件的线程锁
+_build_lock = threading.Lock()
+
+# 本进程正在使用的快照文件及引用计数（进程池的工作进程会按路径重新打开，使用期间不能删除）
+_pinned_stores: Dict[str, int] = {}
+_pinned_lock = threading.Lock()
+
+
+def snapshot_store_path(version: str, history_id: int) -> str:
+    """快照文件路径（版本号中含有冒号等字符，文件名使用摘要）"""
+    digest = hashlib.sha1(f"{STORE_FORMAT_VERSION}:{version}".encode("utf-8")).hexdigest()[:16]
+    return os.path.join(settings.SNAPSHOT_STORE_PATH, f"blacklist_{history_id}_{digest}.snap")
+
+
+@contextmanager
+def _file_lock(path: str):
+    """跨进程文件锁（没有 fcntl 的平台上只用进程内的锁）"""
+    with _build_lock:
+        try:
+            import fcntl
+        except ImportError:
+            yield
+            return
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _list_stores() -> List[str]:
+    """已保存的快照文件（新的在前）"""
+    directory = settings.SNAPSHOT_STORE_PATH
+    if not os.path.isdir(directory):
+        return []
+    paths = [
+        os.path.join(directory, name) for name in os.listdir(directory)
+        if name.startswith("blacklist_") and name.endswith(".snap")
+    ]
+    paths.sort(key=os.path.getmtime, reverse=True)
+    return paths
+
+
+@contextmanager
+def pinned_stores(paths: Iterable[str]):
+    """使用期间保留这些快照文件，_remove_old_stores 不会删除"""
+    paths = tuple(paths)
+    with _pinned_lock:
+        for path in paths:
+            _pinned_stores[path] = _pinned_stores.get(path, 0) + 1
+    try:
+        yield
+    finally:
+        with _pinned_lock:
+            for path in paths:
+                _pinned_stores[path] -= 1
+                if not _pinned_stores[path]:
+                    del _pinned_stores[path]
+
+
+def _remove_old_stores(keep: str):
+    """
+    删除旧版本的快照文件
+    
+    保留最近的两个和本进程正在使用的文件；已经映射了旧文件的进程仍可读到内容，
+    但进程池的工作进程要按路径重新打开，所以被 pinned_stores 引用的文件不能删除。
+    """
+    with _pinned_lock:
+        pinned = set(_pinned_stores)
+    for path in _list_stores()[2:]:
+        if path == keep or path in pinned:
+            continue
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def _save_store(path: str, build: Callable[[], BlacklistSnapshot]):
+    """文件不存在时由第一个拿到文件锁的进程构建并写入，其他进程等待后直接使用"""
+    if os.path.exists(path):
+        return
+    with _file_lock(os.path.join(settings.SNAPSHOT_STORE_PATH, ".build.lock")):
+        if not os.path.exists(path):
+            snapshot = build()
+            write_snapshot_store(snapshot, path)
+            logger.info(f"黑名单快照文件已写入: {path}, 记录数={len(snapshot)}")
+            _remove_old_stores(path)
+
+
+def load_shared_snapshot(
+    version: str,
+    history_id: int,
+    build: Callable[[], BlacklistSnapshot]
+) -> BlacklistSnapshot:
+    """打开与版本对应的共享快照文件，文件不存在时先构建并写入"""
+    path = snapshot_store_path(version, history_id)
+    _save_store(path, build)
+    return open_snapshot_store(path)
+
+
+def save_snapshot_store(snapshot: BlacklistSnapshot):
+    """把进程内构建的快照保存为文件，供下次启动预加载（写入失败只记录日志）"""
+    if not snapshot.version:
+        return
+    try:
+        _save_store(snapshot_store_path(snapshot.version, snapshot.history_id), lambda: snapshot)
+    except OSError as e:
+        logger.warning(f"保存黑名单快照文件失败: {e}")
+
+
+def decode_snapshot_store(path: str) -> BlacklistSnapshot:
+    """把快照文件解码为进程内快照（按文件中的条目重建索引，不访问黑名单表）"""
+    mapped = open_snapshot_store(path)
+    entries = tuple(entry.to_entry() for entry in mapped.entries)
+    return BlacklistSnapshot.from_entries(
+        entries, mapped.version, mapped.history_id, mapped.built_at, use_address_lsh=mapped.address_lsh is not None
+    )
+
+
+def temp_store_path(kind: str) -> str:
+    """本进程临时快照文件的路径（不以 blacklist_ 开头，不会被当作已保存的快照预加载或清理）"""
+    return os.path.join(settings.SNAPSHOT_STORE_PATH, f"{kind}_{os.getpid()}_{uuid.uuid4().hex[:12]}.snap")
+
+
+def remove_stores(paths: Iterable[str]) -> List[str]:
+    """删除本进程写入的临时快照文件，返回正在使用（被 pinned_stores 引用）而保留的文件"""
+    with _pinned_lock:
+        pinned = set(_pinned_stores)
+    kept = []
+    for path in paths:
+        if path in pinned:
+            kept.append(path)
+            continue
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+    return kept
+
+
+def shared_store_path(snapshot: BlacklistSnapshot) -> str:
+    """
+    快照对应的快照文件（供其他进程按路径打开）
+    
+    映射的快照就是其文件；进程内构建的快照按版本保存（已保存时直接使用），没有版本号时返回空字符串。
+    """
+    if snapshot.store is not None:
+        return snapshot.store.path
+    if not snapshot.version:
+        return ""
+    path = snapshot_store_path(snapshot.version, snapshot.history_id)
+    _save_store(path, lambda: snapshot)
+    return path
+
+
+def write_layer_store(snapshot: LayeredBlacklistSnapshot, path: str):
+    """把增量快照的增量部分写成单独的文件，文件头记录组合增量快照需要的信息"""
+    write_snapshot_store(snapshot.delta, path, {"layer": {
+        "version": snapshot.version,
+        "history_id": snapshot.history_id,
+        "built_at": snapshot.built_at.isoformat(),
+        "changed_ids": sorted(snapshot.changed_ids)
+    }})
+
+
+def open_layer_store(path: str, base: BlacklistSnapshot, mapped: bool = True) -> LayeredBlacklistSnapshot:
+    """打开增量文件并与基础快照组合为增量快照，mapped 为 False 时增量部分解码为进程内快照"""
+    delta = open_snapshot_store(path)
+    layer = delta.store.metadata["layer"]
+    if not mapped:
+        delta = decode_snapshot_store(path)
+    return LayeredBlacklistSnapshot(
+        base, delta, frozenset(layer["changed_ids"]), layer["version"], layer["history_id"],
+        datetime.fromisoformat(layer["built_at"])
+    )
+
+
+def open_saved_snapshot(version: str, history_id: int, mapped: bool = True) -> Optional[BlacklistSnapshot]:
+    """
+    打开已保存的快照文件（不访问黑名单表）
+    
+    优先打开与版本对应的文件，没有时打开最近保存的文件（版本可能已过期，由调用方判断），
+    都没有或无法打开时返回 None。mapped 为 False 时解码为进程内快照。
+    """
+    open_store = open_snapshot_store if mapped else decode_snapshot_store
+    path = snapshot_store_path(version, history_id)
+    paths = _list_stores()
+    if path in paths:
+        paths.remove(path)
+        paths.insert(0, path)
+    for path in paths:
+        try:
+            return open_store(path)
+        except (OSError, ValueError) as e:
+            logger.warning(f"跳过无法打开的快照文件 {path}: {e}")
+    return None
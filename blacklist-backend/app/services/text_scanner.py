@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+订单自由文本扫描
+
+订单的团员备注、团长备注、详细地址中经常夹带备用电话或微信号。
+构建快照时把所有黑名单电话和微信号编译为一个 Aho–Corasick 自动机，
+每个订单的自由文本只需线性扫描一遍，就能找出其中出现的全部黑名单号码，
+扫描代价与黑名单规模无关。
+"""
+
+from collections import deque
+from itertools import groupby
+from typing import List, Dict, Set, Tuple, Iterable, Iterator
+
+
+# 词条类型
+PHONE_TOKEN = "phone"
+WECHAT_TOKEN = "wechat_id"
+
+# 微信号可包含的字符（用于判断命中是否是完整的微信号）
+_WECHAT_CHARS = frozenset("abcdefghijklmnopqrstuvwxyz0123456789_-")
+
+
+class AhoCorasick:
+    """
+    Aho–Corasick 多模式匹配自动机
+    
+    goto[state] 为状态的字符转移，fail[state] 为失败转移，
+    outputs[state] 为到达该状态时命中的模式下标（已合并失败链上的输出）。
+    """
+    
+    __slots__ = ("goto", "fail", "outputs", "lengths")
+    
+    def __init__(self, patterns: Iterable[str]):
+        self.goto: List[Dict[str, int]] = [{}]
+        self.outputs: List[Tuple[int, ...]] = [()]
+        self.lengths: List[int] = []
+        
+        # 1. 构建字典树
+        for pattern_idx, pattern in enumerate(patterns):
+            self.lengths.append(len(pattern))
+            state = 0
+            for char in pattern:
+                next_state = self.goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self.goto)
+                    self.goto[state][char] = next_state
+                    self.goto.append({})
+                    self.outputs.append(())
+                state = next_state
+            self.outputs[state] += (pattern_idx,)
+        
+        # 2. 按层计算失败转移
+        self.fail: List[int] = [0] * len(self.goto)
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fail_state = self.fail[state]
+                while fail_state and char not in self.goto[fail_state]:
+                    fail_state = self.fail[fail_state]
+                self.fail[next_state] = self.goto[fail_state].get(char, 0)
+                self.outputs[next_state] += self.outputs[self.fail[next_state]]
+    
+    def __len__(self) -> int:
+        return len(self.lengths)
+    
+    def iter_matches(self, text: str) -> Iterator[Tuple[int, int]]:
+        """扫描文本，逐个产生 (起始位置, 模式下标)"""
+        goto = self.goto
+        fail = self.fail
+        outputs = self.outputs
+        state = 0
+        for position, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for pattern_idx in outputs[state]:
+                yield position + 1 - self.lengths[pattern_idx], pattern_idx
+
+
+class BlacklistTextScanner:
+    """
+    黑名单电话/微信号的自由文本扫描器
+    
+    命中需要是完整的号码：电话前后不能紧接数字（避免命中更长的数字串），
+    微信号前后不能紧接字母、数字、下划线或减号。
+    """
+    
+    __slots__ = ("tokens", "kinds", "owners", "automaton")
+    
+    def __init__(self, phone_index: Dict[str, Tuple[int, ...]], wechat_index: Dict[str, Tuple[int, ...]]):
+        tokens: List[str] = []
+        kinds: List[str] = []
+        owners: List[Tuple[int, ...]] = []
+        for kind, index in ((PHONE_TOKEN, phone_index), (WECHAT_TOKEN, wechat_index)):
+            for token, entry_positions in index.items():
+                tokens.append(token)
+                kinds.append(kind)
+                owners.append(entry_positions)
+        self.tokens: Tuple[str, ...] = tuple(tokens)
+        self.kinds: Tuple[str, ...] = tuple(kinds)
+        self.owners: Tuple[Tuple[int, ...], ...] = tuple(owners)
+        self.automaton = AhoCorasick(self.tokens)
+    
+    def __len__(self) -> int:
+        return len(self.tokens)
+    
+    def _is_whole_token(self, text: str, start: int, end: int, kind: str) -> bool:
+        """命中两侧是否为号码边界"""
+        before = text[start - 1] if start > 0 else ""
+        after = text[end] if end < len(text) else ""
+        if kind == PHONE_TOKEN:
+            return not before.isdigit() and not after.isdigit()
+        return before not in _WECHAT_CHARS and after not in _WECHAT_CHARS
+    
+    def scan(self, text: str) -> List[int]:
+        """扫描文本，返回命中的词条下标（按出现顺序去重）"""
+        if not text or not self.tokens:
+            return []
+        
+        # 微信号按小写登记，电话不受大小写影响
+        text = text.lower()
+        token_ids: List[int] = []
+        for start, token_idx in self.automaton.iter_matches(text):
+            if token_idx in token_ids:
+                continue
+            end = start + len(self.tokens[token_idx])
+            if self._is_whole_token(text, start, end, self.kinds[token_idx]):
+                token_ids.append(token_idx)
+        return token_ids
+
+
+def whole_tokens(text: str) -> Set[str]:
+    """
+    文本中所有最长的数字串和最长的微信号字符串（小写）
+    
+    按 BlacklistTextScanner 的边界规则，黑名单电话在文本中命中当且仅当它等于某个最长数字串，
+    微信号命中当且仅当它等于某个最长的微信号字符串，可用于按词条反查文本。
+    """
+    tokens: Set[str] = set()
+    if not text:
+        return tokens
+    text = text.lower()
+    for is_digit, chars in groupby(text, key=str.isdigit):
+        if is_digit:
+            tokens.add("".join(chars))
+    for is_wechat_char, chars in groupby(text, key=_WECHAT_CHARS.__contains__):
+        if is_wechat_char:
+            tokens.add("".join(chars))
+    return tokens
@@ -0,0 +1,5 @@
+-- 订单记录检测时使用的黑名单快照版本（分组复检只重新匹配受黑名单变更影响的订单）
+-- 创建时间: 2026-10-18
+
+ALTER TABLE orders
+ADD COLUMN blacklist_checked_version VARCHAR(100) NULL COMMENT '检测时使用的黑名单快照版本' AFTER blacklist_match_details;
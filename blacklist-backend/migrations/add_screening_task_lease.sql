@@ -0,0 +1,6 @@
+-- 筛查任务执行租约（多个进程同时继续中断的任务时，只有取得租约的执行器执行）
+-- 创建时间: 2026-10-18
+
+ALTER TABLE screening_tasks
+ADD COLUMN runner_id VARCHAR(100) NULL COMMENT '当前执行器标识' AFTER completed_at,
+ADD COLUMN lease_expires_at DATETIME NULL COMMENT '执行租约到期时间' AFTER runner_id;
@@ -0,0 +1,5 @@
+-- 筛查结果增加文本匹配类型（备注、地址中夹带的黑名单电话/微信号）
+-- 创建时间: 2026-10-18
+
+ALTER TABLE screening_results
+MODIFY COLUMN match_type ENUM('phone', 'wechat_id', 'text', 'name', 'ktt_name', 'address') NOT NULL COMMENT '匹配类型';
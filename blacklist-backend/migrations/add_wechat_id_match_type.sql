@@ -0,0 +1,5 @@
+-- 筛查结果增加微信号匹配类型
+-- 创建时间: 2026-10-18
+
+ALTER TABLE screening_results
+MODIFY COLUMN match_type ENUM('phone', 'wechat_id', 'name', 'ktt_name', 'address') NOT NULL COMMENT '匹配类型';
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试公共夹具
+
+数据库测试使用内存 SQLite（只建黑名单、分组、订单、筛查任务相关的表），
+快照文件写到临时目录；匹配器的开关在用例结束后恢复。
+未安装 pypinyin 时用只认识测试数据用字的拼音表代替，拼音相关用例照常运行。
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from sqlalchemy.schema import CreateTable
+
+from app.core.config import settings
+from app.core.database import Base
+from app.models.blacklist import Blacklist, BlacklistHistory
+from app.models.group import Group
+from app.models.order import Order
+from app.models.screening import ScreeningTask, ScreeningResult
+from app.services import name_pinyin, snapshot_store
+from app.services.blacklist_matcher import blacklist_matcher
+from tests.factories import SURNAMES, GIVEN_NAMES
+
+
+# 测试数据用到的汉字的拼音（factories 的姓、名用字，拼音用例的姓名也只用这些字）
+STUB_PINYIN = dict(zip(
+    SURNAMES + GIVEN_NAMES,
+    "zhang zhang wang wang li li zhao liu chen cheng yang huang zhou wu xu sun ma zhu hu guo he gao lin luo "
+    "xiao xiao ming min hua li fang wei qiang jun hong hong mei mei jian guo".split()
+))
+
+
+class StubStyle:
+    """对应 pypinyin.Style（拼音键只用到首字母风格）"""
+    FIRST_LETTER = "first_letter"
+
+
+def stub_lazy_pinyin(name, style=None):
+    """与 pypinyin.lazy_pinyin 相同的分段方式：表中的每个字一段，连续的其他字符合为一段"""
+    parts = []
+    other = ""
+    for char in name:
+        if char in STUB_PINYIN:
+            if other:
+                parts.append(other)
+                other = ""
+            parts.append(STUB_PINYIN[char][0] if style == StubStyle.FIRST_LETTER else STUB_PINYIN[char])
+        else:
+            other += char
+    if other:
+        parts.append(other)
+    return parts
+
+
+@pytest.fixture(scope="session", autouse=True)
+def pinyin_stub():
+    """未安装 pypinyin 时换成拼音表，返回是否使用了拼音表"""
+    if name_pinyin.load_pinyin() is not None:
+        yield False
+        return
+    
+    converter = (stub_lazy_pinyin, StubStyle)
+    with pytest.MonkeyPatch.context() as patch:
+        # snapshot_store 按名字导入了 load_pinyin，两处都要替换
+        for module in (name_pinyin, snapshot_store):
+            patch.setattr(module, "load_pinyin", lambda: converter)
+        name_pinyin.pinyin_keys.cache_clear()
+        yield True
+    name_pinyin.pinyin_keys.cache_clear()
+
+
+@pytest.fixture
+def session_factory():
+    """内存 SQLite 会话工厂（所有会话共用同一个连接）"""
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(
+        engine, tables=[Blacklist.__table__, BlacklistHistory.__table__, Group.__table__, Order.__table__]
+    )
+    # 筛查表的索引名与黑名单表重复（SQLite 的索引名全库唯一），只建表不建索引
+    with engine.begin() as connection:
+        for table in (ScreeningTask.__table__, ScreeningResult.__table__):
+            connection.execute(CreateTable(table))
+    yield sessionmaker(bind=engine)
+    engine.dispose()
+
+
+@pytest.fixture
+def db(session_factory):
+    session = session_factory()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def clock():
+    """递增的修改时间（SQLite 的 now() 只精确到秒，测试中显式设置 updated_at）"""
+    state = {"now": datetime(2024, 1, 1)}
+    
+    def tick() -> datetime:
+        state["now"] += timedelta(seconds=1)
+        return state["now"]
+    return tick
+
+
+@pytest.fixture(autouse=True)
+def snapshot_store_dir(tmp_path, monkeypatch):
+    """快照文件写到临时目录（快照缓存重建后会保存文件，所有用例都启用）"""
+    monkeypatch.setattr(settings, "SNAPSHOT_STORE_PATH", str(tmp_path / "snapshot"))
+    return tmp_path / "snapshot"
+
+
+@pytest.fixture
+def matcher_options():
+    """临时修改匹配器开关，用例结束后恢复"""
+    saved = {
+        "address_region_filter": blacklist_matcher.address_region_filter,
+        "pinyin_name_match": blacklist_matcher.pinyin_name_match
+    }
+    
+    def apply(**options):
+        for name, value in options.items():
+            setattr(blacklist_matcher, name, value)
+    yield apply
+    apply(**saved)
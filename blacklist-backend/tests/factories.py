@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试数据生成
+
+按随机种子生成黑名单和订单（带与 Blacklist / Order 同名的字段），
+订单多数从某条黑名单派生：原号码、改一位的号码、同音字姓名、截断的地址、备注里的微信号等，
+保证各类匹配和不匹配的情况都有覆盖。
+"""
+
+import random
+from types import SimpleNamespace
+from typing import List, Tuple
+
+SURNAMES = "张章王汪李黎赵刘陈程杨黄周吴徐孙马朱胡郭何高林罗"
+GIVEN_NAMES = "小晓明敏华丽芳伟强军红虹梅美建国"
+REGIONS = [
+    "四川省成都市武侯区", "四川省成都市锦江区", "广东省深圳市南山区", "北京市朝阳区",
+    "浙江省杭州市西湖区", "上海市浦东新区", "山东省青岛市市南区", ""
+]
+STREETS = ["人民南路", "天府大道", "科技园路", "建国路", "文三路", "世纪大道", "仙居路"]
+
+BLACKLIST_FIELDS = (
+    "ktt_name", "wechat_name", "wechat_id", "order_name_phone", "phone_numbers",
+    "order_address1", "order_address2", "blacklist_reason"
+)
+ORDER_FIELDS = ("contact_phone", "orderer", "consignee", "detailed_address", "member_remarks", "group_leader_remarks")
+
+
+def random_phone(rng: random.Random) -> str:
+    return "1" + rng.choice("3456789") + "".join(rng.choice("0123456789") for _ in range(9))
+
+
+def mutate_phone(rng: random.Random, phone: str) -> str:
+    """改动号码中的一位"""
+    position = rng.randrange(1, len(phone))
+    return phone[:position] + rng.choice("0123456789") + phone[position + 1:]
+
+
+def random_name(rng: random.Random) -> str:
+    return rng.choice(SURNAMES) + "".join(rng.choice(GIVEN_NAMES) for _ in range(rng.randint(1, 2)))
+
+
+def random_address(rng: random.Random) -> str:
+    return (
+        rng.choice(REGIONS) + rng.choice(STREETS) + str(rng.randint(1, 300)) + "号"
+        + rng.choice(GIVEN_NAMES) + rng.choice(GIVEN_NAMES) + "小区" + str(rng.randint(1, 20)) + "栋"
+    )
+
+
+def make_blacklist(seed: int, count: int, start_id: int = 1) -> List[SimpleNamespace]:
+    """生成黑名单（电话字段包含列表、字符串、空值和非法值等各种存储形式）"""
+    rng = random.Random(seed)
+    items = []
+    for i in range(count):
+        phones = [random_phone(rng) for _ in range(rng.randint(0, 2))]
+        items.append(SimpleNamespace(
+            id=start_id + i,
+            phone_numbers=rng.choice([phones, phones[:1], " / ".join(phones), None, [], [123]]),
+            ktt_name=rng.choice([random_name(rng), None, "", "@@"]),
+            wechat_name=rng.choice([random_name(rng), None, random_name(rng) + "abc", "Tom Lee"]),
+            wechat_id=rng.choice([None, "wx_" + str(rng.randint(10000, 99999)), "abc" + str(rng.randint(100000, 999999))]),
+            order_name_phone=rng.choice([None, random_name(rng) + (phones[0] if phones else ""), random_name(rng)]),
+            order_address1=rng.choice([random_address(rng), None]),
+            order_address2=rng.choice([random_address(rng), None, ""]),
+            blacklist_reason=f"原因{i}",
+            is_active=True
+        ))
+    return items
+
+
+def homophone(rng: random.Random, name: str) -> str:
+    """把姓名中的字换成同音或近音字（张->章、王->汪、小->晓 等）"""
+    pairs = {"张": "章", "章": "张", "王": "汪", "汪": "王", "李": "黎", "黎": "李", "小": "晓", "晓": "小", "红": "虹", "虹": "红"}
+    return "".join(pairs.get(char, char) if rng.random() < 0.7 else char for char in name)
+
+
+def make_orders(seed: int, blacklist: List[SimpleNamespace], count: int, start_id: int = 1) -> List[SimpleNamespace]:
+    """生成订单，大部分字段取自随机一条黑名单的原值或变体"""
+    rng = random.Random(seed)
+    orders = []
+    for i in range(count):
+        source = rng.choice(blacklist)
+        source_phones = source.phone_numbers if isinstance(source.phone_numbers, list) else []
+        source_phone = next((phone for phone in source_phones if isinstance(phone, str)), None) or random_phone(rng)
+        source_name = source.ktt_name or source.wechat_name or random_name(rng)
+        orderer = rng.choice([source_name, homophone(rng, source_name), random_name(rng), None])
+        orders.append(SimpleNamespace(
+            id=start_id + i,
+            contact_phone=rng.choice([
+                source_phone, mutate_phone(rng, source_phone), random_phone(rng), None,
+                "tel:" + source_phone + ",备用" + random_phone(rng)
+            ]),
+            orderer=orderer,
+            consignee=rng.choice([orderer, homophone(rng, source_name), random_name(rng)]),
+            detailed_address=rng.choice([
+                source.order_address1, random_address(rng), None, (source.order_address1 or "")[:-2]
+            ]),
+            member_remarks=rng.choice([None, "备用电话" + source_phone, "微信 " + str(source.wechat_id), "尽快发货"]),
+            group_leader_remarks=rng.choice([None, "", "老客户"]),
+            group_tour_number=str(i)
+        ))
+    return orders
+
+
+def make_dataset(seed: int, blacklist_count: int, order_count: int) -> Tuple[List[SimpleNamespace], List[SimpleNamespace]]:
+    """生成一组黑名单和订单"""
+    blacklist = make_blacklist(seed, blacklist_count)
+    return blacklist, make_orders(seed + 1000, blacklist, order_count)
+
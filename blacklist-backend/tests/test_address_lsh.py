@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+地址LSH索引
+
+小数据集上LSH候选包含所有达到阈值的黑名单地址（匹配结果与不用LSH时相同）；
+地址集合变化后旧的索引文件只保留最近使用的两个。
+"""
+
+import os
+
+import pytest
+
+from app.core.config import settings
+from app.services import address_lsh
+from app.services.address_lsh import get_address_lsh
+from app.services.blacklist_matcher import blacklist_matcher
+from app.services.blacklist_snapshot import BlacklistSnapshot
+from tests.factories import make_dataset
+
+
+@pytest.fixture
+def lsh_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "ADDRESS_LSH_PATH", str(tmp_path / "index"))
+    return tmp_path / "index"
+
+
+@pytest.mark.parametrize("seed", [61, 62])
+def test_lsh_candidates_cover_threshold_matches(lsh_dir, seed, matcher_options):
+    matcher_options(address_region_filter=False)
+    blacklist, orders = make_dataset(seed, 200, 400)
+    exact = BlacklistSnapshot.build(blacklist, use_address_lsh=False)
+    snapshot = BlacklistSnapshot.build(blacklist, use_address_lsh=True)
+    values = snapshot.address_index.values
+    
+    checked = 0
+    for order in orders:
+        address = blacklist_matcher.normalize_name(order.detailed_address)
+        if not address:
+            continue
+        candidates = set(snapshot.address_lsh.query(address))
+        for value_idx in exact.address_index.candidates(address, blacklist_matcher.address_similarity_threshold):
+            matched, _, _ = blacklist_matcher.match_normalized(
+                address, [values[value_idx]], blacklist_matcher.address_similarity_threshold, "地址匹配"
+            )
+            if matched:
+                checked += 1
+                assert value_idx in candidates
+        assert blacklist_matcher.lookup_address(address, snapshot) == blacklist_matcher.lookup_address(address, exact)
+    assert checked
+
+
+def addresses(count):
+    return tuple(f"四川省成都市武侯区人民南路{i}号" for i in range(count))
+
+
+def test_old_index_files_are_removed(lsh_dir):
+    def index_file(count):
+        return address_lsh.index_path(
+            addresses(count), settings.ADDRESS_LSH_BANDS, settings.ADDRESS_LSH_ROWS, settings.ADDRESS_LSH_SHINGLE_SIZE
+        )
+    
+    # 按修改时间清理，显式拉开各文件的时间
+    for count in (1, 2):
+        get_address_lsh(addresses(count))
+        os.utime(index_file(count), (count, count))
+    assert sorted(os.listdir(lsh_dir)) == sorted(os.path.basename(index_file(count)) for count in (1, 2))
+    
+    # 重新加载第1个索引后它成为最近使用的，保存第3个时删除的是第2个
+    get_address_lsh(addresses(1))
+    assert os.path.getmtime(index_file(1)) > 2
+    get_address_lsh(addresses(3))
+    
+    assert sorted(os.listdir(lsh_dir)) == sorted(os.path.basename(index_file(count)) for count in (1, 3))
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+批量检测的一致性
+
+check_orders_bulk（索引、指纹去重）与逐个订单的 check_order_blacklist、
+逐条黑名单比对的 match_order_with_blacklist 以及最初的逐项比对算法结果相同。
+"""
+
+import copy
+from types import SimpleNamespace
+
+import pytest
+
+from app.services.blacklist_matcher import blacklist_matcher
+from app.services.blacklist_snapshot import BlacklistSnapshot
+from tests.factories import make_dataset
+
+MATCHER_OPTIONS = [
+    {"address_region_filter": True, "pinyin_name_match": True},
+    {"address_region_filter": False, "pinyin_name_match": False}
+]
+
+
+def pairwise_result(order, blacklist):
+    """逐条黑名单调用 match_order_with_blacklist 汇总的结果（不使用任何索引）"""
+    matches = []
+    for blacklist_item in blacklist:
+        match_result = blacklist_matcher.match_order_with_blacklist(order, blacklist_item)
+        if match_result["is_match"]:
+            matches.append(match_result)
+    return blacklist_matcher.summarize_matches(matches)
+
+
+def baseline_result(order, blacklist):
+    """最初的逐项比对算法：电话 > 姓名 > 地址，每条黑名单取第一个命中的类型"""
+    matches = []
+    for blacklist_item in blacklist:
+        blacklist_phones = []
+        if blacklist_item.phone_numbers:
+            if isinstance(blacklist_item.phone_numbers, list):
+                blacklist_phones.extend(blacklist_item.phone_numbers)
+            else:
+                blacklist_phones.append(str(blacklist_item.phone_numbers))
+        names = [blacklist_item.ktt_name, blacklist_item.wechat_name, blacklist_item.order_name_phone]
+        addresses = [blacklist_item.order_address1, blacklist_item.order_address2]
+        
+        for match_type, risk_level, (is_match, score, detail) in (
+            ("phone", "HIGH", blacklist_matcher.match_phone(order.contact_phone, blacklist_phones)),
+            ("name", "MEDIUM", blacklist_matcher.match_name(order.orderer, names)),
+            ("address", "LOW", blacklist_matcher.match_address(order.detailed_address, addresses))
+        ):
+            if is_match:
+                matches.append({
+                    "blacklist_id": blacklist_item.id,
+                    "match_type": match_type,
+                    "match_score": score,
+                    "match_details": detail,
+                    "risk_level": risk_level
+                })
+                break
+    return blacklist_matcher.summarize_matches(matches)
+
+
+@pytest.mark.parametrize("options", MATCHER_OPTIONS)
+@pytest.mark.parametrize("seed", [1, 2])
+def test_bulk_matches_per_order(seed, options, matcher_options):
+    matcher_options(**options)
+    blacklist, orders = make_dataset(seed, 200, 300)
+    snapshot = BlacklistSnapshot.build(blacklist)
+    
+    bulk_results = blacklist_matcher.check_orders_bulk(orders, snapshot, parallel=False)
+    
+    assert bulk_results["order_id"] == [order.id for order in orders]
+    assert any(bulk_results["is_blacklist"]) and not all(bulk_results["is_blacklist"])
+    for i, order in enumerate(orders):
+        assert blacklist_matcher.bulk_result_at(bulk_results, i) == blacklist_matcher.check_order_blacklist(order, snapshot)
+
+
+@pytest.mark.parametrize("options", MATCHER_OPTIONS)
+def test_bulk_matches_pairwise_comparison(options, matcher_options):
+    matcher_options(**options)
+    blacklist, orders = make_dataset(3, 80, 150)
+    
+    bulk_results = blacklist_matcher.check_orders_bulk(orders, BlacklistSnapshot.build(blacklist), parallel=False)
+    
+    for i, order in enumerate(orders):
+        assert blacklist_matcher.bulk_result_at(bulk_results, i) == pairwise_result(order, blacklist)
+
+
+def test_bulk_matches_baseline_without_new_match_types(matcher_options):
+    # 关闭地区过滤和拼音匹配，去掉微信号和备注（最初的算法不检查这些字段）
+    matcher_options(address_region_filter=False, pinyin_name_match=False)
+    blacklist, orders = make_dataset(4, 150, 300)
+    for blacklist_item in blacklist:
+        blacklist_item.wechat_id = None
+    for order in orders:
+        order.member_remarks = order.group_leader_remarks = None
+    
+    bulk_results = blacklist_matcher.check_orders_bulk(orders, BlacklistSnapshot.build(blacklist), parallel=False)
+    
+    for i, order in enumerate(orders):
+        assert scored_key(blacklist_matcher.bulk_result_at(bulk_results, i)) == scored_key(baseline_result(order, blacklist))
+
+
+
+def empty_blacklist_item(blacklist_id, **fields):
+    values = dict(
+        id=blacklist_id, blacklist_reason=None, phone_numbers=None, ktt_name=None, wechat_name=None,
+        wechat_id=None, order_name_phone=None, order_address1=None, order_address2=None
+    )
+    values.update(fields)
+    return SimpleNamespace(**values)
+
+
+def empty_order(order_id, **fields):
+    values = dict(
+        id=order_id, contact_phone=None, orderer=None, consignee=None, detailed_address=None,
+        member_remarks=None, group_leader_remarks=None
+    )
+    values.update(fields)
+    return SimpleNamespace(**values)
+
+
+@pytest.mark.parametrize("options", MATCHER_OPTIONS)
+def test_bulk_matches_with_empty_fields(options, matcher_options):
+    matcher_options(**options)
+    blacklist, orders = make_dataset(6, 50, 50)
+    # 空值、空串、只有空白或特殊字符（标准化后为空）的字段
+    blacklist += [
+        empty_blacklist_item(1001),
+        empty_blacklist_item(1002, phone_numbers=[], ktt_name="", wechat_name="  ", wechat_id="", order_address1=""),
+        empty_blacklist_item(1003, phone_numbers="", ktt_name="@@", order_name_phone="--", order_address2="   ")
+    ]
+    empty_orders = [
+        empty_order(1001),
+        empty_order(1002, contact_phone="", orderer="", consignee="  ", detailed_address="", member_remarks=""),
+        empty_order(1003, contact_phone="无", orderer="@@", detailed_address="  ", group_leader_remarks="--")
+    ]
+    orders += empty_orders
+    
+    bulk_results = blacklist_matcher.check_orders_bulk(orders, BlacklistSnapshot.build(blacklist), parallel=False)
+    
+    for i, order in enumerate(orders):
+        assert blacklist_matcher.bulk_result_at(bulk_results, i) == pairwise_result(order, blacklist)
+    assert not any(bulk_results["is_blacklist"][-len(empty_orders):])
+    
+    # 没有订单或没有黑名单
+    assert blacklist_matcher.check_orders_bulk([], BlacklistSnapshot.build(blacklist), parallel=False)["order_id"] == []
+    bulk_results = blacklist_matcher.check_orders_bulk(orders, BlacklistSnapshot.build([]), parallel=False)
+    assert bulk_results["order_id"] == [order.id for order in orders] and not any(bulk_results["is_blacklist"])
+
+def scored_key(result):
+    """检测结果连同每个匹配的分数和详情（与匹配列表的顺序无关）"""
+    return (
+        result["is_blacklist"],
+        result["risk_level"],
+        sorted(
+            (match["blacklist_id"], match["match_type"], match["match_score"], match["match_details"])
+            for match in result["matches"]
+        )
+    )
+
+
+@pytest.mark.parametrize("contact_phone, phone_numbers, expected_detail", [
+    # 同一个订单号码：黑名单中排在前面的近似号码先于后面的相同号码
+    ("13800138000", ["13800138001", "13800138000"], "电话匹配: 13800138000 ≈ 13800138001"),
+    # 订单中排在前面的号码的近似命中先于后面号码的精确命中
+    ("13800138000 13900139000", ["13900139000", "13800138009"], "电话匹配: 13800138000 ≈ 13800138009"),
+    ("13900139000", ["13800138001", "13900139000"], "电话匹配: 13900139000 ≈ 13900139000")
+])
+def test_phone_hit_follows_baseline_order(contact_phone, phone_numbers, expected_detail):
+    blacklist_item = SimpleNamespace(
+        id=1, blacklist_reason=None, phone_numbers=phone_numbers, ktt_name=None, wechat_name=None,
+        wechat_id=None, order_name_phone=None, order_address1=None, order_address2=None
+    )
+    order = SimpleNamespace(
+        id=1, contact_phone=contact_phone, orderer=None, consignee=None, detailed_address=None,
+        member_remarks=None, group_leader_remarks=None
+    )
+    _, expected_score, baseline_detail = blacklist_matcher.match_phone(contact_phone, phone_numbers)
+    assert baseline_detail == expected_detail
+    
+    snapshot = BlacklistSnapshot.build([blacklist_item])
+    bulk_results = blacklist_matcher.check_orders_bulk([order], snapshot, parallel=False)
+    for result in (
+        blacklist_matcher.bulk_result_at(bulk_results, 0),
+        blacklist_matcher.check_order_blacklist(order, snapshot),
+        blacklist_matcher.summarize_matches([blacklist_matcher.match_order_with_blacklist(order, blacklist_item)])
+    ):
+        match, = result["matches"]
+        assert (match["match_score"], match["match_details"]) == (expected_score, expected_detail)
+
+
+def test_duplicate_orders_share_results():
+    blacklist, orders = make_dataset(5, 100, 100)
+    duplicates = []
+    for i, order in enumerate(orders):
+        duplicate = copy.copy(order)
+        duplicate.id = 1000 + i
+        duplicates.append(duplicate)
+    snapshot = BlacklistSnapshot.build(blacklist)
+    
+    bulk_results = blacklist_matcher.check_orders_bulk(orders + duplicates, snapshot, parallel=False)
+    
+    for i in range(len(orders)):
+        original = blacklist_matcher.bulk_result_at(bulk_results, i)
+        duplicate = blacklist_matcher.bulk_result_at(bulk_results, len(orders) + i)
+        assert duplicate == original
+        # 复用的结果不能与原订单共享可变对象
+        assert duplicate["matches"] is not original["matches"]
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+匹配索引的边界情况
+
+CharIndex 的候选包含相似度恰好等于阈值的值，按倒排表和按子集筛选结果相同；
+PhoneDeletionIndex 只在号码等长且阈值允许时代替逐个比对，号码长短不一时结果不变。
+"""
+
+import pytest
+
+from app.services.blacklist_matcher import blacklist_matcher
+from app.services.blacklist_snapshot import CharIndex, PhoneDeletionIndex
+
+# 与查询 abcd 的相似度：1.0、0.75、2/3、2/3、0.5
+CHAR_VALUES = ["abcd", "abce", "ab", "abcdabcd", "abxy"]
+
+PHONES_11 = ["13800138000", "13800138001", "13800238000", "23800138000", "13900139000"]
+PHONES_12 = ["138001380000", "138001380001", "238001380000"]
+
+
+@pytest.mark.parametrize("threshold", [0.5, 2 / 3, 0.75, 0.76, 1.0])
+def test_char_index_keeps_values_at_threshold(threshold):
+    index = CharIndex({value: [i] for i, value in enumerate(CHAR_VALUES)})
+    expected = [
+        value_idx for value_idx, value in enumerate(CHAR_VALUES)
+        if blacklist_matcher.calculate_similarity("abcd", value) >= threshold
+    ]
+    
+    assert sorted(index.candidates("abcd", threshold)) == expected
+    # 子集大于倒排表时遍历倒排表，只有一个值时逐个值计数
+    assert sorted(index.candidates("abcd", threshold, list(range(len(CHAR_VALUES))))) == expected
+    assert sorted(
+        value_idx for i in range(len(CHAR_VALUES)) for value_idx in index.candidates("abcd", threshold, [i])
+    ) == expected
+
+
+def test_char_index_empty_query_and_zero_threshold():
+    index = CharIndex({value: [i] for i, value in enumerate(CHAR_VALUES)})
+    assert index.candidates("", 0.5) == []
+    assert index.candidates("zz", 0) == list(range(len(CHAR_VALUES)))
+    assert index.candidates("zz", 0, [1, 3]) == [1, 3]
+    assert index.candidates("zz", 0.1) == []
+
+
+
+@pytest.mark.parametrize("phones, phone, covered", [
+    (PHONES_11, "13800138009", True),
+    # 号码比索引中的长或短一位时，与11位号码的相似度仍可能达到 0.9，只能逐个比对
+    (PHONES_11, "1380013800", False),
+    (PHONES_11, "138001380001", False),
+    (PHONES_11 + ["1380013800", "138001380000"], "13800138009", False),
+    (PHONES_12, "138001380009", True),
+    (PHONES_12, "13800138000", False),
+    # 20位号码在 0.9 阈值下允许错两位，删一位变体不够
+    (["1" * 20, "1" * 18 + "22"], "1" * 20, False)
+])
+def test_phone_deletion_index_with_other_lengths(phones, phone, covered):
+    index = PhoneDeletionIndex(phones)
+    phone_index = {blacklist_phone: (i,) for i, blacklist_phone in enumerate(phones)}
+    threshold = blacklist_matcher.phone_similarity_threshold
+    
+    assert index.covers(phone, threshold) == covered
+    near_phones = blacklist_matcher.find_near_phones(phone, phone_index, index)
+    assert near_phones and near_phones == blacklist_matcher.find_near_phones(phone, phone_index)
@@ -0,0 +1,28 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+姓名拼音匹配
+
+只有首字母相同的姓名，全拼或字面相似度达到姓名阈值才算匹配。
+"""
+
+import pytest
+
+from app.services.blacklist_matcher import blacklist_matcher
+from app.services.name_pinyin import pinyin_keys
+
+
+@pytest.mark.parametrize("name, value, matched", [
+    ("张小明", "章晓明", True),   # 全拼相同
+    ("张晓明", "章小敏", True),   # 首字母相同，全拼相近
+    ("王小明", "吴晓梅", False),  # 首字母相同，全拼差别大
+    ("王小明", "李小明", False)   # 首字母不同
+])
+def test_pinyin_hit_requires_close_full_pinyin(name, value, matched):
+    keys = pinyin_keys(name)
+    value_keys = pinyin_keys(value)
+    if keys.initials != value_keys.initials and keys.full != value_keys.full:
+        assert not matched
+        return
+    hit = blacklist_matcher.pinyin_hit(name, keys, value, value_keys.full)
+    assert (hit is not None) == matched
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+订单文件的流式读取
+
+xlsx 与 csv 读出的列名、行号和单元格值一致：表头去掉空白，空行跳过但行号与文件相同，
+按数字保存的手机号转换为不带小数的字符串；筛查文件按别名识别列。
+批量写入时出错的行单独报告，其余行照常写入。
+"""
+
+import csv
+
+import pytest
+from openpyxl import Workbook
+
+from app.models.order import Order
+from app.services.order_import import REQUIRED_COLUMNS, build_order_data, bulk_insert_orders, open_order_rows, phone_text
+from app.services.screening_runner import open_screening_file, resolve_columns
+
+
+def order_row(phone, name):
+    row = dict.fromkeys(REQUIRED_COLUMNS, None)
+    row.update({"联系电话": phone, "下单人": name, "订单金额": "12.5", "订单状态": "已支付"})
+    return [row[column] for column in REQUIRED_COLUMNS]
+
+
+# 第3行、第5行为空行（csv 中一行是全空单元格，一行是空白行）
+ROWS = [
+    order_row(13800138000, "张三"),
+    None,
+    order_row(13800138001.0, "李四"),
+    None,
+    order_row("13800138002", "王五")
+]
+
+
+def write_file(path, header, rows):
+    """写成 xlsx 或 csv（按扩展名），None 表示空行"""
+    if path.suffix == ".xlsx":
+        workbook = Workbook()
+        sheet = workbook.active
+        sheet.append(header)
+        for row in rows:
+            sheet.append(row or [None] * len(header))
+        workbook.save(path)
+        return
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        for i, row in enumerate(rows):
+            if row is not None:
+                writer.writerow(row)
+            elif i % 2:
+                writer.writerow([None] * len(header))
+            else:
+                f.write("\n")
+
+
+@pytest.mark.parametrize("suffix", [".xlsx", ".csv"])
+def test_streamed_order_rows(tmp_path, suffix):
+    path = tmp_path / f"orders{suffix}"
+    write_file(path, [f" {column} " for column in REQUIRED_COLUMNS], ROWS)
+    
+    with open(path, "rb") as f:
+        columns, rows = open_order_rows(f, path.name, chunk_size=2)
+        rows = list(rows)
+    
+    assert columns == REQUIRED_COLUMNS
+    assert [row_number for row_number, _ in rows] == [2, 4, 6]
+    orders = [build_order_data(row, group_id=1) for _, row in rows]
+    assert [order["contact_phone"] for order in orders] == ["13800138000", "13800138001", "13800138002"]
+    assert [order["orderer"] for order in orders] == ["张三", "李四", "王五"]
+    assert all(order["member_remarks"] is None and str(order["order_amount"]) == "12.5" for order in orders)
+
+
+@pytest.mark.parametrize("suffix", [".xlsx", ".csv"])
+def test_screening_file_resolves_column_aliases(tmp_path, suffix):
+    path = tmp_path / f"screening{suffix}"
+    write_file(path, ["姓名", "手机号", "收货地址"], [
+        ["张三", 13800138000, "四川省成都市武侯区人民南路1号"],
+        None,
+        [None, 13800138001.0, None]
+    ])
+    
+    with open_screening_file(str(path)) as (file_columns, rows):
+        columns = resolve_columns(file_columns)
+        rows = list(rows)
+    
+    assert columns == {"orderer": "姓名", "contact_phone": "手机号", "detailed_address": "收货地址"}
+    assert [row_number for row_number, _ in rows] == [2, 4]
+    assert rows[0][1] == {"姓名": "张三", "手机号": "13800138000", "收货地址": "四川省成都市武侯区人民南路1号"}
+    assert rows[1][1]["姓名"] is None and rows[1][1]["收货地址"] is None
+    assert phone_text(rows[1][1]["手机号"]) == "13800138001"
+
+
+def test_bulk_insert_reports_only_failing_rows(db):
+    def convert(name):
+        if name == "格式错误":
+            raise ValueError("无法解析")
+        # is_active 不能为空，这一行写入时违反约束，所在的整批改为逐行重试
+        return {"group_id": 1, "orderer": name, "is_active": None if name == "约束错误" else True}
+    
+    names = ["甲", "乙", "丙", "丁", "约束错误", "戊", "格式错误", "己"]
+    rows = list(enumerate(names, start=2))
+    
+    imported_count, errors = bulk_insert_orders(db, rows, convert, batch_size=3)
+    db.commit()
+    
+    assert imported_count == 6
+    assert [error.split("行")[0] for error in errors] == ["第6", "第8"]
+    assert "无法解析" in errors[1]
+    assert [order.orderer for order in db.query(Order).order_by(Order.id)] == ["甲", "乙", "丙", "丁", "戊", "己"]
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+进程池匹配与单进程匹配的一致性
+
+进程池在快照版本变化后继续使用，任务只带快照文件路径，增量快照的增量部分单独写文件；
+工作进程无法取得快照时由本进程匹配对应分片。
+"""
+
+import copy
+import os
+
+import pytest
+
+from app.services.blacklist_matcher import blacklist_matcher
+from app.services.blacklist_snapshot import BlacklistSnapshot, LayeredBlacklistSnapshot
+from app.services.parallel_matcher import ParallelMatcher
+from app.services.snapshot_store import open_snapshot_store, write_snapshot_store
+from tests.factories import make_dataset
+
+
+@pytest.fixture
+def parallel(pinyin_stub, matcher_options):
+    # 拼音表只在本进程替换，spawn 启动的工作进程里没有，两边都不做拼音匹配
+    if pinyin_stub:
+        matcher_options(pinyin_name_match=False)
+    matcher = ParallelMatcher(processes=2, chunk_size=50, min_orders=1)
+    yield matcher
+    matcher.shutdown()
+
+
+def test_parallel_matches_serial_across_versions(parallel):
+    blacklist, orders = make_dataset(11, 200, 300)
+    base = BlacklistSnapshot.build(blacklist, version="v1", history_id=1)
+    
+    assert parallel.check_orders_bulk(orders, base) == blacklist_matcher.check_orders_bulk(orders, base, parallel=False)
+    executor = parallel._executor
+    base_path = parallel._message.base_path
+    
+    # 清空前30条黑名单的电话、微信号后得到增量快照
+    changed = [copy.copy(blacklist_item) for blacklist_item in blacklist[:30]]
+    for blacklist_item in changed:
+        blacklist_item.phone_numbers = blacklist_item.wechat_id = None
+    layered = LayeredBlacklistSnapshot(
+        base, BlacklistSnapshot.build(changed), frozenset(item.id for item in changed), "v2", 2
+    )
+    rebuilt = BlacklistSnapshot.build(changed + blacklist[30:])
+    
+    results = parallel.check_orders_bulk(orders, layered)
+    
+    assert results == blacklist_matcher.check_orders_bulk(orders, layered, parallel=False)
+    assert results == blacklist_matcher.check_orders_bulk(orders, rebuilt, parallel=False)
+    # 进程池没有重建，基础快照的文件继续使用，只新写了增量文件
+    assert parallel._executor is executor
+    assert parallel._message.base_path == base_path
+    assert parallel._temp_files == [parallel._message.delta_path]
+
+
+def test_parallel_matches_serial_without_version(parallel, snapshot_store_dir):
+    blacklist, orders = make_dataset(12, 100, 200)
+    snapshot = BlacklistSnapshot.build(blacklist)
+    
+    assert parallel.check_orders_bulk(orders, snapshot) == blacklist_matcher.check_orders_bulk(orders, snapshot, parallel=False)
+    # 没有版本号的快照写成临时文件，不会被当作已保存的快照，关闭时删除
+    temp_files = list(parallel._temp_files)
+    assert [os.path.basename(path).split("_")[0] for path in temp_files] == ["parallel"]
+    assert not list(snapshot_store_dir.glob("blacklist_*.snap"))
+    parallel.shutdown()
+    assert not any(os.path.exists(path) for path in temp_files)
+
+
+def test_parallel_mapped_snapshot_falls_back_when_file_is_gone(parallel, tmp_path):
+    blacklist, orders = make_dataset(13, 100, 200)
+    snapshot = BlacklistSnapshot.build(blacklist, version="v1", history_id=1)
+    path = str(tmp_path / "blacklist.snap")
+    write_snapshot_store(snapshot, path)
+    mapped = open_snapshot_store(path)
+    os.remove(path)
+    
+    assert parallel.check_orders_bulk(orders, mapped) == blacklist_matcher.check_orders_bulk(orders, snapshot, parallel=False)
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+订单侧索引与反向筛查
+
+订单索引给出的候选必须包含正向匹配命中的全部订单；
+黑名单变更后只重新检测候选订单，结果与全部订单重新检测相同；
+分组复检只重新检测可能受检测版本之后（到当前快照为止）的变更影响的订单。
+"""
+
+import random
+
+import pytest
+
+from app.models.blacklist import Blacklist, BlacklistHistory
+from app.models.group import Group
+from app.models.order import Order
+from app.services import blacklist_snapshot, reverse_screening
+from app.services.blacklist_matcher import blacklist_matcher
+from app.services.blacklist_snapshot import BlacklistSnapshot, BlacklistSnapshotCache
+from app.services.order_index import OrderIndex, OrderIndexCache
+from app.services.reverse_screening import (
+    ReverseScreeningRunner, find_affected_orders, order_check_values, previous_blacklist_items, rescreen_orders,
+    select_orders_to_check
+)
+from tests.factories import BLACKLIST_FIELDS, ORDER_FIELDS, make_blacklist, make_dataset, make_orders
+
+
+@pytest.mark.parametrize("options", [
+    {"address_region_filter": True, "pinyin_name_match": True},
+    {"address_region_filter": False, "pinyin_name_match": False}
+])
+def test_order_index_candidates_cover_forward_matches(options, matcher_options):
+    matcher_options(**options)
+    blacklist, orders = make_dataset(41, 150, 400)
+    snapshot = BlacklistSnapshot.build(blacklist)
+    bulk_results = blacklist_matcher.check_orders_bulk(orders, snapshot, parallel=False)
+    index = OrderIndex(orders)
+    
+    matched_orders = {entry.id: set() for entry in snapshot.entries}
+    for order_id, matches in zip(bulk_results["order_id"], bulk_results["matches"]):
+        for match in matches:
+            matched_orders[match["blacklist_id"]].add(order_id)
+    
+    assert any(matched_orders.values())
+    for entry in snapshot.entries:
+        assert matched_orders[entry.id] <= index.candidates(entry)
+
+
+@pytest.fixture
+def screening_db(db, session_factory, clock, monkeypatch):
+    """写入黑名单和一个分组的订单并完成首次检测，使用独立的快照和订单索引缓存"""
+    monkeypatch.setattr(blacklist_snapshot, "blacklist_snapshot_cache", BlacklistSnapshotCache(session_factory))
+    monkeypatch.setattr(reverse_screening, "order_index_cache", OrderIndexCache())
+    
+    blacklist = make_blacklist(42, 200)
+    for blacklist_item in blacklist:
+        db.add(Blacklist(**{field: getattr(blacklist_item, field) for field in BLACKLIST_FIELDS}, updated_at=clock()))
+    group = Group(name="测试分组")
+    db.add(group)
+    db.commit()
+    for order in make_orders(43, blacklist, 600):
+        db.add(Order(group_id=group.id, **{field: getattr(order, field) for field in ORDER_FIELDS}, updated_at=clock()))
+    db.commit()
+    rescreen_orders(db, [order_id for (order_id,) in db.query(Order.id)])
+    return db, blacklist, group
+
+
+def stored_results(db):
+    db.expire_all()
+    return {
+        order.id: (
+            order.is_blacklist_checked, order.blacklist_risk_level,
+            order.blacklist_match_info, order.blacklist_match_details, order.updated_at
+        )
+        for order in db.query(Order).order_by(Order.id)
+    }
+
+
+def expected_results(db):
+    """对全部订单重新检测应得到的结果（订单的修改时间不变）"""
+    db.expire_all()
+    orders = db.query(Order).order_by(Order.id).all()
+    bulk_results = blacklist_matcher.check_orders_bulk(orders, blacklist_snapshot.get_blacklist_snapshot(db), parallel=False)
+    return {
+        order.id: tuple(order_check_values(blacklist_matcher.bulk_result_at(bulk_results, i)).values()) + (order.updated_at,)
+        for i, order in enumerate(orders)
+    }
+
+
+def test_reverse_screening_matches_full_recheck(screening_db, session_factory, clock):
+    db, blacklist, group = screening_db
+    rng = random.Random(44)
+    runner = ReverseScreeningRunner(session_factory=session_factory)
+    
+    def change_and_verify(blacklist_ids, previous_data):
+        stats = runner.run(blacklist_ids, previous_data)
+        expected = expected_results(db)
+        assert stats["checked_orders"] < len(expected)
+        assert stored_results(db) == expected
+        assert db.get(Group, group.id).blacklist_matches == sum(
+            1 for values in expected.values() if values[1] != "none"
+        )
+    
+    # 新增（其中一条复制已有黑名单，命中已有订单）
+    rows = []
+    for blacklist_item in make_blacklist(45, 4) + [blacklist[3]]:
+        row = Blacklist(**{field: getattr(blacklist_item, field) for field in BLACKLIST_FIELDS}, updated_at=clock())
+        db.add(row)
+        db.commit()
+        rows.append(row)
+    change_and_verify([row.id for row in rows], [])
+    
+    # 修改：原来命中的订单和新命中的订单都要更新
+    for blacklist_id in rng.sample(range(1, 201), 4):
+        row = db.get(Blacklist, blacklist_id)
+        previous = row.to_dict()
+        source = rng.choice(blacklist)
+        for field in BLACKLIST_FIELDS:
+            setattr(row, field, getattr(source, field))
+        row.updated_at = clock()
+        db.commit()
+        change_and_verify([blacklist_id], [previous])
+    
+    # 删除
+    for blacklist_id in rng.sample(range(1, 201), 4):
+        row = db.get(Blacklist, blacklist_id)
+        previous = row.to_dict()
+        row.is_active = False
+        row.updated_at = clock()
+        db.commit()
+        change_and_verify([blacklist_id], [previous])
+    
+    # 订单索引建立后新增的订单也要能找到
+    for order in make_orders(46, blacklist, 50):
+        db.add(Order(group_id=group.id, **{field: getattr(order, field) for field in ORDER_FIELDS}, updated_at=clock()))
+    db.commit()
+    rescreen_orders(db, [order_id for (order_id,) in db.query(Order.id)])
+    row = Blacklist(**{field: getattr(blacklist[7], field) for field in BLACKLIST_FIELDS}, updated_at=clock())
+    db.add(row)
+    db.commit()
+    change_and_verify([row.id], [])
+
+
+def change_blacklist(db, clock, blacklist_id, source):
+    """把黑名单改成 source 的内容并记录变更历史，返回变更前后的数据"""
+    row = db.get(Blacklist, blacklist_id)
+    # 变更历史中保存的是序列化后的数据，这里只留匹配用的字段
+    previous = {field: getattr(row, field) for field in ("id",) + BLACKLIST_FIELDS}
+    for field in BLACKLIST_FIELDS:
+        setattr(row, field, getattr(source, field))
+    row.updated_at = clock()
+    db.add(BlacklistHistory(blacklist_id=blacklist_id, action="update", old_data=previous))
+    db.commit()
+    return [row] + previous_blacklist_items([previous])
+
+
+def test_select_orders_skips_unaffected_orders(screening_db, clock):
+    db, blacklist, group = screening_db
+    orders = db.query(Order).order_by(Order.id).all()
+    checked_version = orders[0].blacklist_checked_version
+    updated_at = {order.id: order.updated_at for order in orders}
+    
+    # 快照取在第一次变更之后，第二次变更不在快照中，不因它重新检测
+    first = find_affected_orders(db, change_blacklist(db, clock, 3, blacklist[10]))
+    snapshot = blacklist_snapshot.get_blacklist_snapshot(db)
+    second = find_affected_orders(db, change_blacklist(db, clock, 5, blacklist[20]))
+    assert first and set(second) - set(first)
+    
+    selected = select_orders_to_check(db, orders, snapshot)
+    assert [order.id for order in selected] == first
+    
+    # 没有重新检测的订单只更新检测版本，修改时间不变
+    db.commit()
+    db.expire_all()
+    for order in db.query(Order).order_by(Order.id):
+        assert order.blacklist_checked_version == (checked_version if order.id in first else snapshot.version)
+        assert order.updated_at == updated_at[order.id]
+    
+    assert select_orders_to_check(db, orders, snapshot, force_recheck=True) == orders
+
+
+def test_select_orders_falls_back_to_full_check(screening_db, clock):
+    db, blacklist, group = screening_db
+    orders = db.query(Order).order_by(Order.id).all()
+    
+    # 版本号无法解析的订单重新检测
+    orders[0].blacklist_checked_version = "unknown"
+    db.commit()
+    change_blacklist(db, clock, 3, blacklist[10])
+    snapshot = blacklist_snapshot.get_blacklist_snapshot(db)
+    assert orders[0] in select_orders_to_check(db, orders, snapshot)
+    db.rollback()
+    
+    # 有没写变更历史的修改，检测版本在它之前的订单全部重新检测
+    row = db.get(Blacklist, 7)
+    row.wechat_id = "wx_unlogged"
+    row.updated_at = clock()
+    db.commit()
+    snapshot = blacklist_snapshot.get_blacklist_snapshot(db)
+    assert select_orders_to_check(db, orders, snapshot) == orders
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+筛查任务的检查点与执行租约
+
+中途出错的任务从检查点继续，结果与一次执行完相同且没有重复；
+同一任务同时只有一个执行器能取得租约。
+"""
+
+import csv
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.models.blacklist import Blacklist
+from app.models.screening import ScreeningTask, ScreeningResult
+from app.services import blacklist_snapshot
+from app.services.blacklist_snapshot import BlacklistSnapshotCache
+from app.services.screening_runner import ScreeningRunner
+from tests.factories import BLACKLIST_FIELDS, make_blacklist, make_orders
+
+
+@pytest.fixture
+def screening_file(db, session_factory, clock, tmp_path, monkeypatch):
+    """写入黑名单，生成60行的筛查文件，返回创建任务的函数"""
+    monkeypatch.setattr(blacklist_snapshot, "blacklist_snapshot_cache", BlacklistSnapshotCache(session_factory))
+    blacklist = make_blacklist(51, 100)
+    for blacklist_item in blacklist:
+        db.add(Blacklist(**{field: getattr(blacklist_item, field) for field in BLACKLIST_FIELDS}, updated_at=clock()))
+    db.commit()
+    
+    path = tmp_path / "screening.csv"
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["下单人", "联系电话", "详细地址"])
+        for order in make_orders(52, blacklist, 60):
+            writer.writerow([order.orderer, order.contact_phone, order.detailed_address])
+    
+    def create_task() -> int:
+        task = ScreeningTask(task_name="测试", file_name="screening.csv", file_path=str(path), status="processing")
+        db.add(task)
+        db.commit()
+        return task.id
+    return create_task
+
+
+def task_results(db, task_id):
+    return sorted(
+        (result.order_data["行号"], result.blacklist_id, result.match_type, float(result.match_score))
+        for result in db.query(ScreeningResult).filter(ScreeningResult.task_id == task_id)
+    )
+
+
+def test_resume_after_failure_writes_no_duplicates(db, session_factory, screening_file, monkeypatch):
+    expected_id = screening_file()
+    ScreeningRunner(session_factory, chunk_size=7).run_task(expected_id)
+    expected = db.get(ScreeningTask, expected_id)
+    assert expected.status == "completed" and expected.processed_records == 60 and expected.matched_records > 14
+    
+    task_id = screening_file()
+    failing = ScreeningRunner(session_factory, chunk_size=7)
+    process_chunk = failing._process_chunk
+    calls = []
+    
+    def fail_third_chunk(*args):
+        calls.append(args)
+        if len(calls) == 3:
+            # 第3批的结果已经写入会话，但检查点没有提交
+            process_chunk(*args)
+            raise RuntimeError("模拟中断")
+        return process_chunk(*args)
+    monkeypatch.setattr(failing, "_process_chunk", fail_third_chunk)
+    failing.run_task(task_id)
+    
+    db.expire_all()
+    task = db.get(ScreeningTask, task_id)
+    assert task.status == "failed" and task.processed_records == 14
+    assert task.lease_expires_at is None
+    
+    # 重启后（新的执行器）继续
+    task.status = "processing"
+    db.commit()
+    ScreeningRunner(session_factory, chunk_size=7).run_task(task_id)
+    
+    db.expire_all()
+    task = db.get(ScreeningTask, task_id)
+    assert task.status == "completed"
+    assert (task.total_records, task.processed_records, task.matched_records) == (
+        expected.total_records, expected.processed_records, expected.matched_records
+    )
+    assert task_results(db, task_id) == task_results(db, expected_id)
+
+
+def test_only_one_runner_claims_a_task(db, session_factory, screening_file, monkeypatch):
+    task_id = screening_file()
+    first = ScreeningRunner(session_factory, chunk_size=7)
+    second = ScreeningRunner(session_factory, chunk_size=7)
+    submitted = []
+    monkeypatch.setattr(second, "submit", submitted.append)
+    
+    assert first._claim(db, task_id)
+    assert not second._claim(db, task_id)
+    # 租约未过期：其他执行器不继续、也不重新提交这个任务
+    second.run_task(task_id)
+    assert second.resume_unfinished() == [] and submitted == []
+    db.expire_all()
+    assert db.get(ScreeningTask, task_id).processed_records == 0
+    
+    # 第一个执行器的进程退出后租约过期，由第二个接管
+    task = db.get(ScreeningTask, task_id)
+    task.lease_expires_at = datetime.now() - timedelta(seconds=1)
+    db.commit()
+    assert second.resume_unfinished() == [task_id]
+    second.run_task(task_id)
+    
+    db.expire_all()
+    task = db.get(ScreeningTask, task_id)
+    assert task.status == "completed" and task.runner_id == second.runner_id
+    # 失去租约的执行器不能再推进检查点
+    assert not first._save_checkpoint(db, task_id, task.processed_records, 7, 0)
+    db.rollback()
+    assert not first._claim(db, task_id)
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+按变更历史增量更新的快照与整体重建的快照结果一致
+"""
+
+import random
+
+import pytest
+
+from app.core.config import settings
+from app.models.blacklist import Blacklist, BlacklistHistory
+from app.services import blacklist_snapshot
+from app.services.blacklist_matcher import blacklist_matcher
+from app.services.blacklist_snapshot import (
+    BlacklistSnapshot, BlacklistSnapshotCache, LayeredBlacklistSnapshot, get_snapshot_version, load_snapshot
+)
+from tests.factories import BLACKLIST_FIELDS, make_blacklist, make_orders
+
+
+@pytest.fixture
+def blacklist_db(db, clock):
+    """写入300条黑名单，返回 (会话, 生成数据用的黑名单, 订单)"""
+    blacklist = make_blacklist(31, 300)
+    for blacklist_item in blacklist:
+        db.add(Blacklist(**{field: getattr(blacklist_item, field) for field in BLACKLIST_FIELDS}, updated_at=clock()))
+    db.commit()
+    return db, blacklist, make_orders(32, blacklist, 300)
+
+
+def record(db, blacklist_id, action):
+    db.add(BlacklistHistory(blacklist_id=blacklist_id, action=action))
+    db.commit()
+
+
+def assert_matches_rebuild(cache, db, orders):
+    """缓存的快照与按当前数据库整体重建的快照检测结果相同，返回缓存的快照"""
+    snapshot = cache.get(db)
+    version, history_id = get_snapshot_version(db)
+    rebuilt = load_snapshot(db, version, history_id)
+    
+    assert snapshot.version == version
+    assert len(snapshot) == len(rebuilt)
+    results = blacklist_matcher.check_orders_bulk(orders, snapshot, parallel=False)
+    assert results == blacklist_matcher.check_orders_bulk(orders, rebuilt, parallel=False)
+    for i, order in enumerate(orders[:50]):
+        assert blacklist_matcher.check_order_blacklist(order, snapshot) == blacklist_matcher.bulk_result_at(results, i)
+    return snapshot
+
+
+def test_layered_snapshot_matches_rebuild(blacklist_db, session_factory, clock):
+    db, blacklist, orders = blacklist_db
+    rng = random.Random(33)
+    cache = BlacklistSnapshotCache(session_factory=session_factory)
+    assert isinstance(assert_matches_rebuild(cache, db, orders), BlacklistSnapshot)
+    
+    # 新增
+    for blacklist_item in make_blacklist(34, 10):
+        row = Blacklist(**{field: getattr(blacklist_item, field) for field in BLACKLIST_FIELDS}, updated_at=clock())
+        db.add(row)
+        db.commit()
+        record(db, row.id, "create")
+    snapshot = assert_matches_rebuild(cache, db, orders)
+    assert isinstance(snapshot, LayeredBlacklistSnapshot)
+    
+    # 修改（换成另一条黑名单的内容）
+    for blacklist_id in rng.sample(range(1, 301), 15):
+        row = db.get(Blacklist, blacklist_id)
+        source = rng.choice(blacklist)
+        for field in BLACKLIST_FIELDS:
+            setattr(row, field, getattr(source, field))
+        row.updated_at = clock()
+        db.commit()
+        record(db, blacklist_id, "update")
+    assert isinstance(assert_matches_rebuild(cache, db, orders), LayeredBlacklistSnapshot)
+    
+    # 删除
+    for blacklist_id in rng.sample(range(1, 311), 20):
+        row = db.get(Blacklist, blacklist_id)
+        if row.is_active:
+            row.is_active = False
+            row.updated_at = clock()
+            db.commit()
+            record(db, blacklist_id, "delete")
+    snapshot = assert_matches_rebuild(cache, db, orders)
+    assert isinstance(snapshot, LayeredBlacklistSnapshot)
+    # 增量始终叠加在最初的快照上，不会层层嵌套
+    assert isinstance(snapshot.base, BlacklistSnapshot)
+
+
+def test_unlogged_change_forces_rebuild(blacklist_db, session_factory, clock):
+    db, _, orders = blacklist_db
+    cache = BlacklistSnapshotCache(session_factory=session_factory)
+    cache.get(db)
+    
+    # 第2条的修改没有写变更历史
+    row = db.get(Blacklist, 2)
+    row.ktt_name = "未记录"
+    row.updated_at = clock()
+    db.commit()
+    row = db.get(Blacklist, 1)
+    row.ktt_name = "已记录"
+    row.updated_at = clock()
+    db.commit()
+    record(db, 1, "update")
+    
+    assert type(assert_matches_rebuild(cache, db, orders)) is BlacklistSnapshot
+
+
+def test_too_many_changes_force_rebuild(blacklist_db, session_factory, clock, monkeypatch):
+    db, _, orders = blacklist_db
+    monkeypatch.setattr(settings, "SNAPSHOT_INCREMENTAL_MAX_CHANGES", 3)
+    cache = BlacklistSnapshotCache(session_factory=session_factory)
+    cache.get(db)
+    
+    for blacklist_id in range(50, 55):
+        row = db.get(Blacklist, blacklist_id)
+        row.blacklist_reason = "修改"
+        row.updated_at = clock()
+        db.commit()
+        record(db, blacklist_id, "update")
+    
+    assert type(assert_matches_rebuild(cache, db, orders)) is BlacklistSnapshot
+
+
+def test_preload_decodes_saved_file_without_shared_store(blacklist_db, session_factory, snapshot_store_dir, monkeypatch):
+    db, _, orders = blacklist_db
+    monkeypatch.setattr(settings, "SNAPSHOT_STORE_ENABLED", False)
+    built = BlacklistSnapshotCache(session_factory=session_factory).get(db)
+    assert len(list(snapshot_store_dir.glob("blacklist_*.snap"))) == 1
+    
+    def no_scan(*args, **kwargs):
+        raise AssertionError("预加载不应扫描黑名单表")
+    monkeypatch.setattr(blacklist_snapshot, "query_blacklist_rows", no_scan)
+    cache = BlacklistSnapshotCache(session_factory=session_factory)
+    preloaded = cache.preload()
+    
+    assert type(preloaded) is BlacklistSnapshot and preloaded.store is None
+    assert preloaded.version == built.version and not cache.refreshing
+    assert cache.get(db) is preloaded
+    assert list(preloaded.entries) == list(built.entries)
+    results = blacklist_matcher.check_orders_bulk(orders, preloaded, parallel=False)
+    assert results == blacklist_matcher.check_orders_bulk(orders, built, parallel=False)
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+映射快照与进程内快照的一致性，以及旧快照文件的清理
+"""
+
+import os
+import pickle
+import sys
+
+import pytest
+
+from app.services import snapshot_store
+from app.services.blacklist_matcher import blacklist_matcher
+from app.services.blacklist_snapshot import BlacklistSnapshot
+from app.services.snapshot_store import (
+    load_shared_snapshot, open_snapshot_store, pinned_stores, snapshot_store_path, write_snapshot_store
+)
+from tests.factories import make_dataset
+
+
+@pytest.mark.parametrize("region_filter", [True, False])
+def test_mapped_snapshot_matches_in_memory(tmp_path, region_filter, matcher_options):
+    matcher_options(address_region_filter=region_filter)
+    blacklist, orders = make_dataset(21, 200, 300)
+    snapshot = BlacklistSnapshot.build(blacklist, version="v1", history_id=1)
+    path = str(tmp_path / "blacklist.snap")
+    write_snapshot_store(snapshot, path)
+    
+    mapped = open_snapshot_store(path)
+    
+    assert list(mapped.entries) == list(snapshot.entries)
+    assert mapped.phone_index.to_dict() == snapshot.phone_index
+    assert mapped.wechat_index.to_dict() == snapshot.wechat_index
+    assert list(mapped.name_index.values) == list(snapshot.name_index.values)
+    assert list(mapped.address_index.values) == list(snapshot.address_index.values)
+    mapped_results = blacklist_matcher.check_orders_bulk(orders, mapped, parallel=False)
+    assert mapped_results == blacklist_matcher.check_orders_bulk(orders, snapshot, parallel=False)
+    for i, order in enumerate(orders[:50]):
+        assert blacklist_matcher.check_order_blacklist(order, mapped) == blacklist_matcher.bulk_result_at(mapped_results, i)
+
+
+def test_mapped_snapshot_pickles_as_path(tmp_path):
+    blacklist, _ = make_dataset(22, 50, 1)
+    path = str(tmp_path / "blacklist.snap")
+    write_snapshot_store(BlacklistSnapshot.build(blacklist, version="v1", history_id=1), path)
+    mapped = open_snapshot_store(path)
+    
+    restored = pickle.loads(pickle.dumps(mapped))
+    
+    assert restored.store.path == path
+    assert list(restored.entries) == list(mapped.entries)
+
+
+def test_old_store_files_are_removed_unless_pinned(snapshot_store_dir):
+    blacklist, _ = make_dataset(23, 30, 1)
+    
+    def save(history_id):
+        version = f"{history_id}-30-30-"
+        load_shared_snapshot(version, history_id, lambda: BlacklistSnapshot.build(blacklist))
+        path = snapshot_store_path(version, history_id)
+        # 旧文件按修改时间排序，显式拉开时间
+        os.utime(path, (history_id, history_id))
+        return path
+    
+    first = save(1)
+    with pinned_stores([first]):
+        save(2)
+        save(3)
+        # 第1个文件已不在最近的两个之内，但仍被引用
+        assert os.path.exists(first)
+    save(4)
+    
+    assert not os.path.exists(first)
+    assert not snapshot_store._pinned_stores
+
+
+@pytest.mark.parametrize("keys", [
+    ["13800138000", "13900139000", "15000150000"],
+    ["13800138000", "0138001380", "wx_张三"],
+    ["zhangsan", "zs", "zhangxiaoming"]
+])
+def test_mapped_key_map_lookups(tmp_path, keys):
+    mapping = {key: (idx, idx + 1) for idx, key in enumerate(keys)}
+    writer = snapshot_store._StoreWriter()
+    writer.add_key_map("keys", mapping)
+    path = str(tmp_path / "keys.snap")
+    writer.write(path, {"format": snapshot_store.STORE_FORMAT_VERSION, "byteorder": sys.byteorder})
+    
+    key_map = snapshot_store.SnapshotStore(path).key_map("keys")
+    
+    assert list(key_map.keys()) == keys
+    assert key_map.to_dict() == mapping
+    for key, value_ids in mapping.items():
+        assert key in key_map
+        assert key_map[key] == value_ids
+    for missing in ["", "0", "013800138000", "1380013800", "zhangsanfeng" * 3, "zhang\0san", "张三"]:
+        assert missing not in key_map
+        assert key_map.get(missing) is None
@@ -7,7 +7,6 @@
 import sys
 import os
 import pandas as pd
-import re
 from datetime import datetime
 from decimal import Decimal
 
@@ -21,16 +20,14 @@ from sqlalchemy.orm import Session
 from app.core.config import settings
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
+from app.services.normalization import normalization_service
 
 def extract_phone_numbers(text):
-    """从文本中提取电话号码"""
+    """从文本中提取电话号码（去重并保持顺序，相同文本只解析一次）"""
     if pd.isna(text) or not text:
         return []
     
-    # 电话号码正则表达式
-    phone_pattern = r'1[3-9]\d{9}'
-    phones = re.findall(phone_pattern, str(text))
-    return phones
+    return list(normalization_service.extract_phones(text))
 
 def determine_risk_level(reason):
     """根据入黑名单原因确定风险等级"""
@@ -170,6 +167,9 @@ def import_blacklist_data():
         print(f"⚠️  跳过: {skipped_count} 条")
         print(f"❌ 错误: {len(errors)} 条")
         
+        phone_cache = normalization_service.stats()["phones"]
+        print(f"📞 电话提取缓存: 命中 {phone_cache['hits']} 次，未命中 {phone_cache['misses']} 次")
+        
         if errors:
             print(f"\n❌ 错误详情:")
             for error in errors:
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+相似度实现校准脚本
+
+在带标注的样本上比较 difflib 与 C 实现（python-Levenshtein）的分数差异、
+阈值判定不一致的样本以及查准率/召回率，用于决定 SIMILARITY_BACKEND 配置。
+
+样本文件为 csv，列：value1, value2, label（label 可省略，1/0 或 是/否）
+用法：python scripts/calibrate_similarity.py samples.csv --threshold 0.8
+"""
+
+import sys
+import json
+import argparse
+from pathlib import Path
+
+import pandas as pd
+
+# 添加项目根目录到Python路径
+project_root = Path(__file__).parent.parent
+blacklist_backend_path = project_root / "blacklist-backend"
+sys.path.append(str(blacklist_backend_path))
+
+from app.services.blacklist_matcher import calibrate_similarity_backends, SIMILARITY_BACKENDS
+
+LABEL_VALUES = {
+    "1": True, "true": True, "yes": True, "是": True,
+    "0": False, "false": False, "no": False, "否": False
+}
+
+
+def load_samples(file_path):
+    """读取样本文件"""
+    df = pd.read_csv(file_path, dtype=str, encoding="utf-8-sig")
+    samples = []
+    for row in df.to_dict("records"):
+        label = row.get("label")
+        label = LABEL_VALUES.get(str(label).strip().lower()) if pd.notna(label) else None
+        samples.append((row.get("value1") or "", row.get("value2") or "", label))
+    return samples
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="比较相似度实现的分数差异")
+    parser.add_argument("samples", help="样本csv文件（value1, value2, label）")
+    parser.add_argument("--threshold", type=float, default=0.8, help="判定阈值（姓名0.8，地址0.7）")
+    parser.add_argument("--backends", nargs="+", default=list(SIMILARITY_BACKENDS), help="参与比较的实现")
+    args = parser.parse_args()
+    
+    samples = load_samples(args.samples)
+    print(f"样本数: {len(samples)}, 阈值: {args.threshold}")
+    
+    report = calibrate_similarity_backends(samples, args.threshold, args.backends)
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
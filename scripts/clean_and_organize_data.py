@@ -5,6 +5,7 @@
 基于分析结果对数据进行清洗、去重和标准化处理
 """
 
+import sys
 import pandas as pd
 import re
 import json
@@ -12,6 +13,13 @@ from pathlib import Path
 from typing import List, Dict, Any, Tuple, Optional
 import numpy as np
 
+# 添加项目根目录到Python路径
+project_root = Path(__file__).parent.parent
+blacklist_backend_path = project_root / "blacklist-backend"
+sys.path.append(str(blacklist_backend_path))
+
+from app.services.normalization import normalization_service
+
 def clean_text(text: Any) -> Optional[str]:
     """清理文本数据"""
     if pd.isna(text) or text is None:
@@ -25,21 +33,8 @@ def extract_phone_numbers(text: str) -> List[str]:
     if not text or pd.isna(text):
         return []
     
-    text = str(text).strip()
-    
-    # 提取11位手机号
-    phone_pattern = r'1[3-9]\d{9}'
-    phones = re.findall(phone_pattern, text)
-    
-    # 去重并保持顺序
-    seen = set()
-    unique_phones = []
-    for phone in phones:
-        if phone not in seen:
-            seen.add(phone)
-            unique_phones.append(phone)
-    
-    return unique_phones
+    # 提取11位手机号（去重并保持顺序，相同文本只解析一次）
+    return list(normalization_service.extract_phones(str(text).strip()))
 
 def extract_name_from_phone_text(text: str) -> Optional[str]:
     """从包含电话号码的文本中提取姓名"""
@@ -60,10 +55,8 @@ def clean_ktt_name(name: str) -> Optional[str]:
     if not name or pd.isna(name):
         return None
     
-    name = str(name).strip()
-    
-    # 移除换行符和多余空格
-    name = re.sub(r'\s+', ' ', name)
+    # 去掉首尾空白，换行符和多余空格合并为一个空格
+    name = normalization_service.collapse_whitespace(name)
     
     # 如果是表头，返回None
     if name in ['ktt名字', 'KTT名字']:
@@ -76,10 +69,8 @@ def clean_wechat_name(name: str) -> Optional[str]:
     if not name or pd.isna(name):
         return None
     
-    name = str(name).strip()
-    
-    # 移除换行符和多余空格
-    name = re.sub(r'\s+', ' ', name)
+    # 去掉首尾空白，换行符和多余空格合并为一个空格
+    name = normalization_service.collapse_whitespace(name)
     
     # 如果是表头，返回None
     if name in ['微信名字', '微信名']:
@@ -92,10 +83,8 @@ def clean_wechat_id(wechat_id: str) -> Optional[str]:
     if not wechat_id or pd.isna(wechat_id):
         return None
     
-    wechat_id = str(wechat_id).strip()
-    
-    # 移除换行符和多余空格
-    wechat_id = re.sub(r'\s+', ' ', wechat_id)
+    # 去掉首尾空白，换行符和多余空格合并为一个空格
+    wechat_id = normalization_service.collapse_whitespace(wechat_id)
     
     # 如果是表头，返回None
     if wechat_id in ['微信号', '微信ID']:
@@ -108,10 +97,8 @@ def clean_address(address: str) -> Optional[str]:
     if not address or pd.isna(address):
         return None
     
-    address = str(address).strip()
-    
-    # 移除换行符和多余空格
-    address = re.sub(r'\s+', ' ', address)
+    # 去掉首尾空白，换行符和多余空格合并为一个空格
+    address = normalization_service.collapse_whitespace(address)
     
     # 如果是表头，返回None
     if address in ['下单地址1', '下单地址2', '地址1', '地址2']:
@@ -124,10 +111,8 @@ def clean_blacklist_reason(reason: str) -> Optional[str]:
     if not reason or pd.isna(reason):
         return None
     
-    reason = str(reason).strip()
-    
-    # 移除换行符和多余空格
-    reason = re.sub(r'\s+', ' ', reason)
+    # 去掉首尾空白，换行符和多余空格合并为一个空格
+    reason = normalization_service.collapse_whitespace(reason)
     
     # 如果是表头，返回None
     if reason in ['入黑名单原因', '黑名单原因', '原因']:
@@ -309,8 +294,12 @@ def clean_and_organize_data(file_path: str) -> pd.DataFrame:
             json.dump(stats_serializable, f, ensure_ascii=False, indent=2)
         print(f"✅ 统计报告已保存到: {stats_file}")
         
-        return df_deduplicated
+        # 标准化缓存命中情况
+        for cache_name, cache_stats in normalization_service.stats().items():
+            print(f"   标准化缓存 {cache_name}: 命中 {cache_stats['hits']} 次，未命中 {cache_stats['misses']} 次")
         
+        return df_deduplicated
+    
     except Exception as e:
         print(f"❌ 数据清洗过程中出错: {e}")
         return None
@@ -7,8 +7,6 @@
 
 import pandas as pd
 import sys
-import os
-from datetime import datetime
 from decimal import Decimal
 from pathlib import Path
 import json
@@ -19,9 +17,8 @@ blacklist_backend_path = project_root / "blacklist-backend"
 sys.path.append(str(blacklist_backend_path))
 
 from app.core.database import get_db, init_db
-from app.models.order import Order, OrderStatus
 from app.models.group import Group
-from app.core.config import settings
+from app.services.order_import import bulk_insert_orders
 
 def create_group_for_import():
     """为这次导入创建一个分组"""
@@ -108,58 +105,50 @@ def import_order_data(file_path, group_id):
         # 获取数据库会话
         db = next(get_db())
         
-        imported_count = 0
-        failed_count = 0
-        errors = []
-        
-        # 处理每一行数据
-        for index, row in df.iterrows():
-            try:
-                # 数据清洗和转换
-                order_data = {
-                    'group_id': group_id,
-                    'group_tour_number': str(row['跟团号']) if pd.notna(row['跟团号']) else None,
-                    'orderer': str(row['下单人']) if pd.notna(row['下单人']) else None,
-                    'member_remarks': str(row['团员备注']) if pd.notna(row['团员备注']) else None,
-                    'payment_time': row['支付时间'] if pd.notna(row['支付时间']) else None,
-                    'group_leader_remarks': str(row['团长备注']) if pd.notna(row['团长备注']) else None,
-                    'product': str(row['商品']) if pd.notna(row['商品']) else None,
-                    'order_amount': Decimal(str(row['订单金额'])) if pd.notna(row['订单金额']) else None,
-                    'refund_amount': Decimal(str(row['退款金额'])) if pd.notna(row['退款金额']) else Decimal('0'),
-                    'order_status': str(row['订单状态']).lower() if pd.notna(row['订单状态']) else 'pending',
-                    'pickup_point': str(row['自提点']) if pd.notna(row['自提点']) else None,
-                    'consignee': str(row['收货人']) if pd.notna(row['收货人']) else None,
-                    'contact_phone': str(row['联系电话']) if pd.notna(row['联系电话']) else None,
-                    'detailed_address': str(row['详细地址']) if pd.notna(row['详细地址']) else None,
-                    'is_blacklist_checked': 'no',  # 默认未检测
-                }
-                
-                # 处理订单状态
-                status_mapping = {
-                    '已支付': 'paid',
-                    '待支付': 'pending',
-                    '已发货': 'shipped',
-                    '已送达': 'delivered',
-                    '已取消': 'cancelled',
-                    '已退款': 'refunded'
-                }
-                if order_data['order_status'] in status_mapping:
-                    order_data['order_status'] = status_mapping[order_data['order_status']]
-                else:
-                    order_data['order_status'] = 'pending'
-                
-                # 创建订单
-                order = Order(**order_data)
-                db.add(order)
-                imported_count += 1
-                
-                print(f"导入记录 {index + 1}: 下单人='{order_data['orderer']}', 电话='{order_data['contact_phone']}'")
-                
-            except Exception as e:
-                failed_count += 1
-                error_msg = f"第{index + 2}行数据错误: {str(e)}"
-                errors.append(error_msg)
-                print(f"错误: {error_msg}")
+        def convert_row(row):
+            """把一行数据转换为订单字段"""
+            # 数据清洗和转换
+            order_data = {
+                'group_id': group_id,
+                'group_tour_number': str(row['跟团号']) if pd.notna(row['跟团号']) else None,
+                'orderer': str(row['下单人']) if pd.notna(row['下单人']) else None,
+                'member_remarks': str(row['团员备注']) if pd.notna(row['团员备注']) else None,
+                'payment_time': row['支付时间'] if pd.notna(row['支付时间']) else None,
+                'group_leader_remarks': str(row['团长备注']) if pd.notna(row['团长备注']) else None,
+                'product': str(row['商品']) if pd.notna(row['商品']) else None,
+                'order_amount': Decimal(str(row['订单金额'])) if pd.notna(row['订单金额']) else None,
+                'refund_amount': Decimal(str(row['退款金额'])) if pd.notna(row['退款金额']) else Decimal('0'),
+                'order_status': str(row['订单状态']).lower() if pd.notna(row['订单状态']) else 'pending',
+                'pickup_point': str(row['自提点']) if pd.notna(row['自提点']) else None,
+                'consignee': str(row['收货人']) if pd.notna(row['收货人']) else None,
+                'contact_phone': str(row['联系电话']) if pd.notna(row['联系电话']) else None,
+                'detailed_address': str(row['详细地址']) if pd.notna(row['详细地址']) else None,
+                'is_blacklist_checked': 'no',  # 默认未检测
+            }
+            
+            # 处理订单状态
+            status_mapping = {
+                '已支付': 'paid',
+                '待支付': 'pending',
+                '已发货': 'shipped',
+                '已送达': 'delivered',
+                '已取消': 'cancelled',
+                '已退款': 'refunded'
+            }
+            if order_data['order_status'] in status_mapping:
+                order_data['order_status'] = status_mapping[order_data['order_status']]
+            else:
+                order_data['order_status'] = 'pending'
+            
+            return order_data
+        
+        # 按批次写入订单（每批一条批量INSERT，出错的批次逐行重试）
+        rows = ((index + 2, row) for index, row in enumerate(df.to_dict("records")))
+        imported_count, errors = bulk_insert_orders(db, rows, convert_row)
+        failed_count = len(errors)
+        print(f"已处理 {len(df)} 条记录...")
+        for error_msg in errors:
+            print(f"错误: {error_msg}")
         
         # 更新分组统计信息
         try:
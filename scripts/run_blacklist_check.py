@@ -13,10 +13,9 @@ blacklist_backend_path = project_root / "blacklist-backend"
 sys.path.append(str(blacklist_backend_path))
 
 from app.core.database import get_db
-from app.models.blacklist import Blacklist
 from app.models.order import Order
 from app.services.blacklist_matcher import blacklist_matcher
-from sqlalchemy import func
+from app.services.blacklist_snapshot import get_blacklist_snapshot
 
 def run_blacklist_check():
     """运行黑名单检测"""
@@ -24,9 +23,9 @@ def run_blacklist_check():
     
     db = next(get_db())
     
-    # 获取所有黑名单数据
-    blacklist_items = db.query(Blacklist).filter(Blacklist.is_active == True).all()
-    print(f"黑名单数据: {len(blacklist_items)} 条")
+    # 获取黑名单快照
+    snapshot = get_blacklist_snapshot(db)
+    print(f"黑名单数据: {len(snapshot)} 条 (快照版本 {snapshot.version})")
     
     # 获取所有订单
     orders = db.query(Order).all()
@@ -39,12 +38,14 @@ def run_blacklist_check():
     medium_risk = 0
     low_risk = 0
     
-    # 检测每个订单
+    # 整批检测所有订单
+    bulk_results = blacklist_matcher.check_orders_bulk(orders, snapshot)
+    print(f"已检测 {total_orders} 个订单，正在写入结果...")
+    
     for i, order in enumerate(orders):
-        if (i + 1) % 50 == 0:
-            print(f"已检测 {i + 1}/{total_orders} 个订单...")
-        
-        result = blacklist_matcher.check_order_blacklist(order, blacklist_items)
+        result = blacklist_matcher.bulk_result_at(bulk_results, i)
+        # 记录检测使用的快照版本（增量检测据此跳过未受影响的订单）
+        order.blacklist_checked_version = snapshot.version
         
         if result["is_blacklist"]:
             blacklist_matches += 1